@@ -1,303 +1,933 @@
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from models import db, User, Detection, bcrypt
-from processor import AIProcessor
-import os
-import cv2
-import base64
-import numpy as np
-from datetime import datetime, timedelta
-
-app = Flask(__name__)
-CORS(app)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///safecity.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = 'super-secret-key' # Change in production
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-
-db.init_app(app)
-bcrypt.init_app(app)
-jwt = JWTManager(app)
-
-processor = AIProcessor()
-
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
-
-start_time = datetime.utcnow()
-
-@app.route('/')
-def index():
-    return jsonify({
-        "status": "SafeCity AI Core Online",
-        "version": "1.0.0",
-        "endpoints": ["/login", "/signup", "/detect", "/stats", "/logs"]
-    }), 200
-
-@app.route('/signup', methods=['POST'])
-def signup():
-    print(f"DEBUG: Signup request received: {request.remote_addr}")
-    data = request.get_json()
-    if User.query.filter_by(username=data['username']).first():
-        print(f"DEBUG: Signup failed - User {data['username']} already exists")
-        return jsonify({"msg": "Username already exists"}), 400
-    
-    hashed_pw = bcrypt.generate_password_hash(data['password']).decode('utf-8')
-    new_user = User(
-        username=data['username'], 
-        password=hashed_pw, 
-        role=data.get('role', 'Sector Chief'),
-        full_name=data.get('fullName'),
-        agency=data.get('agency')
-    )
-    db.session.add(new_user)
-    db.session.commit()
-    print(f"DEBUG: User created successfully: {data['username']}")
-    return jsonify({"msg": "User created successfully"}), 201
-
-@app.route('/login', methods=['POST'])
-def login():
-    print(f"DEBUG: Login request received: {request.remote_addr}")
-    data = request.get_json()
-    user = User.query.filter_by(username=data['username']).first()
-    if user and bcrypt.check_password_hash(user.password, data['password']):
-        access_token = create_access_token(identity={"username": user.username, "role": user.role})
-        print(f"DEBUG: Login successful: {data['username']}")
-        return jsonify(access_token=access_token, user={"username": user.username, "role": user.role}), 200
-    print(f"DEBUG: Login failed for user: {data.get('username')}")
-    return jsonify({"msg": "Invalid credentials"}), 401
-
-@app.route('/detect', methods=['POST'])
-def detect():
-    if 'image' not in request.files:
-        return jsonify({"error": "No image provided"}), 400
-    
-    file = request.files['image']
-    img_bytes = file.read()
-    nparr = np.frombuffer(img_bytes, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    
-    source_tag = request.form.get('source', 'IMAGE-EVIDENCE')
-    print(f"DEBUG: Processing frame from {source_tag}...")
-    detections = processor.process_frame(frame)
-    if detections is None:
-        print(f"ERROR: Detection failed for {source_tag}")
-        return jsonify({"error": "Processing failed"}), 500
-    
-    print(f"DEBUG: Processor returned {len(detections)} raw detections")
-    
-    # Standardize result mapping to ensure frontend compatibility (NO_HELMET, COMPLIANT, plate)
-    for det in detections:
-        raw_type = str(det.get('type', '')).upper()
-        raw_label = str(det.get('label', '')).upper()
-        
-        if 'PLATE' in raw_type:
-            det['type'] = 'plate'
-        elif 'NO_HELMET' in raw_type or 'WITHOUT' in raw_label or 'NO_HELMETS' in raw_label:
-            det['type'] = 'NO_HELMET'
-        else:
-            det['type'] = 'COMPLIANT'
-        
-        print(f"DEBUG: Mapped {det['type']} (Raw: {raw_type}/{raw_label})")
-
-    # Extract plate if exists
-    plate_text = "UNKNOWN"
-    for det in detections:
-        if det['type'] == 'plate' and det['label'] != 'UNKNOWN' and det['label']:
-            plate_text = det['label']
-            break
-
-    # Save annotated image
-    filename = f"det_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg"
-    image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    
-    annotated_frame = None
-    try:
-        annotated_frame = processor.annotate_frame(frame.copy(), detections)
-        if annotated_frame is not None:
-            cv2.imwrite(image_path, annotated_frame)
-        else:
-            cv2.imwrite(image_path, frame)
-    except Exception as e:
-        print(f"ERROR: Image saving failed: {e}")
-        cv2.imwrite(image_path, frame)
-    
-    # Database storage - Save individual records for accurate counts and matching UI
-    try:
-        if detections:
-            # Filter plates to find the most relevant one for the frame
-            best_plate = "UNKNOWN"
-            for d in detections:
-                if d['type'] == 'plate' and d['label'] not in ['UNKNOWN', 'NUMBER PLATE'] and d['label']:
-                    best_plate = d['label']
-                    break
-
-            saved_count = 0
-            seen_in_batch = set()
-
-            for det in detections:
-                # We save all NO_HELMET, COMPLIANT, and plate detections as unique entries
-                d_type = det['type']
-                # Correct type normalization
-                if d_type == 'no_helmet': d_type = 'NO_HELMET'
-                if d_type == 'compliant': d_type = 'COMPLIANT'
-                
-                # Determine plate number
-                p_num = det.get('label') if det['type'] == 'plate' else best_plate
-                if not p_num or p_num == "NUMBER PLATE": p_num = "UNKNOWN"
-
-                # 1. Deduplicate within the same frame/batch
-                batch_sig = (d_type, p_num)
-                if batch_sig in seen_in_batch:
-                    # heuristic: allow multiple compliant riders? no, debounce them too
-                    print(f"DEBUG: Skipped batch duplicate: {d_type} - {p_num}")
-                    continue
-                seen_in_batch.add(batch_sig)
-
-                # 2. Strict Deduplication against recent history (Time-based)
-                # Goal: "one violation = one record" per event.
-                # Window: 8 seconds
-                cutoff_time = datetime.utcnow() - timedelta(seconds=8)
-                
-                is_duplicate = False
-                base_query = Detection.query.filter(
-                    Detection.source == source_tag,
-                    Detection.timestamp >= cutoff_time,
-                    Detection.type == d_type
-                )
-                
-                if len(p_num) > 3 and p_num != "UNKNOWN":
-                    # Strong check: must match specific plate
-                    if base_query.filter(Detection.plate_number == p_num).first():
-                        is_duplicate = True
-                else:
-                    # Weak check: If plate is unknown, we assume ANY recent violation 
-                    # of the same type from this camera is the same event.
-                    # This prevents 50 records of "NO_HELMET - UNKNOWN" as a bike drives by.
-                    if base_query.first():
-                        is_duplicate = True
-
-                if is_duplicate:
-                    print(f"DEBUG: Skipped recent duplicate (debounce): {d_type} - {p_num}")
-                    continue
-
-                new_det = Detection(
-                    type=d_type,
-                    confidence=det['confidence'],
-                    plate_number=p_num,
-                    image_path=f"uploads/{filename}",
-                    source=source_tag
-                )
-                db.session.add(new_det)
-                saved_count += 1
-            
-            db.session.commit()
-            print(f"DEBUG: Saved {saved_count} new unique records for {source_tag}")
-    except Exception as e:
-        print(f"ERROR: Database saving failed: {e}")
-        db.session.rollback()
-    
-    # Encode for immediate preview
-    try:
-        if annotated_frame is not None:
-            _, buffer = cv2.imencode('.jpg', annotated_frame)
-        else:
-            _, buffer = cv2.imencode('.jpg', frame)
-        encoded_image = base64.b64encode(buffer).decode('utf-8')
-    except Exception as e:
-        print(f"ERROR: Image encoding failed: {e}")
-        encoded_image = ""
-    
-    return jsonify({
-        "detections": detections,
-        "annotated_image": f"data:image/jpeg;base64,{encoded_image}" if encoded_image else None
-    })
-
-@app.route('/stats', methods=['GET'])
-def get_stats():
-    total = Detection.query.count()
-    violations = Detection.query.filter_by(type='NO_HELMET').count()
-    compliant = Detection.query.filter_by(type='COMPLIANT').count()
-    plates = Detection.query.filter(Detection.plate_number != 'UNKNOWN').count()
-    
-    # Calculate Uptime
-    uptime_delta = datetime.utcnow() - start_time
-    hours, remainder = divmod(int(uptime_delta.total_seconds()), 3600)
-    minutes, _ = divmod(remainder, 60)
-    uptime_str = f"{hours}h {minutes}m"
-    
-    # Last detection
-    last_det = Detection.query.order_by(Detection.timestamp.desc()).first()
-    last_event = last_det.timestamp.isoformat() + "Z" if last_det else None
-
-    # Dynamic trends (mocked for now, but linked to real data)
-    return jsonify({
-        "total": total,
-        "violations": violations,
-        "compliant": compliant,
-        "plates": plates,
-        "uptime": uptime_str,
-        "last_event": last_event,
-        "peak_hour": "14:00",
-        "trends": {
-            "total": min(15, total // 10),
-            "violations": min(10, violations // 5),
-            "plates": min(12, plates // 2)
-        }
-    })
-
-@app.route('/uploads/<path:filename>')
-def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-@app.route('/logs', methods=['GET'])
-def get_logs():
-    logs = Detection.query.order_by(Detection.timestamp.desc()).all()
-    return jsonify([{
-        "id": l.id,
-        "type": l.type,
-        "plate_number": l.plate_number,
-        "confidence": l.confidence,
-        "timestamp": l.timestamp.isoformat() + "Z",
-        "source": l.source,
-        "image_path": l.image_path
-    } for l in logs])
-
-@app.route('/purge', methods=['POST'])
-def purge_detections():
-    try:
-        data = request.json or {}
-        start_str = data.get('start')
-        end_str = data.get('end')
-        
-        query = Detection.query
-        if start_str:
-            start_date = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
-            query = query.filter(Detection.timestamp >= start_date)
-        if end_str:
-            end_date = datetime.fromisoformat(end_str.replace('Z', '+00:00'))
-            query = query.filter(Detection.timestamp <= end_date)
-            
-        count = query.count()
-        query.delete()
-        
-        # Also clean physical files in uploads
-        if not start_str and not end_str:
-            for f in os.listdir(app.config['UPLOAD_FOLDER']):
-                if f.endswith('.jpg'):
-                    try: os.remove(os.path.join(app.config['UPLOAD_FOLDER'], f))
-                    except: pass
-                    
-        db.session.commit()
-        return jsonify({"msg": f"Successfully purged {count} records."}), 200
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({"error": str(e)}), 500
-
-if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    # Disable debug mode for stable model loading (prevents double-init)
-    app.run(host='0.0.0.0', port=5000, debug=False)
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+from flask_cors import CORS
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from models import db, User, Detection, SourceRegion, SourceProfile, WatchlistEntry, bcrypt
+from processor import AIProcessor, StubProcessor
+from model_registry import ModelRegistry
+from startup_report import startup
+from detection_sink import DetectionSink
+from dedup import RecentEventCache, event_key
+from storage import database_url, engine_options, create_schema, PartitionManager
+from retention import RetentionManager
+from evidence_store import EvidenceStore, thumbnail_for
+from frame_decode import upload_buffer, decode_frame
+from inference_queue import InferenceQueue, QueueFull
+from degradation import DegradationController
+from roi import RegionOfInterest, RegionRegistry
+from calibration import CalibrationManager, input_extent
+from plate_index import PlateIndex, canonical, MIN_QUERY
+from watchlist import Watchlist, AlertFeed, parse_entries
+from export import iter_rows, csv_chunks, ndjson_chunks, gzip_chunks
+from video_jobs import VideoJobManager
+from traffic_recorder import TrafficRecorder
+from feed_health import FeedTelemetry
+from json_provider import FastJSONProvider
+import json
+import time
+from sqlalchemy import func, case
+import os
+import cv2
+import base64
+from datetime import datetime
+
+app = Flask(__name__)
+app.json = FastJSONProvider(app)
+CORS(app)
+
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['JWT_SECRET_KEY'] = 'super-secret-key' # Change in production
+app.config['UPLOAD_FOLDER'] = os.environ.get('SAFECITY_UPLOAD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+# Reject oversized uploads before the multipart body is parsed (HTTP 413)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('SAFECITY_MAX_UPLOAD_MB', 16)) * 1024 * 1024
+# Write-behind detection sink: flush every N ms or as soon as N rows are pending
+app.config['DETECTION_FLUSH_INTERVAL_MS'] = int(os.environ.get('SAFECITY_FLUSH_INTERVAL_MS', 250))
+app.config['DETECTION_FLUSH_BATCH'] = int(os.environ.get('SAFECITY_FLUSH_BATCH', 500))
+app.config['DEDUP_WINDOW_SECONDS'] = 8
+# Re-alert for the same wanted plate on the same camera at most once per window
+app.config['WATCHLIST_ALERT_WINDOW_SECONDS'] = int(os.environ.get('SAFECITY_ALERT_WINDOW_SECONDS', 60))
+# Admission control: bounded queue in front of the models, per-frame deadline
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('SAFECITY_INFERENCE_WORKERS', 1))
+app.config['INFERENCE_MAX_PENDING'] = int(os.environ.get('SAFECITY_MAX_PENDING', 8))
+app.config['INFERENCE_DEADLINE_MS'] = int(os.environ.get('SAFECITY_DEADLINE_MS', 3000))
+# How long past its deadline a request waits for a frame already in inference
+app.config['INFERENCE_WAIT_MARGIN_S'] = int(os.environ.get('SAFECITY_WAIT_MARGIN_S', 30))
+# Degradation ladder: step down when /detect p95 or queue depth exceeds the SLO
+app.config['SLO_P95_HIGH_MS'] = int(os.environ.get('SAFECITY_SLO_P95_MS', 1500))
+app.config['SLO_P95_LOW_MS'] = int(os.environ.get('SAFECITY_SLO_P95_LOW_MS', 600))
+app.config['SLO_QUEUE_HIGH'] = 4
+# Evidence images: JPEG quality tiers and what to do with frames that detected nothing
+app.config['EVIDENCE_JPEG_QUALITY'] = 90
+app.config['EVIDENCE_THUMB_WIDTH'] = 320
+app.config['EVIDENCE_THUMB_QUALITY'] = 70
+app.config['EVIDENCE_EMPTY_POLICY'] = os.environ.get('SAFECITY_EMPTY_FRAMES', 'skip')  # skip | downsample | keep
+app.config['EVIDENCE_CACHE_MAX_AGE'] = 31536000  # content-addressed files never change
+app.config['USE_X_SENDFILE'] = os.environ.get('SAFECITY_X_SENDFILE') == '1'
+# Retention: 0 disables a policy. Purges run in batches so /detect keeps writing.
+app.config['RETENTION_MAX_AGE_DAYS'] = int(os.environ.get('SAFECITY_RETENTION_DAYS', 0))
+app.config['RETENTION_MAX_DISK_MB'] = int(os.environ.get('SAFECITY_RETENTION_DISK_MB', 0))
+app.config['RETENTION_INTERVAL_SECONDS'] = int(os.environ.get('SAFECITY_RETENTION_INTERVAL', 3600))
+app.config['RETENTION_BATCH_SIZE'] = 500
+# Video evidence jobs: uploads may be far larger than single frames; chunks run on a process pool
+app.config['VIDEO_MAX_UPLOAD_MB'] = int(os.environ.get('SAFECITY_MAX_VIDEO_MB', 1024))
+app.config['VIDEO_JOB_FOLDER'] = os.environ.get('SAFECITY_VIDEO_JOB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'video_uploads'))
+app.config['VIDEO_WORKERS'] = int(os.environ.get('SAFECITY_VIDEO_WORKERS', 2))
+app.config['VIDEO_CHUNK_SECONDS'] = int(os.environ.get('SAFECITY_VIDEO_CHUNK_SECONDS', 30))
+app.config['VIDEO_SAMPLE_FPS'] = float(os.environ.get('SAFECITY_VIDEO_SAMPLE_FPS', 1.0))
+# 'spawn' gives each worker its own models; 'fork' shares the loaded ones copy-on-write
+app.config['VIDEO_START_METHOD'] = os.environ.get('SAFECITY_VIDEO_START_METHOD', 'spawn')
+# Load testing: record /detect traffic for replay_traffic.py; optionally replace the models with a stub
+app.config['RECORDING_FOLDER'] = os.environ.get('SAFECITY_RECORD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings'))
+app.config['RECORDING_MAX_MB'] = int(os.environ.get('SAFECITY_RECORD_MAX_MB', 2048))
+app.config['STUB_PROCESSOR'] = os.environ.get('SAFECITY_STUB_PROCESSOR') == '1'
+app.config['STUB_LATENCY_MS'] = int(os.environ.get('SAFECITY_STUB_LATENCY_MS', 0))
+# Feed health: recent frames kept per source; a source is online/standby while its last frame is this recent
+app.config['FEED_RING_SIZE'] = int(os.environ.get('SAFECITY_FEED_RING_SIZE', 256))
+app.config['FEED_ONLINE_SECONDS'] = int(os.environ.get('SAFECITY_FEED_ONLINE_SECONDS', 60))
+app.config['FEED_STANDBY_SECONDS'] = int(os.environ.get('SAFECITY_FEED_STANDBY_SECONDS', 6000))
+
+db.init_app(app)
+bcrypt.init_app(app)
+jwt = JWTManager(app)
+
+# Versioned weights; the active versions are what the processor loads at startup.
+# Only weights inside SAFECITY_MODEL_DIR can be registered or loaded.
+model_registry = ModelRegistry(
+    os.environ.get('SAFECITY_MODEL_REGISTRY', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_registry.json')),
+    os.environ.get('SAFECITY_MODEL_DIR', os.path.dirname(os.path.abspath(__file__)))
+)
+if app.config['STUB_PROCESSOR']:
+    processor = StubProcessor(app.config['STUB_LATENCY_MS'])
+else:
+    processor = AIProcessor(model_registry.active_paths())
+model_registry.attach(processor)
+source_regions = RegionRegistry(app, db, SourceRegion)
+calibration = CalibrationManager(app, db, SourceProfile)
+degradation = DegradationController(
+    p95_high_ms=app.config['SLO_P95_HIGH_MS'],
+    p95_low_ms=app.config['SLO_P95_LOW_MS'],
+    queue_high=app.config['SLO_QUEUE_HIGH']
+)
+inference_queue = InferenceQueue(
+    processor,
+    workers=app.config['INFERENCE_WORKERS'],
+    max_pending=app.config['INFERENCE_MAX_PENDING'],
+    deadline_ms=app.config['INFERENCE_DEADLINE_MS'],
+    profile_provider=lambda ticket: inference_profile(ticket.source)
+)
+degradation.queue_depth = inference_queue.depth
+with app.app_context():
+    partitions = PartitionManager(db.engine)
+plate_index = PlateIndex()
+detection_sink = DetectionSink(
+    app, db, Detection.__table__,
+    flush_interval_ms=app.config['DETECTION_FLUSH_INTERVAL_MS'],
+    max_batch=app.config['DETECTION_FLUSH_BATCH'],
+    before_write=partitions.ensure_for_rows,
+    after_write=plate_index.add_rows
+)
+recent_events = RecentEventCache(window_seconds=app.config['DEDUP_WINDOW_SECONDS'])
+alerts = AlertFeed()
+watchlist = Watchlist(
+    app, db, WatchlistEntry, alerts,
+    recent=RecentEventCache(window_seconds=app.config['WATCHLIST_ALERT_WINDOW_SECONDS'])
+)
+evidence_store = EvidenceStore(
+    app.config['UPLOAD_FOLDER'],
+    quality=app.config['EVIDENCE_JPEG_QUALITY'],
+    thumb_width=app.config['EVIDENCE_THUMB_WIDTH'],
+    thumb_quality=app.config['EVIDENCE_THUMB_QUALITY'],
+    empty_policy=app.config['EVIDENCE_EMPTY_POLICY']
+)
+retention = RetentionManager(
+    app, db, app.config['UPLOAD_FOLDER'],
+    partitions=partitions,
+    batch_size=app.config['RETENTION_BATCH_SIZE'],
+    max_age_days=app.config['RETENTION_MAX_AGE_DAYS'],
+    max_disk_mb=app.config['RETENTION_MAX_DISK_MB'],
+    interval_seconds=app.config['RETENTION_INTERVAL_SECONDS'],
+    after_purge=lambda: plate_index.prune(db.engine, Detection.__table__)
+)
+feeds = FeedTelemetry(
+    ring_size=app.config['FEED_RING_SIZE'],
+    online_seconds=app.config['FEED_ONLINE_SECONDS'],
+    standby_seconds=app.config['FEED_STANDBY_SECONDS']
+)
+video_jobs = VideoJobManager(
+    app.config['VIDEO_JOB_FOLDER'],
+    model_paths=model_registry.active_paths,
+    processes=app.config['VIDEO_WORKERS'],
+    chunk_seconds=app.config['VIDEO_CHUNK_SECONDS'],
+    sample_fps=app.config['VIDEO_SAMPLE_FPS'],
+    dedup_seconds=app.config['DEDUP_WINDOW_SECONDS'],
+    start_method=app.config['VIDEO_START_METHOD'],
+    processor=processor,
+    evidence_store=evidence_store,
+    detection_sink=detection_sink,
+    watchlist=watchlist,
+    feeds=feeds
+)
+traffic_recorder = TrafficRecorder(app.config['RECORDING_FOLDER'], max_mb=app.config['RECORDING_MAX_MB'])
+
+if not os.path.exists(app.config['UPLOAD_FOLDER']):
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+
+start_time = datetime.utcnow()
+
+def inference_profile(source, degraded=True):
+    """
+    Current degradation level, the source's calibrated settings and its region
+    of interest. Offline work (video jobs) has no latency SLO and skips the ladder.
+    """
+    profile = degradation.profile() if degraded else {}
+    calibrated = calibration.get(source)
+    if calibrated is not None:
+        # The degradation ladder still caps the plate resolution
+        profile = {**profile, **calibrated,
+                   "plate_imgsz": min(profile.get("plate_imgsz", calibrated["plate_imgsz"]), calibrated["plate_imgsz"])}
+    roi = source_regions.get(source)
+    if roi is not None:
+        profile = {**profile, "roi": roi}
+    return profile
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 string (optionally with Z) into a naive UTC datetime."""
+    if not value:
+        return None
+    ts = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if ts.tzinfo is not None:
+        ts = (ts - ts.utcoffset()).replace(tzinfo=None)
+    return ts
+
+@app.route('/')
+def index():
+    return jsonify({
+        "status": "SafeCity AI Core Online",
+        "version": "1.0.0",
+        "endpoints": ["/login", "/signup", "/detect", "/stats", "/logs", "/metrics"]
+    }), 200
+
+@app.route('/signup', methods=['POST'])
+def signup():
+    print(f"DEBUG: Signup request received: {request.remote_addr}")
+    data = request.get_json()
+    if User.query.filter_by(username=data['username']).first():
+        print(f"DEBUG: Signup failed - User {data['username']} already exists")
+        return jsonify({"msg": "Username already exists"}), 400
+    
+    hashed_pw = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    new_user = User(
+        username=data['username'], 
+        password=hashed_pw, 
+        role=data.get('role', 'Sector Chief'),
+        full_name=data.get('fullName'),
+        agency=data.get('agency')
+    )
+    db.session.add(new_user)
+    db.session.commit()
+    print(f"DEBUG: User created successfully: {data['username']}")
+    return jsonify({"msg": "User created successfully"}), 201
+
+@app.route('/login', methods=['POST'])
+def login():
+    print(f"DEBUG: Login request received: {request.remote_addr}")
+    data = request.get_json()
+    user = User.query.filter_by(username=data['username']).first()
+    if user and bcrypt.check_password_hash(user.password, data['password']):
+        access_token = create_access_token(identity={"username": user.username, "role": user.role})
+        print(f"DEBUG: Login successful: {data['username']}")
+        return jsonify(access_token=access_token, user={"username": user.username, "role": user.role}), 200
+    print(f"DEBUG: Login failed for user: {data.get('username')}")
+    return jsonify({"msg": "Invalid credentials"}), 401
+
+@app.route('/detect', methods=['POST'])
+def detect():
+    if 'image' not in request.files:
+        return jsonify({"error": "No image provided"}), 400
+    
+    request_start = time.perf_counter()
+    source_tag = request.form.get('source', 'IMAGE-EVIDENCE')
+    # live | evidence | backfill; defaults from the source tag
+    priority = request.form.get('priority')
+    file = request.files['image']
+    if traffic_recorder.active:
+        # Recorded on arrival, shed or not: a replay reproduces the offered load
+        traffic_recorder.record(source_tag, upload_buffer(file))
+    try:
+        # Shed load before paying for the decode
+        inference_queue.check_admission(source_tag, priority)
+
+        # Decode straight from the spooled upload, DCT-reduced to what the models need;
+        # full resolution is decoded lazily only if a plate crop asks for it.
+        decode_start = time.perf_counter()
+        decoded = decode_frame(upload_buffer(file), processor.max_input_size(inference_profile(source_tag)))
+        decode_ms = (time.perf_counter() - decode_start) * 1000
+        if decoded.image is None:
+            feeds.record(source_tag, 'failed')
+            return jsonify({"error": "Could not decode image"}), 400
+
+        print(f"DEBUG: Processing frame from {source_tag}...")
+        ticket = inference_queue.submit(source_tag, decoded, request.form.get('deadline_ms', type=int), priority)
+    except QueueFull as e:
+        feeds.record(source_tag, 'shed')
+        return shed_response(e.message, e.status, e.retry_after)
+    # Bounded: a ticket no worker resolves (crashed worker, shutdown) must not hang the request
+    if not ticket.wait(max(0.0, ticket.deadline - time.monotonic()) + app.config['INFERENCE_WAIT_MARGIN_S']):
+        print(f"ERROR: Inference for {source_tag} did not complete in time")
+        feeds.record(source_tag, 'failed')
+        return jsonify({"error": "Inference did not complete"}), 503
+    post_start = time.perf_counter()
+    if ticket.status == 'superseded':
+        feeds.record(source_tag, 'dropped')
+        return shed_response("Superseded by a newer frame from this source", 429, 0)
+    if ticket.status == 'expired':
+        # A miss for the degradation ladder too: what the frame waited plus what it would have cost
+        degradation.observe((time.perf_counter() - request_start + inference_queue.service_time) * 1000)
+        feeds.record(source_tag, 'dropped')
+        return shed_response("Frame missed its deadline before inference", 503, inference_queue.retry_after())
+    detections = ticket.result
+    frame = decoded.image
+    if detections is None:
+        print(f"ERROR: Detection failed for {source_tag}")
+        feeds.record(source_tag, 'failed')
+        return jsonify({"error": "Processing failed"}), 500
+    
+    # Records already carry the stored types (NO_HELMET, COMPLIANT, plate)
+    print(f"DEBUG: Processor returned {len(detections)} detections")
+
+    calibration.observe(
+        source_tag, detections, input_extent(frame.shape, source_regions.get(source_tag)),
+        full_quality=degradation.report(ticket.profile)["level"] == 0
+    )
+
+    # Save annotated image into the sharded, content-addressed evidence store.
+    # Evidence is kept at full resolution: frames with detections are annotated
+    # on the full decode (boxes scaled up from the reduced one). Nothing reads
+    # the clean frame after this, so it is annotated in place.
+    evidence_frame, scale = frame, 1
+    if detections and decoded.scale != 1 and decoded.full is not None:
+        evidence_frame, scale = decoded.full, decoded.scale
+    try:
+        annotated_frame = processor.annotate_frame(evidence_frame, detections, scale=scale)
+        if annotated_frame is not None:
+            evidence_frame = annotated_frame
+    except Exception as e:
+        print(f"ERROR: Annotation failed: {e}")
+
+    image_path, preview_buffer = None, None
+    try:
+        image_path, preview_buffer = evidence_store.save(evidence_frame, has_detections=bool(detections))
+    except Exception as e:
+        print(f"ERROR: Image saving failed: {e}")
+
+    # Database storage - Save individual records for accurate counts and matching UI.
+    # Rows are handed to the write-behind sink; dedup runs against an in-memory
+    # window so the request never touches the database.
+    now = datetime.utcnow()
+    watch_hits = []
+    if detections:
+        rows = []
+        seen_in_batch = set()
+
+        for det in detections:
+            # We save all NO_HELMET, COMPLIANT, and plate detections as unique entries
+            key = event_key(det)
+            if key is None:
+                continue  # plate that was never read, nothing to record
+            d_type, p_num = key
+
+            # Every plate read is checked against the watchlist; hits go to the alert feed
+            if d_type == 'plate':
+                hits = watchlist.check(p_num, source_tag, now, detection={
+                    "box": det['box'], "confidence": det['confidence'], "image_path": image_path
+                })
+                if hits:
+                    det['watchlist'] = [{k: h[k] for k in ("plate", "match", "reason", "priority")} for h in hits]
+                    watch_hits.extend(hits)
+
+            # 1. Deduplicate within the same frame/batch
+            batch_sig = (d_type, p_num)
+            if batch_sig in seen_in_batch:
+                print(f"DEBUG: Skipped batch duplicate: {d_type} - {p_num}")
+                continue
+            seen_in_batch.add(batch_sig)
+
+            # 2. Strict Deduplication against recent history (Time-based)
+            # Goal: "one violation = one record" per event.
+            if recent_events.check_and_add(source_tag, d_type, p_num, now):
+                print(f"DEBUG: Skipped recent duplicate (debounce): {d_type} - {p_num}")
+                continue
+
+            rows.append({
+                "timestamp": now,
+                "type": d_type,
+                "confidence": det['confidence'],
+                "plate_number": p_num,
+                "image_path": image_path,
+                "source": source_tag
+            })
+
+        detection_sink.submit(rows)
+        print(f"DEBUG: Queued {len(rows)} new unique records for {source_tag}")
+    
+    # Encode for immediate preview (reuses the JPEG the evidence store produced)
+    try:
+        if preview_buffer is None:
+            _, preview_buffer = cv2.imencode('.jpg', evidence_frame)
+        encoded_image = base64.b64encode(preview_buffer).decode('utf-8')
+    except Exception as e:
+        print(f"ERROR: Image encoding failed: {e}")
+        encoded_image = ""
+    
+    finished = time.perf_counter()
+    degradation.observe((finished - request_start) * 1000)
+    feeds.record(source_tag, 'processed', (finished - request_start) * 1000, {
+        "decode": decode_ms,
+        "queue": ticket.wait_ms,
+        "inference": (ticket.finished_at - ticket.started_at) * 1000,
+        "post": (finished - post_start) * 1000
+    }, detections=len(detections))
+    return jsonify({
+        "detections": detections,
+        "annotated_image": f"data:image/jpeg;base64,{encoded_image}" if encoded_image else None,
+        "decode": decoded.report(),
+        "degradation": degradation.report(ticket.profile),
+        "alerts": watch_hits
+    })
+
+def shed_response(message, status, retry_after):
+    response = jsonify({"error": message, "shed": True, "retry_after": retry_after})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit_mb = request.max_content_length // (1024 * 1024)
+    return jsonify({"error": f"Upload exceeds the {limit_mb} MB limit"}), 413
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    # One aggregate scan instead of four separate COUNT queries
+    total, violations, compliant, plates, last_ts = db.session.query(
+        func.count(Detection.id),
+        func.sum(case((Detection.type == 'NO_HELMET', 1), else_=0)),
+        func.sum(case((Detection.type == 'COMPLIANT', 1), else_=0)),
+        func.sum(case((Detection.plate_number != 'UNKNOWN', 1), else_=0)),
+        func.max(Detection.timestamp)
+    ).one()
+    violations, compliant, plates = violations or 0, compliant or 0, plates or 0
+    
+    # Calculate Uptime
+    uptime_delta = datetime.utcnow() - start_time
+    hours, remainder = divmod(int(uptime_delta.total_seconds()), 3600)
+    minutes, _ = divmod(remainder, 60)
+    uptime_str = f"{hours}h {minutes}m"
+    
+    # Last detection
+    last_event = last_ts.isoformat() + "Z" if last_ts else None
+
+    # Dynamic trends (mocked for now, but linked to real data)
+    return jsonify({
+        "total": total,
+        "violations": violations,
+        "compliant": compliant,
+        "plates": plates,
+        "uptime": uptime_str,
+        "last_event": last_event,
+        "peak_hour": "14:00",
+        "trends": {
+            "total": min(15, total // 10),
+            "violations": min(10, violations // 5),
+            "plates": min(12, plates // 2)
+        }
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        "processor": processor.metrics(),
+        "inference_queue": inference_queue.metrics(),
+        "degradation": degradation.metrics(),
+        "detection_sink": detection_sink.metrics(),
+        "retention": retention.metrics(),
+        "evidence_store": evidence_store.metrics(),
+        "plate_index": plate_index.metrics(),
+        "watchlist": watchlist.metrics(),
+        "video_jobs": video_jobs.metrics(),
+        "recording": traffic_recorder.status(),
+        "feeds": feeds.metrics(),
+        "startup": startup.summary()
+    })
+
+@app.route('/feeds/health', methods=['GET'])
+def get_feed_health():
+    # Measured per-source telemetry (in memory, since this process started)
+    return jsonify({
+        "feeds": feeds.feeds(),
+        "online_seconds": feeds.online_seconds,
+        "standby_seconds": feeds.standby_seconds
+    })
+
+@app.route('/feeds/health/<path:source>', methods=['GET'])
+def get_source_health(source):
+    feed = feeds.feed(source)
+    if feed is None:
+        return jsonify({"error": "No frames from this source yet"}), 404
+    return jsonify(feed)
+
+@app.route('/scheduler', methods=['GET'])
+def get_scheduler():
+    return jsonify({
+        "queue": inference_queue.metrics(),
+        "sources": inference_queue.sources()
+    })
+
+@app.route('/scheduler/sources/<path:source>', methods=['PUT'])
+def configure_scheduler_source(source):
+    data = request.get_json() or {}
+    try:
+        account = inference_queue.configure_source(
+            source, priority=data.get('priority'), weight=data.get('weight'), cap=data.get('cap')
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"source": source, **account}), 200
+
+@app.route('/regions', methods=['GET'])
+def get_regions():
+    return jsonify(source_regions.all())
+
+@app.route('/regions/<path:source>', methods=['GET'])
+def get_source_region(source):
+    roi = source_regions.get(source)
+    if roi is None:
+        return jsonify({"error": "No region configured for this source"}), 404
+    return jsonify({"source": source, **roi.to_dict()})
+
+@app.route('/regions/<path:source>', methods=['PUT'])
+def set_source_region(source):
+    try:
+        roi = RegionOfInterest.from_dict(request.get_json())
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    source_regions.set(source, roi)
+    return jsonify({"source": source, **roi.to_dict()}), 200
+
+@app.route('/regions/<path:source>', methods=['DELETE'])
+def delete_source_region(source):
+    source_regions.set(source, None)
+    return jsonify({"msg": f"Region for {source} removed"}), 200
+
+@app.route('/calibration', methods=['GET'])
+def get_calibration():
+    return jsonify(calibration.sources())
+
+@app.route('/calibration/<path:source>', methods=['GET'])
+def get_source_calibration(source):
+    report = calibration.report(source)
+    if report is None:
+        return jsonify({"error": "Source is not calibrated"}), 404
+    return jsonify({"source": source, **report})
+
+@app.route('/calibration/<path:source>', methods=['POST'])
+def start_calibration(source):
+    data = request.get_json(silent=True) or {}
+    try:
+        frames = int(data.get('frames', 200))
+    except (TypeError, ValueError):
+        return jsonify({"error": "frames must be an integer"}), 400
+    if frames < 1:
+        return jsonify({"error": "frames must be positive"}), 400
+    return jsonify({"source": source, **calibration.start(source, frames)}), 202
+
+@app.route('/calibration/<path:source>', methods=['DELETE'])
+def delete_calibration(source):
+    calibration.delete(source)
+    return jsonify({"msg": f"{source} reset to default inference settings"}), 200
+
+@app.route('/watchlist', methods=['GET'])
+def get_watchlist():
+    limit = request.args.get('limit', 100, type=int)
+    entries = WatchlistEntry.query.order_by(WatchlistEntry.id).limit(limit).all()
+    return jsonify({
+        **watchlist.metrics(),
+        "entries": [{"plate": e.plate, "reason": e.reason, "priority": e.priority,
+                     "added_at": e.added_at.isoformat() + "Z" if e.added_at else None} for e in entries]
+    })
+
+@app.route('/watchlist/import', methods=['POST'])
+def import_watchlist():
+    # JSON list/{"entries": [...]} or CSV lines: plate,reason,priority
+    mode = request.args.get('mode', 'append')
+    if mode not in ('append', 'replace'):
+        return jsonify({"error": "mode must be append or replace"}), 400
+    try:
+        entries = parse_entries(request.get_data(as_text=True), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    total = watchlist.import_entries(entries, replace=(mode == 'replace'))
+    return jsonify({"imported": len(entries), "total": total, "version": watchlist.version,
+                    "reload_ms": round(watchlist.last_reload_ms, 1)}), 200
+
+@app.route('/watchlist/<plate>', methods=['DELETE'])
+def delete_watchlist_plate(plate):
+    removed = watchlist.remove(plate)
+    if not removed:
+        return jsonify({"error": "Plate not on the watchlist"}), 404
+    return jsonify({"msg": f"Removed {removed} entries", "total": len(watchlist)}), 200
+
+@app.route('/alerts', methods=['GET'])
+def get_alerts():
+    return jsonify(alerts.since(request.args.get('since', 0, type=int), request.args.get('limit', 100, type=int)))
+
+@app.route('/alerts/stream', methods=['GET'])
+def stream_alerts():
+    # Server-sent events; reconnecting clients resume from Last-Event-ID
+    last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+
+    def events(last_id):
+        while True:
+            pending = alerts.wait(last_id, timeout=15)
+            if not pending:
+                yield ": keep-alive\n\n"
+                continue
+            for event in pending:
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['priority']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(stream_with_context(events(last_id)), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/models', methods=['GET'])
+def get_models():
+    return jsonify(model_registry.report())
+
+@app.route('/models/<role>/versions', methods=['POST'])
+def register_model(role):
+    data = request.get_json() or {}
+    if not data.get('version') or not data.get('path'):
+        return jsonify({"error": "version and path are required"}), 400
+    try:
+        entry = model_registry.register(role, data['version'], data['path'], data.get('notes'))
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"role": role, "version": data['version'], **entry}), 201
+
+@app.route('/models/<role>/versions/<version>/load', methods=['POST'])
+def load_model(role, version):
+    try:
+        state = model_registry.load(role, version)
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"role": role, "version": version, "state": state}), 202
+
+@app.route('/models/<role>/versions/<version>/activate', methods=['POST'])
+def activate_model(role, version):
+    try:
+        active = model_registry.activate(role, version)
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"role": role, "active": active}), 200
+
+@app.route('/models/<role>/rollback', methods=['POST'])
+def rollback_model(role):
+    try:
+        active = model_registry.rollback(role)
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"role": role, "active": active}), 200
+
+@app.route('/models/<role>/versions/<version>/shadow', methods=['POST'])
+def shadow_model(role, version):
+    data = request.get_json(silent=True) or {}
+    try:
+        sample_rate = min(1.0, max(0.0, float(data.get('sample_rate', 0.1))))
+        report = model_registry.start_shadow(role, version, sample_rate)
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(report), 200
+
+@app.route('/models/<role>/shadow', methods=['DELETE'])
+def stop_shadow_model(role):
+    report = model_registry.stop_shadow(role)
+    if report is None:
+        return jsonify({"error": f"No {role} model in shadow mode"}), 404
+    return jsonify(report), 200
+
+@app.route('/jobs/video', methods=['POST'])
+def submit_video_job():
+    # Raise the body limit for this endpoint only, before the multipart body is parsed
+    request.max_content_length = app.config['VIDEO_MAX_UPLOAD_MB'] * 1024 * 1024
+    if 'video' not in request.files:
+        return jsonify({"error": "No video provided"}), 400
+    source = request.form.get('source', 'VIDEO-ANALYSIS')
+    try:
+        recorded_at = parse_timestamp(request.form.get('recorded_at'))
+        job = video_jobs.submit(
+            request.files['video'], source, inference_profile(source, degraded=False),
+            sample_fps=request.form.get('sample_fps', type=float), recorded_at=recorded_at
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(job.summary())
+    response.status_code = 202
+    response.headers['Location'] = f"/jobs/{job.id}"
+    return response
+
+@app.route('/jobs', methods=['GET'])
+def get_jobs():
+    return jsonify(video_jobs.all())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.summary())
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    # Available while running too: results cover the part of the video merged so far
+    results = video_jobs.results(job_id)
+    if results is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(results)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = video_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.summary())
+
+@app.route('/recording', methods=['GET'])
+def get_recording():
+    return jsonify(traffic_recorder.status())
+
+@app.route('/recording', methods=['POST'])
+def start_recording():
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(traffic_recorder.start(data.get('name'))), 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/recording', methods=['DELETE'])
+def stop_recording():
+    return jsonify(traffic_recorder.stop())
+
+@app.route('/health', methods=['GET'])
+def health():
+    # Polled by the cluster coordinator; cheap and never touches the database
+    queue = inference_queue.metrics()
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "queue": {k: queue[k] for k in ("depth", "running", "workers", "max_pending", "service_time_ms")},
+        "degradation": degradation.report()
+    })
+
+def source_state(source, remove=False):
+    """Everything this node keeps in memory about one camera, as JSON."""
+    return {
+        "events": recent_events.export(source, remove=remove),
+        "alerts": watchlist.recent.export(source, remove=remove),
+        "scheduler": inference_queue.source_settings(source, remove=remove)
+    }
+
+@app.route('/cluster/state', methods=['GET'])
+def list_source_state():
+    sources = set(recent_events.sources()) | set(watchlist.recent.sources()) | set(inference_queue.sources())
+    return jsonify({"sources": sorted(sources)})
+
+@app.route('/cluster/handoff', methods=['POST'])
+def hand_off_sources():
+    # The coordinator moves these cameras to another node: export and forget them
+    sources = (request.get_json(silent=True) or {}).get('sources') or []
+    return jsonify({"sources": {s: source_state(s, remove=True) for s in sources}})
+
+@app.route('/cluster/state', methods=['PUT'])
+def restore_source_state():
+    states = (request.get_json(silent=True) or {}).get('sources') or {}
+    try:
+        for source, state in states.items():
+            recent_events.restore(source, state.get('events') or [])
+            watchlist.recent.restore(source, state.get('alerts') or [])
+            if state.get('scheduler'):
+                inference_queue.restore_source(source, state['scheduler'])
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid source state: {e}"}), 400
+    print(f"DEBUG: Took over {len(states)} sources from another node")
+    return jsonify({"restored": len(states)})
+
+@app.route('/retention/run', methods=['POST'])
+def run_retention():
+    retention.trigger()
+    return jsonify({"msg": "Retention run scheduled", "retention": retention.metrics()}), 202
+
+@app.route('/uploads/<path:filename>')
+def uploaded_file(filename):
+    # send_file hands the descriptor to the server's sendfile path (or X-Sendfile)
+    response = send_from_directory(
+        app.config['UPLOAD_FOLDER'], filename,
+        max_age=app.config['EVIDENCE_CACHE_MAX_AGE'], conditional=True, etag=True
+    )
+    response.headers['Cache-Control'] = f"public, max-age={app.config['EVIDENCE_CACHE_MAX_AGE']}, immutable"
+    return response
+
+@app.route('/logs', methods=['GET'])
+def get_logs():
+    # Optional time range lets Postgres prune to the relevant monthly partitions
+    query = Detection.query
+    start = parse_timestamp(request.args.get('start'))
+    end = parse_timestamp(request.args.get('end'))
+    if start:
+        query = query.filter(Detection.timestamp >= start)
+    if end:
+        query = query.filter(Detection.timestamp <= end)
+    query = query.order_by(Detection.timestamp.desc())
+    limit = request.args.get('limit', type=int)
+    if limit:
+        query = query.limit(limit)
+    logs = query.all()
+    return jsonify([serialize_log(l) for l in logs])
+
+def serialize_log(l):
+    return {
+        "id": l.id,
+        "type": l.type,
+        "plate_number": l.plate_number,
+        "confidence": l.confidence,
+        "timestamp": l.timestamp.isoformat() + "Z",
+        "source": l.source,
+        "image_path": l.image_path,
+        "thumbnail_path": thumbnail_for(l.image_path) or l.image_path
+    }
+
+@app.route('/search/plates', methods=['GET'])
+def search_plates():
+    q = request.args.get('q', '')
+    if len(canonical(q)) < MIN_QUERY:
+        return jsonify({"error": f"q needs at least {MIN_QUERY} letters or digits"}), 400
+    started = time.perf_counter()
+    if not plate_index.loaded:
+        plate_index.load(db.engine, Detection.__table__)
+
+    max_distance = min(2, max(0, request.args.get('max_distance', 1, type=int)))
+    matches = plate_index.search(q, max_distance=max_distance, limit=request.args.get('plates', 50, type=int))
+    results = []
+    if matches:
+        scores = {m["plate"]: m["score"] for m in matches}
+        query = Detection.query.filter(Detection.plate_number.in_(list(scores)))
+        start = parse_timestamp(request.args.get('start'))
+        end = parse_timestamp(request.args.get('end'))
+        if start:
+            query = query.filter(Detection.timestamp >= start)
+        if end:
+            query = query.filter(Detection.timestamp <= end)
+        if request.args.get('source'):
+            query = query.filter(Detection.source == request.args['source'])
+        if request.args.get('type'):
+            query = query.filter(Detection.type == request.args['type'])
+        # Best plate match first, newest sighting first within a plate
+        query = query.order_by(case(scores, value=Detection.plate_number, else_=0).desc(),
+                               Detection.timestamp.desc())
+        for l in query.limit(request.args.get('limit', 100, type=int)).all():
+            results.append({**serialize_log(l), "score": scores.get(l.plate_number, 0)})
+
+    return jsonify({
+        "query": q,
+        "matches": matches,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+
+@app.route('/export', methods=['GET'])
+def export_detections():
+    # Streams straight from a DB cursor: constant memory for any range
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    try:
+        start = parse_timestamp(request.args.get('start'))
+        end = parse_timestamp(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid timestamp: {e}"}), 400
+
+    rows = iter_rows(db.engine, Detection.__table__, start, end,
+                     source=request.args.get('source'), d_type=request.args.get('type'))
+    image_base = request.host_url.rstrip('/') if request.args.get('images') == '1' else None
+    chunks = (csv_chunks if fmt == 'csv' else ndjson_chunks)(rows, image_base)
+
+    filename = f"safecity_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    headers = {}
+    # gzip=1 downloads a .gz file; otherwise compress on the wire if the client accepts it
+    gzip_mode = request.args.get('gzip', 'auto')
+    if gzip_mode == '1':
+        chunks, mimetype, filename = gzip_chunks(chunks), 'application/gzip', filename + '.gz'
+    elif gzip_mode == 'auto' and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+@app.route('/purge', methods=['POST'])
+def purge_detections():
+    try:
+        data = request.json or {}
+        start_str = data.get('start')
+        end_str = data.get('end')
+        
+        # Make sure buffered rows are on disk before deciding what to delete
+        detection_sink.flush()
+
+        # Rows go in bounded batches and take exactly their evidence files with them
+        count = retention.purge(parse_timestamp(start_str), parse_timestamp(end_str))
+        return jsonify({"msg": f"Successfully purged {count} records."}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+def prepare_database():
+    """Create/upgrade the schema. Run once, before workers start."""
+    with app.app_context():
+        create_schema(db)
+
+def start_services():
+    """
+    Per-process runtime state: caches loaded from the DB and background
+    threads. Threads don't survive fork, so under gunicorn this runs in
+    each worker (post_fork) while the models were loaded once in the master.
+    """
+    # Pooled DB connections inherited from a forking parent must not be shared
+    with app.app_context():
+        db.engine.dispose(close=False)
+    source_regions.load()
+    calibration.load()
+    watchlist.load()
+    with app.app_context():
+        plate_index.load(db.engine, Detection.__table__)
+    inference_queue.start()
+    detection_sink.start()
+    retention.start()
+    if os.environ.get('SAFECITY_RECORD') == '1':
+        traffic_recorder.start()
+    startup.log()
+
+if __name__ == '__main__':
+    prepare_database()
+    start_services()
+    # Disable debug mode for stable model loading (prevents double-init)
+    app.run(host='0.0.0.0', port=int(os.environ.get('SAFECITY_PORT', 5000)), debug=False)
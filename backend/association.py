@@ -0,0 +1,61 @@
+import numpy as np
+
+# Rider-plate association.
+#
+# The helmet model boxes the rider's head/upper body; the motorcycle's plate
+# sits below it, roughly under the rider. A plate is a candidate for a rider
+# when its centre falls inside a search region hanging below the rider box:
+# REGION_WIDTH rider-widths to either side of the rider's centre line and
+# down to REGION_DEPTH rider-heights below the box.
+
+REGION_WIDTH = 1.5
+REGION_DEPTH = 8.0
+
+OCR_MODES = ('violations', 'violations+confident', 'all')
+
+
+def link_costs(rider_boxes, plate_boxes):
+    """
+    (riders x plates) matrix of normalised rider-to-plate distances, inf
+    where the plate centre is outside the rider's region. Boxes are (N, 4)
+    xyxy arrays.
+    """
+    riders = np.asarray(rider_boxes, dtype=np.float64).reshape(-1, 4)
+    plates = np.asarray(plate_boxes, dtype=np.float64).reshape(-1, 4)
+    rw = np.maximum(1.0, riders[:, 2] - riders[:, 0])[:, None]
+    rh = np.maximum(1.0, riders[:, 3] - riders[:, 1])[:, None]
+    rcx = ((riders[:, 0] + riders[:, 2]) / 2.0)[:, None]
+    ry1, ry2 = riders[:, 1:2], riders[:, 3:4]
+    pcx = ((plates[:, 0] + plates[:, 2]) / 2.0)[None, :]
+    pcy = ((plates[:, 1] + plates[:, 3]) / 2.0)[None, :]
+
+    dx = np.abs(pcx - rcx) / rw
+    dy = np.maximum(0.0, pcy - ry2) / rh
+    # Horizontal misalignment matters more than depth (the plate is far below
+    # the head on a big bike, but never far to the side)
+    costs = 2.0 * dx + dy / REGION_DEPTH
+    costs[(dx > REGION_WIDTH) | (pcy < ry1) | (pcy > ry2 + REGION_DEPTH * rh)] = np.inf
+    return costs
+
+
+def associate_plates(rider_boxes, plate_boxes):
+    """
+    Map rider index -> plate index. Each rider gets the nearest plate in its
+    region; a plate may serve several riders (rider and pillion share a bike).
+    """
+    if len(rider_boxes) == 0 or len(plate_boxes) == 0:
+        return {}
+    costs = link_costs(rider_boxes, plate_boxes)
+    best = costs.argmin(axis=1)
+    found = np.isfinite(costs[np.arange(len(best)), best])
+    return {int(r_idx): int(best[r_idx]) for r_idx in np.flatnonzero(found)}
+
+
+def plates_to_read(rider_types, plate_confidences, links, mode, confidence_floor):
+    """Indices of the plate boxes worth an OCR pass under `mode`."""
+    if mode == 'all':
+        return set(range(len(plate_confidences)))
+    targets = {p_idx for r_idx, p_idx in links.items() if rider_types[r_idx] == "NO_HELMET"}
+    if mode == 'violations+confident':
+        targets.update(np.flatnonzero(np.asarray(plate_confidences) >= confidence_floor).tolist())
+    return targets
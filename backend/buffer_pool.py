@@ -0,0 +1,122 @@
+import threading
+import weakref
+
+import numpy as np
+
+# Bucket sizes are 2^k times 1, 1.25, 1.5 or 1.75, so a pooled buffer is at
+# most 25% larger than the array carved out of it
+_STEPS = (4, 5, 6, 7)
+MIN_BUCKET = 4096
+
+
+def bucket_size(nbytes):
+    """Smallest bucket that holds nbytes."""
+    nbytes = max(int(nbytes), MIN_BUCKET)
+    k = max(0, nbytes.bit_length() - 3)
+    while True:
+        for step in _STEPS:
+            size = step << k
+            if size >= nbytes:
+                return size
+        k += 1
+
+
+class BufferPool:
+    """
+    Reusable scratch arrays for per-frame work (letterbox levels, model
+    input tensors, plate-crop preprocessing), bucketed by size. Arrays are
+    views into pooled uint8 buffers and must be released once nothing refers
+    to them any more; anything that outlives the frame (records, JPEGs)
+    must be a copy. Leases that are never released are not leaked, only
+    not reused. Idle buffers are capped per bucket and in total, so the
+    pool holds on to at most `max_mb`.
+    """
+
+    def __init__(self, max_mb=128, per_bucket=8):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.per_bucket = per_bucket
+        self._free = {}  # bucket size -> [backing buffers]
+        # id(backing) -> backing; weak, so a lease that is never released just
+        # gets garbage-collected instead of pinning its buffer
+        self._leased = weakref.WeakValueDictionary()
+        self._idle_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"acquired": 0, "reused": 0, "allocated": 0, "allocated_bytes": 0, "dropped": 0}
+
+    def acquire(self, shape, dtype=np.uint8):
+        """An uninitialised C-contiguous array of shape/dtype backed by a pooled buffer."""
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        size = bucket_size(nbytes)
+        with self._lock:
+            self.counters["acquired"] += 1
+            free = self._free.get(size)
+            if free:
+                backing = free.pop()
+                self._idle_bytes -= size
+                self.counters["reused"] += 1
+            else:
+                backing = None
+                self.counters["allocated"] += 1
+                self.counters["allocated_bytes"] += size
+        if backing is None:
+            backing = np.empty(size, np.uint8)
+        with self._lock:
+            self._leased[id(backing)] = backing
+        return backing[:nbytes].view(dtype).reshape(shape)
+
+    def release(self, *arrays):
+        """Return arrays from acquire(); anything else is ignored."""
+        with self._lock:
+            for array in arrays:
+                if array is None:
+                    continue
+                backing = self._leased.pop(id(array.base if array.base is not None else array), None)
+                if backing is None:
+                    continue
+                free = self._free.setdefault(backing.nbytes, [])
+                if len(free) >= self.per_bucket or self._idle_bytes + backing.nbytes > self.max_bytes:
+                    self.counters["dropped"] += 1
+                    continue
+                free.append(backing)
+                self._idle_bytes += backing.nbytes
+
+    def scratch(self):
+        return Scratch(self)
+
+    def metrics(self):
+        with self._lock:
+            acquired = self.counters["acquired"]
+            return {
+                **self.counters,
+                "hit_rate": round(self.counters["reused"] / acquired, 3) if acquired else 0.0,
+                "leased": len(self._leased),
+                "idle_mb": round(self._idle_bytes / (1024 * 1024), 1),
+                "buckets": len([b for b in self._free.values() if b])
+            }
+
+
+class Scratch:
+    """Arrays leased for one piece of work, all released together (a with-block)."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._arrays = []
+
+    def get(self, shape, dtype=np.uint8):
+        array = self.pool.acquire(shape, dtype)
+        self._arrays.append(array)
+        return array
+
+    def like(self, array):
+        return self.get(array.shape, array.dtype)
+
+    def release(self):
+        self.pool.release(*self._arrays)
+        self._arrays = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
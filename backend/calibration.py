@@ -0,0 +1,224 @@
+import threading
+from datetime import datetime
+
+from metrics import percentile
+
+# Candidate input sizes, smallest first (multiples of the 32px YOLO stride)
+HELMET_SIZES = (320, 416, 512, 640)
+PLATE_SIZES = (480, 640, 800, 960, 1280)
+
+# Smallest object, in model-input pixels, the detectors still find reliably
+MIN_RIDER_PX = 24
+MIN_PLATE_PX = 12
+
+# Settings every source runs with until it is calibrated
+DEFAULT_SETTINGS = {"helmet_imgsz": 640, "plate_imgsz": 1280, "helmet_conf": 0.3, "plate_conf": 0.05}
+
+# Thresholds are raised at most to this fraction of the 5th-percentile
+# confidence of what the source actually detects, and never past the caps.
+CONF_MARGIN = 0.8
+CONF_CAPS = {"helmet_conf": 0.6, "plate_conf": 0.4}
+
+MIN_RIDER_SAMPLES = 20
+MIN_PLATE_SAMPLES = 10
+
+
+def input_extent(shape, roi=None):
+    """Longer side, in frame pixels, of what the models see (letterboxed to imgsz)."""
+    h, w = shape[:2]
+    if roi is not None:
+        window = roi.window(w, h)
+        if window is not None:
+            return max(window[2] - window[0], window[3] - window[1])
+    return max(h, w)
+
+
+def relative_cost(settings):
+    """YOLO cost grows with input area; both detectors run on every frame."""
+    return settings["helmet_imgsz"] ** 2 + settings["plate_imgsz"] ** 2
+
+
+def smallest_size(sizes, fraction, min_px):
+    """Smallest input size at which an object `fraction` of the extent is min_px."""
+    for size in sizes:
+        if fraction * size >= min_px:
+            return size
+    return sizes[-1]
+
+
+class CalibrationSession:
+    """Box-size and confidence samples collected from one source."""
+
+    def __init__(self, source, frames):
+        self.source = source
+        self.target = frames
+        self.frames = 0
+        self.skipped = 0
+        self.riders = []  # (shorter side / extent, confidence)
+        self.plates = []  # (height / extent, confidence)
+        self.started_at = datetime.utcnow()
+
+    def add(self, detections, extent):
+        self.frames += 1
+        for det in detections:
+            x1, y1, x2, y2 = det["box"]
+            if det["type"] == "plate":
+                # Plates nobody OCR'd are mostly clutter; don't size the model for them
+                if det.get("ocr"):
+                    self.plates.append(((y2 - y1) / extent, det["confidence"]))
+            else:
+                self.riders.append((min(x2 - x1, y2 - y1) / extent, det["confidence"]))
+
+    @property
+    def done(self):
+        return self.frames >= self.target
+
+    def settings(self):
+        settings = dict(DEFAULT_SETTINGS)
+        if len(self.riders) >= MIN_RIDER_SAMPLES:
+            settings["helmet_imgsz"] = smallest_size(
+                HELMET_SIZES, percentile([s for s, _ in self.riders], 5), MIN_RIDER_PX)
+            settings["helmet_conf"] = self._threshold("helmet_conf", [c for _, c in self.riders])
+        if len(self.plates) >= MIN_PLATE_SAMPLES:
+            settings["plate_imgsz"] = smallest_size(
+                PLATE_SIZES, percentile([s for s, _ in self.plates], 5), MIN_PLATE_PX)
+            settings["plate_conf"] = self._threshold("plate_conf", [c for _, c in self.plates])
+        return settings
+
+    def _threshold(self, key, confidences):
+        floor = DEFAULT_SETTINGS[key]
+        return round(min(CONF_CAPS[key], max(floor, percentile(confidences, 5) * CONF_MARGIN)), 3)
+
+    def stats(self):
+        def summary(samples):
+            sizes = [s for s, _ in samples]
+            confs = [c for _, c in samples]
+            return {
+                "count": len(samples),
+                "size_p5": round(percentile(sizes, 5), 4),
+                "size_p50": round(percentile(sizes, 50), 4),
+                "conf_p5": round(percentile(confs, 5), 3),
+                "conf_p50": round(percentile(confs, 50), 3)
+            }
+        return {"frames": self.frames, "skipped": self.skipped,
+                "riders": summary(self.riders), "plates": summary(self.plates)}
+
+    def report(self):
+        return {"state": "calibrating", "frames": self.frames, "target": self.target,
+                "skipped": self.skipped, "started_at": self.started_at.isoformat() + "Z"}
+
+
+class CalibrationManager:
+    """
+    Runs calibration sessions and serves the resulting per-source inference
+    profiles (SourceProfile rows, cached in memory). A source being
+    calibrated runs with the default settings so the samples are unbiased.
+    """
+
+    def __init__(self, app, db, model):
+        self.app = app
+        self.db = db
+        self.model = model
+        self._profiles = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self.app.app_context():
+            rows = self.model.query.all()
+        with self._lock:
+            self._profiles = {row.source: self._row_settings(row) for row in rows}
+        print(f"DEBUG: Loaded calibrated inference profiles for {len(rows)} sources")
+
+    @staticmethod
+    def _row_settings(row):
+        return {key: getattr(row, key) for key in DEFAULT_SETTINGS}
+
+    def get(self, source):
+        """Calibrated settings for `source`, or None to use the defaults."""
+        with self._lock:
+            if source in self._sessions:
+                return None
+            return self._profiles.get(source)
+
+    def start(self, source, frames=200):
+        with self._lock:
+            session = self._sessions[source] = CalibrationSession(source, frames)
+        print(f"DEBUG: Calibrating {source} over {frames} frames")
+        return session.report()
+
+    def cancel(self, source):
+        with self._lock:
+            return self._sessions.pop(source, None) is not None
+
+    def observe(self, source, detections, extent, full_quality=True):
+        """Feed one processed frame to the source's session, if any."""
+        with self._lock:
+            session = self._sessions.get(source)
+            if session is None:
+                return
+            if not full_quality:
+                # Degraded frames ran with smaller models; they'd bias the samples
+                session.skipped += 1
+                return
+            session.add(detections, extent)
+            if not session.done:
+                return
+            del self._sessions[source]
+        self._finish(session)
+
+    def _finish(self, session):
+        settings = session.settings()
+        with self.app.app_context():
+            row = self.model.query.filter_by(source=session.source).first()
+            if row is None:
+                row = self.model(source=session.source)
+                self.db.session.add(row)
+            for key, value in settings.items():
+                setattr(row, key, value)
+            row.frames = session.frames
+            row.stats = session.stats()
+            row.calibrated_at = datetime.utcnow()
+            self.db.session.commit()
+        with self._lock:
+            self._profiles[session.source] = settings
+        print(f"DEBUG: Calibrated {session.source}: {settings} "
+              f"(est. CPU saving {self.estimated_saving(settings):.0%})")
+
+    def delete(self, source):
+        """Drop the calibrated profile; the source goes back to the defaults."""
+        self.cancel(source)
+        row = self.model.query.filter_by(source=source).first()
+        if row is not None:
+            self.db.session.delete(row)
+            self.db.session.commit()
+        with self._lock:
+            self._profiles.pop(source, None)
+
+    @staticmethod
+    def estimated_saving(settings):
+        return 1.0 - relative_cost(settings) / float(relative_cost(DEFAULT_SETTINGS))
+
+    def report(self, source):
+        with self._lock:
+            session = self._sessions.get(source)
+            settings = self._profiles.get(source)
+        if session is not None:
+            return session.report()
+        if settings is None:
+            return None
+        row = self.model.query.filter_by(source=source).first()
+        return {
+            "state": "calibrated",
+            "profile": settings,
+            "default": DEFAULT_SETTINGS,
+            "estimated_cpu_saving": round(self.estimated_saving(settings), 3),
+            "frames": row.frames if row else None,
+            "stats": row.stats if row else None,
+            "calibrated_at": row.calibrated_at.isoformat() + "Z" if row and row.calibrated_at else None
+        }
+
+    def sources(self):
+        with self._lock:
+            names = set(self._profiles) | set(self._sessions)
+        return {source: self.report(source) for source in sorted(names)}
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from detections import box_arrays
+from metrics import RollingWindow
+
+# COCO class ids the gate looks for (stock yolov8n)
+GATE_CLASSES = {0: "person", 3: "motorcycle"}
+
+# Crop to the candidates only when their union covers less than this much
+# of the frame; otherwise the full frame is cheaper than the bookkeeping.
+REGION_MAX_FRACTION = 0.6
+
+# Padding around the candidate union, as a fraction of its size. The helmet
+# and plate boxes extend past a tight person/motorcycle box (the plate sits
+# below the bike, the head above the person).
+REGION_PADDING = 0.25
+
+
+class CascadeGate:
+    """
+    Cheap first stage: a small COCO detector at low resolution decides
+    whether a frame contains any two-wheeler candidates, and where. Frames
+    without candidates skip the helmet and plate models entirely.
+    """
+
+    def __init__(self, model, imgsz=320, conf=0.25, classes=None, crop_regions=True):
+        self.model = model
+        self.imgsz = imgsz
+        self.conf = conf
+        self.classes = list(classes or GATE_CLASSES)
+        self.crop_regions = crop_regions
+        self.gate_ms = RollingWindow()
+        self._lock = threading.Lock()
+        # frames in / rejected per stage; "gate" rejects on no candidates,
+        # "helmet" and "plate" count frames where the stage found nothing
+        self.stages = {name: {"frames": 0, "rejected": 0} for name in ("gate", "helmet", "plate")}
+        self.cropped = 0
+
+    def count(self, stage, rejected):
+        with self._lock:
+            self.stages[stage]["frames"] += 1
+            if rejected:
+                self.stages[stage]["rejected"] += 1
+
+    def check(self, frame):
+        """
+        Returns (passed, region). `region` is an (x1, y1, x2, y2) crop in
+        frame coordinates covering all candidates, or None for the full frame.
+        """
+        started = time.monotonic()
+        try:
+            candidates, _, _ = box_arrays(self.model(frame, conf=self.conf, imgsz=self.imgsz, classes=self.classes,
+                                                     verbose=False)[0])
+        except Exception as e:
+            # A broken gate must never hide violations
+            print(f"WARN: Cascade gate failed, running full models: {e}")
+            return True, None
+        finally:
+            self.gate_ms.add((time.monotonic() - started) * 1000)
+
+        self.count("gate", len(candidates) == 0)
+        if len(candidates) == 0:
+            return False, None
+        region = self._region(candidates, frame.shape[:2]) if self.crop_regions else None
+        if region is not None:
+            with self._lock:
+                self.cropped += 1
+        return True, region
+
+    def _region(self, candidates, shape):
+        h, w = shape
+        x1, y1 = candidates[:, :2].min(axis=0).tolist()
+        x2, y2 = candidates[:, 2:].max(axis=0).tolist()
+        pad_x, pad_y = (x2 - x1) * REGION_PADDING, (y2 - y1) * REGION_PADDING
+        x1, y1 = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+        x2, y2 = min(w, int(x2 + pad_x)), min(h, int(y2 + pad_y))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        if (x2 - x1) * (y2 - y1) > REGION_MAX_FRACTION * w * h:
+            return None
+        return x1, y1, x2, y2
+
+    def metrics(self):
+        with self._lock:
+            stages = {}
+            for name, s in self.stages.items():
+                stages[name] = {**s, "reject_rate": round(s["rejected"] / s["frames"], 3) if s["frames"] else 0.0}
+            cropped = self.cropped
+        return {
+            "imgsz": self.imgsz,
+            "conf": self.conf,
+            "stages": stages,
+            "cropped": cropped,
+            "gate_ms": self.gate_ms.summary()
+        }
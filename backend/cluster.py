@@ -0,0 +1,446 @@
+import bisect
+import hashlib
+import threading
+import time
+from collections import deque
+
+import requests
+
+from metrics import RollingWindow
+
+# Multi-node inference. A coordinator (coordinator.py) sits in front of
+# several ordinary app.py nodes and sends every /detect frame to the node
+# that owns its source tag on a consistent-hash ring. Per-source state
+# (the dedup window, the watchlist alert window, scheduler settings) lives
+# in the owning node's memory, so a camera has to keep hitting the same
+# node; when ownership moves, that state is handed over first.
+
+THROUGHPUT_WINDOW_SECONDS = 10
+COUNTERS = ("forwarded", "ok", "shed", "errors", "failovers")
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent-hash ring with `vnodes` points per node. Adding or removing
+    a node only moves the keys between that node's points and their
+    predecessors, about 1/N of all sources.
+    """
+
+    def __init__(self, nodes=(), vnodes=100):
+        self.vnodes = vnodes
+        self.nodes = set()
+        self._points = []  # sorted (hash, node)
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.nodes
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        self._points = sorted(self._points + [(_hash(f"{node}#{i}"), node) for i in range(self.vnodes)])
+
+    def remove(self, node):
+        self.nodes.discard(node)
+        self._points = [p for p in self._points if p[1] != node]
+
+    def copy(self):
+        ring = HashRing(vnodes=self.vnodes)
+        ring.nodes, ring._points = set(self.nodes), list(self._points)
+        return ring
+
+    def nodes_for(self, key, count=1):
+        """The first `count` distinct nodes clockwise from the key: owner, then fallbacks."""
+        if not self._points:
+            return []
+        found = []
+        start = bisect.bisect(self._points, (_hash(key), ''))
+        for i in range(len(self._points)):
+            node = self._points[(start + i) % len(self._points)][1]
+            if node not in found:
+                found.append(node)
+                if len(found) == count:
+                    break
+        return found
+
+    def node_for(self, key):
+        nodes = self.nodes_for(key)
+        return nodes[0] if nodes else None
+
+
+class Node:
+    """One inference node as the coordinator sees it."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.state = 'joining'  # joining | up | down | draining
+        self.failures = 0
+        self.successes = 0
+        self.health = {}  # last /health payload
+        self.health_ms = None
+        self.in_flight = 0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.latency_ms = RollingWindow()
+        self.completed = deque()  # monotonic completion times inside the throughput window
+
+    def fps(self, now):
+        cutoff = now - THROUGHPUT_WINDOW_SECONDS
+        while self.completed and self.completed[0] < cutoff:
+            self.completed.popleft()
+        return len(self.completed) / THROUGHPUT_WINDOW_SECONDS
+
+    def report(self, now, sources):
+        return {
+            "url": self.url,
+            "state": self.state,
+            "sources": sources,
+            "in_flight": self.in_flight,
+            "fps": round(self.fps(now), 2),
+            "counters": dict(self.counters),
+            "latency_ms": self.latency_ms.summary(),
+            "health_ms": self.health_ms,
+            "queue": self.health.get("queue"),
+            "degradation": self.health.get("degradation")
+        }
+
+
+class NoNodeAvailable(Exception):
+    pass
+
+
+class ClusterCoordinator:
+    """
+    Routes /detect frames to inference nodes by consistent hashing on the
+    source tag, and keeps the ring in line with node health.
+
+    - a node joins (or recovers) only after the sources it takes over have
+      been exported from their previous owners and imported into it; frames
+      for those sources wait at the coordinator while that happens
+    - a node leaving gracefully hands its sources to their new owners
+    - a node failing `fail_after` health checks in a row, or refusing a
+      connection, drops out of the ring at once; its sources fail over to
+      the next node on the ring and its in-memory state is lost, which costs
+      at most one duplicate record per source
+    - a failed node is re-admitted after `recover_after` good checks
+    """
+
+    def __init__(self, nodes=(), vnodes=100, health_interval=2.0, health_timeout=1.0, fail_after=2,
+                 recover_after=2, request_timeout=60, handoff_timeout=5.0):
+        self.vnodes = vnodes
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.fail_after = fail_after
+        self.recover_after = recover_after
+        self.request_timeout = request_timeout
+        self.handoff_timeout = handoff_timeout
+
+        self.nodes = {}  # url -> Node, every member including down ones
+        self.ring = HashRing(vnodes=vnodes)  # up nodes only
+        self._lock = threading.Lock()
+        self._membership_lock = threading.Lock()  # one join/leave/failover at a time
+        self._idle = threading.Condition(self._lock)
+        self._paused = {}  # source -> Event set once its handoff is done
+        self._in_flight = {}  # source -> frames being forwarded
+        self._seen = {}  # source -> frames routed
+        self._local = threading.local()
+        self._thread = None
+        self._stop = threading.Event()
+        self.handoffs = {"runs": 0, "sources": 0, "failed": 0}
+        self._departed = dict.fromkeys(COUNTERS, 0)  # counters of nodes that left, kept in the totals
+        for url in nodes:
+            self.nodes[url.rstrip('/')] = Node(url)
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def start(self):
+        """Admit the nodes that answer a health check, then keep checking in the background."""
+        self.check_health()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._health_loop, name="cluster-health", daemon=True)
+            self._thread.start()
+        print(f"DEBUG: Cluster coordinator started: {len(self.ring)}/{len(self.nodes)} nodes up")
+
+    def shutdown(self):
+        self._stop.set()
+
+    # --- Routing ----------------------------------------------------------------
+
+    def _acquire(self, source):
+        """Wait out a handoff of this source, then count the frame as in flight."""
+        while True:
+            with self._lock:
+                paused = self._paused.get(source)
+                if paused is None:
+                    self._in_flight[source] = self._in_flight.get(source, 0) + 1
+                    self._seen[source] = self._seen.get(source, 0) + 1
+                    return self.ring.nodes_for(source, 2)
+            paused.wait(self.handoff_timeout)
+
+    def _release(self, source):
+        with self._lock:
+            self._in_flight[source] -= 1
+            if not self._in_flight[source]:
+                del self._in_flight[source]
+                self._idle.notify_all()
+
+    def forward(self, source, files, data):
+        """
+        POST one frame to the source's owner. Returns (node url, response).
+        A node that refuses the connection is failed over to the next one on
+        the ring; a slow node is not retried elsewhere.
+        """
+        candidates = self._acquire(source)
+        try:
+            if not candidates:
+                raise NoNodeAvailable("No inference node is up")
+            for attempt, url in enumerate(candidates):
+                node = self.nodes[url]
+                with self._lock:
+                    node.in_flight += 1
+                    node.counters["forwarded"] += 1
+                    if attempt:
+                        node.counters["failovers"] += 1
+                started = time.perf_counter()
+                try:
+                    response = self._session().post(f"{url}/detect", files=files, data=data,
+                                                    timeout=self.request_timeout)
+                except requests.ConnectionError as e:
+                    with self._lock:
+                        node.in_flight -= 1
+                        node.counters["errors"] += 1
+                    print(f"WARN: Node {url} refused /detect ({e.__class__.__name__}), failing over")
+                    self.mark_down(url)
+                    continue
+                except requests.RequestException:
+                    with self._lock:
+                        node.in_flight -= 1
+                        node.counters["errors"] += 1
+                    raise
+                self._record(node, response.status_code, (time.perf_counter() - started) * 1000)
+                return url, response
+            raise NoNodeAvailable("Every candidate node refused the connection")
+        finally:
+            self._release(source)
+
+    def _record(self, node, status, ms):
+        with self._lock:
+            node.in_flight -= 1
+            if status == 200:
+                node.counters["ok"] += 1
+                node.latency_ms.add(ms)
+                node.completed.append(time.monotonic())
+            elif status in (429, 503):
+                node.counters["shed"] += 1
+            else:
+                node.counters["errors"] += 1
+
+    def any_node(self):
+        """An up node for requests that aren't tied to a source (shared-database reads)."""
+        with self._lock:
+            up = sorted(self.ring.nodes)
+        if not up:
+            raise NoNodeAvailable("No inference node is up")
+        return up[0]
+
+    def gather(self, path):
+        """{url: JSON reply} of a GET on every up node; nodes that fail to answer are left out."""
+        with self._lock:
+            up = sorted(self.ring.nodes)
+        replies = {}
+        for url in up:
+            try:
+                response = self._session().get(f"{url}{path}", timeout=self.health_timeout)
+                response.raise_for_status()
+                replies[url] = response.json()
+            except (requests.RequestException, ValueError) as e:
+                print(f"WARN: {url}{path} failed, left out: {e}")
+        return replies
+
+    # --- Membership -------------------------------------------------------------
+
+    def join(self, url):
+        url = url.rstrip('/')
+        with self._lock:
+            node = self.nodes.get(url)
+            if node is None:
+                node = self.nodes[url] = Node(url)
+            elif node.state == 'up':
+                return node
+            node.state = 'joining'
+        if self._check(node):
+            self._bring_up(node)
+        return node
+
+    def leave(self, url):
+        """Take a node out of service, handing its sources to their new owners first."""
+        url = url.rstrip('/')
+        with self._membership_lock:
+            node = self.nodes.get(url)
+            if node is None:
+                return None
+            if url in self.ring:
+                node.state = 'draining'
+                ring = self.ring.copy()
+                ring.remove(url)
+                self._handoff(ring, [url])
+            with self._lock:
+                del self.nodes[url]
+                for key in COUNTERS:
+                    self._departed[key] += node.counters[key]
+        print(f"DEBUG: Node {url} left the cluster")
+        return node
+
+    def mark_down(self, url):
+        with self._membership_lock:
+            node = self.nodes.get(url)
+            if node is None or node.state == 'down':
+                return
+            with self._lock:
+                node.state = 'down'
+                node.successes = 0
+                ring = self.ring.copy()
+                ring.remove(url)
+                self.ring = ring
+        print(f"WARN: Node {url} marked down; its sources fail over ({len(self.ring)} nodes up)")
+
+    def _bring_up(self, node):
+        with self._membership_lock:
+            if node.url not in self.nodes or node.state == 'up':
+                return
+            ring = self.ring.copy()
+            ring.add(node.url)
+            self._handoff(ring, list(self.ring.nodes))
+            node.state = 'up'
+        print(f"DEBUG: Node {node.url} is up ({len(self.ring)} nodes)")
+
+    def _handoff(self, new_ring, previous_owners):
+        """
+        Move every source whose owner changes under new_ring from
+        previous_owners to its new owner, then switch to new_ring. Frames for
+        the moving sources are held until the switch.
+        """
+        moves = {}  # (from, to) -> [sources]
+        for url in previous_owners:
+            try:
+                listed = self._session().get(f"{url}/cluster/state", timeout=self.health_timeout).json()["sources"]
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"WARN: Could not list sources on {url}: {e}")
+                listed = []
+            with self._lock:
+                # Sources routed here but with no state yet still move with the ring
+                listed = set(listed) | {s for s in self._seen if self.ring.node_for(s) == url}
+            for source in listed:
+                owner = new_ring.node_for(source)
+                if owner is not None and owner != url:
+                    moves.setdefault((url, owner), []).append(source)
+
+        moving = [s for sources in moves.values() for s in sources]
+        events = {}
+        with self._lock:
+            for source in moving:
+                events[source] = self._paused[source] = threading.Event()
+            # Frames already on their way to the old owner finish there first
+            deadline = time.monotonic() + self.handoff_timeout
+            while any(s in self._in_flight for s in moving) and time.monotonic() < deadline:
+                self._idle.wait(max(0.0, deadline - time.monotonic()))
+        try:
+            for (src_url, dst_url), sources in moves.items():
+                try:
+                    state = self._session().post(f"{src_url}/cluster/handoff", json={"sources": sources},
+                                                 timeout=self.handoff_timeout).json()["sources"]
+                    self._session().put(f"{dst_url}/cluster/state", json={"sources": state},
+                                        timeout=self.handoff_timeout).raise_for_status()
+                    self.handoffs["sources"] += len(sources)
+                except (requests.RequestException, ValueError, KeyError) as e:
+                    # The sources still move; at worst one duplicate record each
+                    self.handoffs["failed"] += len(sources)
+                    print(f"WARN: Handoff of {len(sources)} sources {src_url} -> {dst_url} failed: {e}")
+            self.handoffs["runs"] += 1
+        finally:
+            with self._lock:
+                self.ring = new_ring
+                for source in moving:
+                    del self._paused[source]
+            for event in events.values():
+                event.set()
+        if moving:
+            print(f"DEBUG: Handed off {len(moving)} sources across {len(moves)} node pairs")
+
+    # --- Health -----------------------------------------------------------------
+
+    def _check(self, node):
+        started = time.perf_counter()
+        try:
+            response = self._session().get(f"{node.url}/health", timeout=self.health_timeout)
+            response.raise_for_status()
+            payload = response.json()
+        except (requests.RequestException, ValueError):
+            node.failures += 1
+            node.successes = 0
+            return False
+        node.health = payload
+        node.health_ms = round((time.perf_counter() - started) * 1000, 1)
+        node.failures = 0
+        node.successes += 1
+        return True
+
+    def check_health(self):
+        for node in list(self.nodes.values()):
+            healthy = self._check(node)
+            if node.state == 'up' and not healthy and node.failures >= self.fail_after:
+                self.mark_down(node.url)
+            elif node.state == 'joining' and healthy:
+                self._bring_up(node)
+            elif node.state == 'down' and healthy and node.successes >= self.recover_after:
+                print(f"DEBUG: Node {node.url} recovered")
+                self._bring_up(node)
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                print(f"ERROR: Cluster health check failed: {e}")
+
+    # --- Reporting --------------------------------------------------------------
+
+    def assignments(self):
+        """Current owner of every source the coordinator has routed."""
+        with self._lock:
+            return {source: self.ring.node_for(source) for source in sorted(self._seen)}
+
+    def metrics(self):
+        now = time.monotonic()
+        assigned = {}
+        for source, url in self.assignments().items():
+            assigned[url] = assigned.get(url, 0) + 1
+        with self._lock:
+            nodes = [n.report(now, assigned.get(n.url, 0)) for n in self.nodes.values()]
+            latencies = [ms for n in self.nodes.values() for ms in n.latency_ms.values()]
+        totals = {key: self._departed[key] + sum(n["counters"][key] for n in nodes) for key in COUNTERS}
+        latency = RollingWindow(size=max(1, len(latencies)))
+        for ms in latencies:
+            latency.add(ms)
+        return {
+            "nodes_up": sum(n["state"] == 'up' for n in nodes),
+            "nodes": nodes,
+            "sources": len(self._seen),
+            "fps": round(sum(n["fps"] for n in nodes), 2),
+            "counters": totals,
+            "latency_ms": latency.summary(),
+            "queue_depth": sum((n["queue"] or {}).get("depth", 0) for n in nodes),
+            "handoffs": dict(self.handoffs)
+        }
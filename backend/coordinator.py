@@ -0,0 +1,144 @@
+import argparse
+import os
+
+import requests
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask_cors import CORS
+
+from cluster import ClusterCoordinator, NoNodeAvailable
+
+# Front door for several inference nodes (ordinary app.py / gunicorn
+# instances sharing one database). /detect is routed by source tag, see
+# cluster.py; everything else goes to any healthy node, which is fine for
+# the database-backed endpoints (/stats, /logs, /export, ...). In-memory
+# views such as /alerts and /metrics are per node; /cluster and
+# /feeds/health aggregate.
+#
+#   SAFECITY_PORT=5001 python app.py &  SAFECITY_PORT=5002 python app.py &
+#   python coordinator.py --nodes http://127.0.0.1:5001,http://127.0.0.1:5002 --port 5000
+#
+#   curl localhost:5000/cluster                                   # nodes, load, throughput
+#   curl -X POST localhost:5000/cluster/nodes -d '{"url": "http://127.0.0.1:5003"}' -H 'Content-Type: application/json'
+#   curl -X DELETE 'localhost:5000/cluster/nodes?url=http://127.0.0.1:5001'
+
+# Hop-by-hop and length headers are recomputed for the proxied response
+SKIP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-encoding', 'content-length'}
+
+app = Flask(__name__)
+CORS(app)
+
+app.config['CLUSTER_NODES'] = [u for u in os.environ.get('SAFECITY_CLUSTER_NODES', '').split(',') if u]
+app.config['CLUSTER_VNODES'] = int(os.environ.get('SAFECITY_CLUSTER_VNODES', 100))
+app.config['CLUSTER_HEALTH_INTERVAL'] = float(os.environ.get('SAFECITY_CLUSTER_HEALTH_INTERVAL', 2.0))
+app.config['CLUSTER_FAIL_AFTER'] = int(os.environ.get('SAFECITY_CLUSTER_FAIL_AFTER', 2))
+app.config['CLUSTER_RECOVER_AFTER'] = int(os.environ.get('SAFECITY_CLUSTER_RECOVER_AFTER', 2))
+
+cluster = ClusterCoordinator(
+    app.config['CLUSTER_NODES'],
+    vnodes=app.config['CLUSTER_VNODES'],
+    health_interval=app.config['CLUSTER_HEALTH_INTERVAL'],
+    fail_after=app.config['CLUSTER_FAIL_AFTER'],
+    recover_after=app.config['CLUSTER_RECOVER_AFTER']
+)
+
+
+def relay(response, node):
+    headers = [(k, v) for k, v in response.raw.headers.items() if k.lower() not in SKIP_HEADERS]
+    headers.append(('X-SafeCity-Node', node))
+    return Response(response.content, status=response.status_code, headers=headers)
+
+
+@app.route('/detect', methods=['POST'])
+def detect():
+    if 'image' not in request.files:
+        return jsonify({"error": "No image provided"}), 400
+    source = request.form.get('source', 'IMAGE-EVIDENCE')
+    upload = request.files['image']
+    # Read once: a failover re-sends the same bytes to the next node
+    files = {"image": (upload.filename or "frame.jpg", upload.read(), upload.mimetype or "image/jpeg")}
+    try:
+        node, response = cluster.forward(source, files, request.form.to_dict())
+    except NoNodeAvailable as e:
+        response = jsonify({"error": str(e), "shed": True, "retry_after": 5})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    except requests.RequestException as e:
+        return jsonify({"error": f"Inference node failed: {e}"}), 502
+    return relay(response, node)
+
+
+@app.route('/cluster', methods=['GET'])
+def get_cluster():
+    return jsonify(cluster.metrics())
+
+
+@app.route('/cluster/assignments', methods=['GET'])
+def get_assignments():
+    return jsonify(cluster.assignments())
+
+
+@app.route('/feeds/health', methods=['GET'])
+def get_feed_health():
+    # Each node only measures the sources routed to it. After a handoff the
+    # previous owner still remembers a source; the freshest report wins.
+    replies = cluster.gather('/feeds/health')
+    feeds, seen = [], set()
+    merged = sorted((dict(feed, node=url) for url, reply in replies.items() for feed in reply.get("feeds", [])),
+                    key=lambda feed: feed["seconds_since_frame"])
+    for feed in merged:
+        if feed["source"] not in seen:
+            seen.add(feed["source"])
+            feeds.append(feed)
+    settings = next(iter(replies.values()), {})
+    return jsonify({"feeds": feeds, "online_seconds": settings.get("online_seconds"),
+                    "standby_seconds": settings.get("standby_seconds"), "nodes": sorted(replies)})
+
+
+@app.route('/cluster/nodes', methods=['POST'])
+def join_node():
+    url = (request.get_json(silent=True) or {}).get('url')
+    if not url:
+        return jsonify({"error": "url is required"}), 400
+    node = cluster.join(url)
+    return jsonify({"url": node.url, "state": node.state}), 201 if node.state == 'up' else 202
+
+
+@app.route('/cluster/nodes', methods=['DELETE'])
+def leave_node():
+    node = cluster.leave(request.args.get('url', ''))
+    if node is None:
+        return jsonify({"error": "Unknown node"}), 404
+    return jsonify({"url": node.url, "state": "left"})
+
+
+@app.route('/', defaults={'path': ''}, methods=['GET', 'POST', 'PUT', 'DELETE'])
+@app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+def proxy(path):
+    try:
+        node = cluster.any_node()
+    except NoNodeAvailable as e:
+        return jsonify({"error": str(e)}), 503
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in SKIP_HEADERS | {'host'}}
+    try:
+        upstream = requests.request(request.method, f"{node}/{path}", params=request.args, data=request.get_data(),
+                                    headers=headers, stream=True, timeout=(5, None))
+    except requests.RequestException as e:
+        return jsonify({"error": f"Node {node} failed: {e}"}), 502
+    # Streamed through, so /export and /alerts/stream work behind the coordinator
+    out = [(k, v) for k, v in upstream.raw.headers.items() if k.lower() not in SKIP_HEADERS - {'content-encoding'}]
+    out.append(('X-SafeCity-Node', node))
+    return Response(stream_with_context(upstream.raw.stream(64 * 1024, decode_content=False)),
+                    status=upstream.status_code, headers=out)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Route /detect across several SafeCity inference nodes")
+    parser.add_argument("--nodes", help="comma-separated node URLs (default: SAFECITY_CLUSTER_NODES)")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('SAFECITY_PORT', 5000)))
+    args = parser.parse_args()
+    if args.nodes:
+        for url in args.nodes.split(','):
+            cluster.join(url)
+    cluster.start()
+    app.run(host='0.0.0.0', port=args.port, debug=False, threaded=True)
@@ -0,0 +1,87 @@
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+
+def event_key(det):
+    """
+    (type, plate) a stored record is identified by, or None for a plate box
+    that was never read. Plates carry their own read; riders carry the plate
+    associated with them.
+    """
+    d_type = det['type']
+    if d_type == 'plate':
+        if not det.get('ocr'):
+            return None
+        plate = det.get('label')
+    else:
+        plate = det.get('plate_number')
+    if not plate or plate == "NUMBER PLATE":
+        plate = "UNKNOWN"
+    return d_type, plate
+
+
+class RecentEventCache:
+    """
+    Per-source memory of recently stored events, used to debounce repeats
+    ("one violation = one record") without querying the database.
+    """
+
+    def __init__(self, window_seconds=8):
+        self.window = timedelta(seconds=window_seconds)
+        self._events = {}  # source -> deque of (timestamp, type, plate)
+        self._lock = threading.Lock()
+
+    def _prune(self, events, now):
+        cutoff = now - self.window
+        while events and events[0][0] < cutoff:
+            events.popleft()
+
+    def check_and_add(self, source, d_type, plate, now=None, exact=False):
+        """
+        Return True if the event is a recent duplicate, otherwise remember it.
+        exact=True matches only the same plate, however short (watchlist hits).
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            events = self._events.setdefault(source, deque())
+            self._prune(events, now)
+
+            for _, e_type, e_plate in events:
+                if e_type != d_type:
+                    continue
+                if exact or (len(plate) > 3 and plate != "UNKNOWN"):
+                    # Strong check: must match specific plate
+                    if e_plate == plate:
+                        return True
+                else:
+                    # Weak check: If plate is unknown, we assume ANY recent violation
+                    # of the same type from this camera is the same event.
+                    return True
+
+            events.append((now, d_type, plate))
+            return False
+
+    def sources(self):
+        with self._lock:
+            return list(self._events.keys())
+
+    def export(self, source, remove=False, now=None):
+        """
+        The source's events still inside the window, as [iso timestamp, type,
+        plate] lists, for handing the camera over to another node.
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            events = self._events.pop(source, None) if remove else self._events.get(source)
+            if not events:
+                return []
+            self._prune(events, now)
+            return [[ts.isoformat(), d_type, plate] for ts, d_type, plate in events]
+
+    def restore(self, source, events):
+        """Merge events produced by export() into the source's window."""
+        with self._lock:
+            merged = set(self._events.get(source, ()))
+            merged.update((datetime.fromisoformat(ts), d_type, plate) for ts, d_type, plate in events)
+            self._events[source] = deque(sorted(merged))
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from metrics import RollingWindow
+
+# Ordered from full quality to cheapest. Each level only lists what it
+# overrides in AIProcessor.process_frame.
+DEGRADATION_LEVELS = [
+    {"name": "full", "plate_imgsz": 1280, "ocr_profile": "full", "plate_enabled": True},
+    {"name": "plate-960", "plate_imgsz": 960, "ocr_profile": "full", "plate_enabled": True},
+    {"name": "plate-640", "plate_imgsz": 640, "ocr_profile": "full", "plate_enabled": True},
+    {"name": "fast-ocr", "plate_imgsz": 640, "ocr_profile": "fast", "plate_enabled": True},
+    {"name": "helmet-only", "plate_imgsz": 640, "ocr_profile": "fast", "plate_enabled": False},
+]
+
+
+class DegradationController:
+    """
+    Steps inference quality down a ladder of levels while /detect misses its
+    latency SLO (p95) or the admission queue backs up, and back up once load
+    has dropped. Hysteresis: separate high/low thresholds, a minimum number
+    of samples at the current level and a cooldown between transitions.
+    """
+
+    def __init__(self, levels=None, p95_high_ms=1500, p95_low_ms=600, queue_high=4, queue_low=0,
+                 window=50, min_samples=10, cooldown_seconds=10, queue_depth=None):
+        self.levels = levels or DEGRADATION_LEVELS
+        self.p95_high_ms = p95_high_ms
+        self.p95_low_ms = p95_low_ms
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.min_samples = min_samples
+        self.cooldown = cooldown_seconds
+        self.queue_depth = queue_depth or (lambda: 0)
+
+        self.level = 0
+        self.latency_ms = RollingWindow(window)
+        self.transitions = 0
+        self._last_change = 0.0
+        self._lock = threading.Lock()
+
+    def profile(self):
+        return self.levels[self.level]
+
+    def observe(self, latency_ms):
+        """Record one end-to-end /detect latency and re-evaluate the level."""
+        self.latency_ms.add(latency_ms)
+        self.evaluate()
+
+    def evaluate(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_change < self.cooldown:
+                return self.level
+            depth = self.queue_depth()
+            enough = len(self.latency_ms) >= self.min_samples
+            p95 = self.latency_ms.summary()["p95"] if enough else 0.0
+
+            overloaded = depth >= self.queue_high or (enough and p95 > self.p95_high_ms)
+            relaxed = depth <= self.queue_low and enough and p95 < self.p95_low_ms
+
+            if overloaded and self.level < len(self.levels) - 1:
+                self._set_level(self.level + 1, f"p95={p95:.0f}ms depth={depth}", now)
+            elif relaxed and self.level > 0:
+                self._set_level(self.level - 1, f"p95={p95:.0f}ms depth={depth}", now)
+            return self.level
+
+    def _set_level(self, level, reason, now):
+        previous = self.levels[self.level]["name"]
+        self.level = level
+        self.transitions += 1
+        self._last_change = now
+        # Judge the new level on its own latency, not the old level's
+        self.latency_ms.clear()
+        print(f"WARN: Inference degradation {previous} -> {self.levels[level]['name']} ({reason})")
+
+    def report(self, profile=None):
+        """Level descriptor for the current level, or for the profile a frame ran with."""
+        if profile is not None:
+            names = [l["name"] for l in self.levels]
+            if profile.get("name") in names:
+                return {"level": names.index(profile["name"]), "name": profile["name"]}
+        return {"level": self.level, "name": self.levels[self.level]["name"]}
+
+    def metrics(self):
+        return {
+            **self.report(),
+            "levels": [l["name"] for l in self.levels],
+            "transitions": self.transitions,
+            "p95_high_ms": self.p95_high_ms,
+            "p95_low_ms": self.p95_low_ms,
+            "latency_ms": self.latency_ms.summary()
+        }
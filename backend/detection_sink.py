@@ -0,0 +1,146 @@
+import atexit
+import threading
+import time
+
+from metrics import RollingWindow
+
+
+class DetectionSink:
+    """
+    Write-behind buffer for Detection rows.
+
+    Request handlers only append plain dicts; a single background thread
+    flushes them with one executemany INSERT per batch, either every
+    `flush_interval_ms` or as soon as `max_batch` rows are pending.
+    """
+
+    def __init__(self, app, db, table, flush_interval_ms=250, max_batch=500, max_pending=20000,
+                 before_write=None, after_write=None):
+        self.app = app
+        self.db = db
+        self.table = table
+        # Called with each batch before it is inserted (e.g. to create partitions)
+        self.before_write = before_write
+        # Called with each batch once it is committed (e.g. to update search indexes)
+        self.after_write = after_write
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+        self.flush_latency_ms = RollingWindow()
+        self.batch_sizes = RollingWindow()
+        self.rows_written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="detection-sink", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+        print(f"DEBUG: Detection sink started (interval={int(self.flush_interval * 1000)}ms, batch={self.max_batch})")
+
+    def submit(self, rows):
+        if not rows:
+            return
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            self._buffer.extend(rows)
+            overflow = len(self._buffer) - self.max_pending
+            if overflow > 0:
+                # Never let a stalled database grow the buffer without bound
+                del self._buffer[:overflow]
+                self.dropped += overflow
+                print(f"WARN: Detection sink overflow, dropped {overflow} oldest rows")
+            if len(self._buffer) >= self.max_batch:
+                self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def flush(self):
+        """Synchronously write everything that is currently buffered."""
+        while True:
+            with self._cond:
+                batch = self._buffer[:self.max_batch]
+                del self._buffer[:len(batch)]
+            if not batch or not self._write(batch):
+                return
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped and len(self._buffer) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                if self._stopped:
+                    return
+                batch = self._buffer[:self.max_batch]
+                del self._buffer[:len(batch)]
+            if batch and not self._write(batch):
+                # Back off before the retry, outside the write lock so flush()
+                # and stop() never wait for it (stop() wakes us up early)
+                with self._cond:
+                    if not self._stopped:
+                        self._cond.wait(self.flush_interval)
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        with self._write_lock:
+            try:
+                with self.app.app_context():
+                    if self.before_write is not None:
+                        self.before_write(batch)
+                    with self.db.engine.begin() as conn:
+                        conn.execute(self.table.insert(), batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"ERROR: Detection sink flush of {len(batch)} rows failed: {e}")
+                with self._cond:
+                    # Put the batch back so the next cycle retries it
+                    self._buffer[:0] = batch
+                return False
+
+        if self.after_write is not None:
+            try:
+                self.after_write(batch)
+            except Exception as e:
+                # The rows are stored; a stale index must not make us insert them twice
+                print(f"WARN: Detection sink after_write hook failed: {e}")
+
+        self.flush_latency_ms.add((time.perf_counter() - start) * 1000)
+        self.batch_sizes.add(len(batch))
+        self.rows_written += len(batch)
+        self.flushes += 1
+        return True
+
+    def metrics(self):
+        return {
+            "pending": self.pending(),
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "flush_latency_ms": self.flush_latency_ms.summary(),
+            "batch_size": self.batch_sizes.summary()
+        }
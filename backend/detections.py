@@ -0,0 +1,76 @@
+import numpy as np
+
+# BGR annotation colour per stored type (shared, never rebuilt per detection)
+COLORS = {"COMPLIANT": (0, 255, 0), "NO_HELMET": (0, 0, 255), "plate": (0, 255, 255)}
+
+
+def box_arrays(result):
+    """
+    (xyxy, cls, conf) of one ultralytics result as NumPy arrays: one
+    device-to-host transfer per field instead of a few tensor ops per box.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.int64), np.zeros(0, np.float32)
+    return (boxes.xyxy.cpu().numpy().reshape(-1, 4), boxes.cls.cpu().numpy().astype(np.int64),
+            boxes.conf.cpu().numpy())
+
+
+class DetectionRecord:
+    """
+    One detection as produced by AIProcessor. Slots keep it small and cheap
+    to build for frames with dozens of boxes; item access (det['box'],
+    det.get('ocr'), det['type'] = ...) matches the dicts the rest of the
+    backend always used, and to_dict() is the JSON form. Optional fields
+    that are None are left out, as they were absent from the dicts.
+    """
+
+    __slots__ = ('type', 'box', 'label', 'confidence', 'plate_number', 'ocr', 'ocr_variants', 'watchlist')
+    FIELDS = ('type', 'box', 'label', 'color', 'confidence', 'plate_number', 'ocr', 'ocr_variants', 'watchlist')
+
+    def __init__(self, d_type, box, label, confidence, plate_number=None, ocr=None, ocr_variants=None):
+        self.type = d_type
+        self.box = box
+        self.label = label
+        self.confidence = confidence
+        self.plate_number = plate_number
+        self.ocr = ocr
+        self.ocr_variants = ocr_variants  # OCR variants tried before a read was taken
+        self.watchlist = None
+
+    @property
+    def color(self):
+        return COLORS.get(self.type, (255, 255, 255))
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS or getattr(self, key) is None:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.FIELDS and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.FIELDS else None
+        return default if value is None else value
+
+    def to_dict(self):
+        data = {"type": self.type, "box": self.box, "label": self.label, "color": self.color,
+                "confidence": self.confidence}
+        if self.plate_number is not None:
+            data["plate_number"] = self.plate_number
+        if self.ocr is not None:
+            data["ocr"] = self.ocr
+        if self.ocr_variants is not None:
+            data["ocr_variants"] = self.ocr_variants
+        if self.watchlist is not None:
+            data["watchlist"] = self.watchlist
+        return data
+
+    def __repr__(self):
+        return f"DetectionRecord({self.to_dict()!r})"
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+
+import cv2
+
+THUMB_SUFFIX = '_t'
+
+
+def thumbnail_for(image_path):
+    """Thumbnail path that belongs to a stored evidence image (same shard)."""
+    if not image_path or image_path.count('/') <= 1:
+        return None  # empty, or a legacy flat uploads/det_*.jpg without thumbnail
+    base, ext = os.path.splitext(image_path)
+    return f"{base}{THUMB_SUFFIX}{ext}"
+
+
+class EvidenceStore:
+    """
+    Content-addressed evidence storage sharded by date and hash prefix:
+
+        uploads/YYYY/MM/DD/ab/<sha1>.jpg      full-quality annotated frame
+        uploads/YYYY/MM/DD/ab/<sha1>_t.jpg    small thumbnail for list views
+
+    Identical frames hash to the same file and are written only once. Frames
+    without detections follow `empty_policy`: 'skip' (no file), 'downsample'
+    (half-size, lower quality, no thumbnail) or 'keep' (treated like any other).
+    """
+
+    EMPTY_POLICIES = ('skip', 'downsample', 'keep')
+
+    def __init__(self, root, quality=90, thumb_width=320, thumb_quality=70,
+                 empty_policy='skip', empty_scale=0.5, empty_quality=60):
+        if empty_policy not in self.EMPTY_POLICIES:
+            raise ValueError(f"Unknown empty frame policy: {empty_policy}")
+        self.root = root
+        self.quality = quality
+        self.thumb_width = thumb_width
+        self.thumb_quality = thumb_quality
+        self.empty_policy = empty_policy
+        self.empty_scale = empty_scale
+        self.empty_quality = empty_quality
+
+        self.files_written = 0
+        self.dedup_hits = 0
+        self.empty_skipped = 0
+        self.bytes_written = 0
+
+    def _encode(self, frame, quality):
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return buffer
+
+    def _write_atomic(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.files_written += 1
+        self.bytes_written += len(data)
+
+    def save(self, frame, has_detections=True, now=None):
+        """
+        Store an annotated frame. Returns (image_path, encoded_jpeg); image_path
+        is relative to the backend ("uploads/...") and None when the frame was
+        skipped. The encoded buffer can be reused for the response preview.
+        """
+        if frame is None:
+            return None, None
+
+        if not has_detections and self.empty_policy == 'skip':
+            self.empty_skipped += 1
+            return None, self._encode(frame, self.quality)
+
+        downsample = not has_detections and self.empty_policy == 'downsample'
+        if downsample:
+            stored = cv2.resize(frame, None, fx=self.empty_scale, fy=self.empty_scale,
+                                interpolation=cv2.INTER_AREA)
+            encoded = self._encode(stored, self.empty_quality)
+        else:
+            encoded = self._encode(frame, self.quality)
+
+        data = encoded.tobytes()
+        digest = hashlib.sha1(data).hexdigest()
+        now = now or datetime.utcnow()
+        rel_path = f"{now:%Y/%m/%d}/{digest[:2]}/{digest}.jpg"
+        full_path = os.path.join(self.root, *rel_path.split('/'))
+
+        if os.path.exists(full_path):
+            self.dedup_hits += 1
+        else:
+            self._write_atomic(full_path, data)
+            if not downsample:
+                self._write_atomic(os.path.join(self.root, *thumbnail_for(rel_path).split('/')),
+                                   self._thumbnail(frame))
+
+        # The preview always shows the full annotated frame
+        preview = encoded if not downsample else self._encode(frame, self.quality)
+        return f"uploads/{rel_path}", preview
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        if w > self.thumb_width:
+            scale = self.thumb_width / w
+            frame = cv2.resize(frame, (self.thumb_width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        return self._encode(frame, self.thumb_quality).tobytes()
+
+    def metrics(self):
+        return {
+            "empty_policy": self.empty_policy,
+            "files_written": self.files_written,
+            "dedup_hits": self.dedup_hits,
+            "empty_skipped": self.empty_skipped,
+            "bytes_written": self.bytes_written
+        }
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+
+EXPORT_COLUMNS = ("id", "timestamp", "type", "plate_number", "confidence", "source")
+
+# Rows fetched per round trip from the server-side cursor, and how much
+# output is buffered before a chunk goes to the client
+FETCH_SIZE = 2000
+CHUNK_BYTES = 64 * 1024
+
+
+def iter_rows(engine, table, start=None, end=None, source=None, d_type=None):
+    """Stream Detection rows oldest first without materialising the result."""
+    query = select(*[table.c[name] for name in EXPORT_COLUMNS], table.c.image_path)
+    if start is not None:
+        query = query.where(table.c.timestamp >= start)
+    if end is not None:
+        query = query.where(table.c.timestamp <= end)
+    if source:
+        query = query.where(table.c.source == source)
+    if d_type:
+        query = query.where(table.c.type == d_type)
+    query = query.order_by(table.c.timestamp, table.c.id)
+
+    # stream_results opens a server-side cursor on Postgres; SQLite already
+    # steps the statement lazily. Either way memory stays at one fetch batch.
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=FETCH_SIZE).execute(query)
+        for row in result:
+            yield row._mapping
+
+
+def _record(row, image_base):
+    record = {name: row[name] for name in EXPORT_COLUMNS}
+    record["timestamp"] = row["timestamp"].isoformat() + "Z" if row["timestamp"] else None
+    if image_base is not None:
+        record["image_url"] = f"{image_base}/{row['image_path']}" if row["image_path"] else None
+    return record
+
+
+def csv_chunks(rows, image_base=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = list(EXPORT_COLUMNS) + (["image_url"] if image_base is not None else [])
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(_record(row, image_base).values())
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def ndjson_chunks(rows, image_base=None):
+    parts, size = [], 0
+    for row in rows:
+        line = json.dumps(_record(row, image_base)) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts, size = [], 0
+    yield "".join(parts).encode("utf-8")
+
+
+def gzip_chunks(chunks, level=6):
+    """Incrementally gzip a byte stream (wbits=31 writes the gzip header)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
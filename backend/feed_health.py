@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from metrics import percentile
+
+# Per-frame stages measured on /detect (video jobs only report a total)
+STAGES = ("decode", "queue", "inference", "post")
+# What became of a frame: processed (with or without detections), refused at
+# admission, dropped after admission (superseded or past its deadline), failed
+OUTCOMES = ("processed", "shed", "dropped", "failed")
+RATE_WINDOW_SECONDS = 10
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z") if ts else None
+
+
+class FeedState:
+    """Counters and a ring of the most recent frames of one source."""
+
+    def __init__(self, source, ring_size, now):
+        self.source = source
+        self.kind = None
+        self.first_seen = now
+        self.last_frame = None
+        self.last_processed = None
+        self.last_detection = None
+        self.counters = {"received": 0, "detections": 0, **{o: 0 for o in OUTCOMES}}
+        # (wall time, outcome, frames, total ms per frame, {stage: ms} or None)
+        self.ring = deque(maxlen=ring_size)
+
+
+class FeedTelemetry:
+    """
+    Measured health of every source that sends frames: frames received,
+    end-to-end and per-stage latency, shed/drop counts and the time of the
+    last frame, recorded whether or not anything was detected. Each source
+    keeps a bounded ring of recent frames; sources are discovered as they
+    send, and the least recently seen are forgotten beyond `max_sources`.
+    """
+
+    def __init__(self, ring_size=256, online_seconds=60, standby_seconds=6000, max_sources=512):
+        self.ring_size = ring_size
+        self.online_seconds = online_seconds
+        self.standby_seconds = standby_seconds
+        self.max_sources = max_sources
+        self._feeds = OrderedDict()  # source -> FeedState, least recently seen first
+        self._lock = threading.Lock()
+
+    def record(self, source, outcome, total_ms=None, stages=None, detections=0, frames=1, kind='detect', now=None):
+        """One frame (or, for video chunks, `frames` frames with their mean latency per frame)."""
+        now = now or time.time()
+        with self._lock:
+            feed = self._feeds.get(source)
+            if feed is None:
+                feed = self._feeds[source] = FeedState(source, self.ring_size, now)
+                while len(self._feeds) > self.max_sources:
+                    self._feeds.popitem(last=False)
+            else:
+                self._feeds.move_to_end(source)
+            feed.kind = kind
+            feed.last_frame = now
+            feed.counters["received"] += frames
+            feed.counters[outcome] += frames
+            if outcome == 'processed':
+                feed.last_processed = now
+                if detections:
+                    feed.counters["detections"] += detections
+                    feed.last_detection = now
+            feed.ring.append((now, outcome, frames, total_ms, stages))
+
+    def status(self, feed, now):
+        age = now - feed.last_frame
+        if age < self.online_seconds:
+            return "online"
+        return "standby" if age < self.standby_seconds else "offline"
+
+    def _summary(self, feed, ring, now):
+        """`ring` is a copy of feed.ring taken under the lock."""
+        recent = [e for e in ring if e[0] >= now - RATE_WINDOW_SECONDS]
+        latencies = [e[3] for e in ring if e[1] == 'processed' and e[3] is not None]
+        received = sum(e[2] for e in ring)
+        lost = sum(e[2] for e in ring if e[1] in ('shed', 'dropped'))
+        stages = {}
+        for stage in STAGES:
+            values = [e[4][stage] for e in ring if e[4] and stage in e[4]]
+            if values:
+                stages[stage] = {"p50": round(percentile(values, 50), 1), "p95": round(percentile(values, 95), 1)}
+        return {
+            "source": feed.source,
+            "kind": feed.kind,
+            "status": self.status(feed, now),
+            "last_frame": _iso(feed.last_frame),
+            "last_processed": _iso(feed.last_processed),
+            "last_detection": _iso(feed.last_detection),
+            "seconds_since_frame": round(now - feed.last_frame, 1),
+            "fps": round(sum(e[2] for e in recent) / RATE_WINDOW_SECONDS, 2),
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 1),
+                "p95": round(percentile(latencies, 95), 1),
+                "max": round(max(latencies), 1) if latencies else 0.0
+            },
+            "stages_ms": stages,
+            # Over the ring: the share of recent frames that never reached the models
+            "loss_rate": round(lost / received, 3) if received else 0.0,
+            "counters": dict(feed.counters),
+            "window": len(ring)
+        }
+
+    def feeds(self, now=None):
+        """Summary of every known source, most recently seen first."""
+        now = now or time.time()
+        with self._lock:
+            feeds = [(feed, list(feed.ring)) for feed in self._feeds.values()]
+        return [self._summary(feed, ring, now) for feed, ring in reversed(feeds)]
+
+    def feed(self, source, now=None):
+        """One source's summary plus its ring of recent frames, or None."""
+        now = now or time.time()
+        with self._lock:
+            feed = self._feeds.get(source)
+            if feed is None:
+                return None
+            ring = list(feed.ring)
+        summary = self._summary(feed, ring, now)
+        summary["recent"] = [{"at": _iso(t), "outcome": outcome, "frames": frames,
+                              "total_ms": round(total, 1) if total is not None else None,
+                              "stages_ms": {k: round(v, 1) for k, v in stages.items()} if stages else None}
+                             for t, outcome, frames, total, stages in ring]
+        return summary
+
+    def metrics(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            feeds = list(self._feeds.values())
+            statuses = {"online": 0, "standby": 0, "offline": 0}
+            for feed in feeds:
+                statuses[self.status(feed, now)] += 1
+        return {"sources": len(feeds), **statuses, "ring_size": self.ring_size}
@@ -0,0 +1,132 @@
+import struct
+import time
+
+import cv2
+import numpy as np
+
+# IMREAD_REDUCED_COLOR_N uses libjpeg(-turbo) DCT scaling for JPEGs, so the
+# reduced image is decoded directly instead of decoding full size and resizing.
+REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def upload_buffer(file_storage):
+    """
+    View of an uploaded file as a uint8 array without the extra bytes copy of
+    file.read(). Werkzeug spools small parts to BytesIO (shared directly) and
+    large parts to a temp file (read once straight into the array).
+    """
+    stream = file_storage.stream
+    if hasattr(stream, 'getbuffer'):
+        return np.frombuffer(stream.getbuffer(), np.uint8)
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(0)
+    buf = np.empty(size, np.uint8)
+    view = memoryview(buf)
+    read = 0
+    while read < size:
+        n = stream.readinto(view[read:])
+        if not n:
+            break
+        read += n
+    return buf[:read]
+
+
+def image_size(buf):
+    """(width, height) from a JPEG or PNG header, or None if it can't be parsed."""
+    data = buf[:64 * 1024].tobytes() if isinstance(buf, np.ndarray) else bytes(buf[:64 * 1024])
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        seg_len = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            h, w = struct.unpack('>HH', data[i + 5:i + 9])
+            return w, h
+        i += 2 + seg_len
+    return None
+
+
+def choose_reduction(size, target):
+    """Largest DCT reduction factor that keeps the long side >= target."""
+    if not size or not target:
+        return 1
+    long_side = max(size)
+    for factor in (8, 4, 2):
+        if long_side / factor >= target:
+            return factor
+    return 1
+
+
+class DecodedFrame:
+    """
+    A frame decoded at the resolution the models need. `image` may be reduced
+    by `scale`; `full` decodes the original resolution only on first access
+    (plate crops), reusing the same encoded buffer.
+    """
+
+    def __init__(self, buf, image, scale, source_size, decode_ms):
+        self._buf = buf
+        self.image = image
+        self.scale = scale
+        self.source_size = source_size
+        self.decode_ms = decode_ms
+        self._full = image if scale == 1 else None
+        self.full_decode_ms = 0.0
+
+    @property
+    def full(self):
+        if self._full is None:
+            start = time.perf_counter()
+            self._full = cv2.imdecode(self._buf, cv2.IMREAD_COLOR)
+            self.full_decode_ms = (time.perf_counter() - start) * 1000
+        return self._full
+
+    def report(self):
+        decoded_bytes = self.image.nbytes if self.image is not None else 0
+        if self._full is not None and self._full is not self.image:
+            decoded_bytes += self._full.nbytes
+        return {
+            "ms": round(self.decode_ms + self.full_decode_ms, 2),
+            "upload_bytes": int(self._buf.nbytes),
+            "decoded_bytes": int(decoded_bytes),
+            "source_size": list(self.source_size) if self.source_size else None,
+            "reduction": self.scale,
+            "full_decoded": self.scale != 1 and self._full is not None
+        }
+
+
+def decode_frame(buf, target_size):
+    """Decode `buf`, DCT-reducing when the source is far above `target_size`."""
+    start = time.perf_counter()
+    size = image_size(buf)
+    factor = choose_reduction(size, target_size)
+    image = cv2.imdecode(buf, REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR))
+    if image is not None and size and size[0] != size[1] and (image.shape[1] > image.shape[0]) != (size[0] > size[1]):
+        # The header has the stored size; imdecode applies EXIF orientation (here a
+        # 90/270 degree turn) both to this image and to the full decode
+        size = (size[1], size[0])
+    if image is not None and factor > 1 and size:
+        # Odd dimensions round up in libjpeg; use the real ratio for mapping back
+        scale = size[0] / image.shape[1]
+    else:
+        scale = 1
+    return DecodedFrame(buf, image, scale, size, (time.perf_counter() - start) * 1000)
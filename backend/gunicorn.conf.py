@@ -0,0 +1,38 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# The app (and with it both YOLO models and the OCR engine) is imported once
+# in the master and then forked, so every worker shares the read-only weights
+# copy-on-write instead of loading its own copy.
+import gc
+import os
+
+bind = os.environ.get('SAFECITY_BIND', '0.0.0.0:5000')
+# One worker: dedup windows, the watchlist and /alerts feed, model
+# activations, ROI/calibration caches, the degradation level, feed telemetry
+# and the retention scheduler all live in the process. Several workers would
+# each keep their own copy (duplicate records, alerts and admin changes
+# reaching one worker only). Scale with threads here, and with more nodes
+# behind the coordinator (see cluster.py).
+workers = int(os.environ.get('SAFECITY_WORKERS', 1))
+if workers > 1:
+    print(f"WARN: {workers} gunicorn workers do not share dedup, alerts, model "
+          f"activations or telemetry, and each runs retention")
+# Requests block on the inference queue; threads keep a slow frame from
+# holding the worker
+worker_class = 'gthread'
+threads = int(os.environ.get('SAFECITY_WORKER_THREADS', 8))
+timeout = 120
+preload_app = True
+
+
+def when_ready(server):
+    from app import prepare_database
+    prepare_database()
+    # Move everything allocated so far out of the collector's reach; otherwise
+    # the first GC pass in each worker touches (and copies) every object page
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import start_services
+    start_services()
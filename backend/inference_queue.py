@@ -0,0 +1,420 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+from metrics import RollingWindow
+
+# Scheduling weight of each priority class: under contention a live camera
+# gets 4x the inference time of a bulk backfill job.
+PRIORITY_WEIGHTS = {
+    'live': 4.0,
+    'evidence': 2.0,
+    'backfill': 1.0,
+}
+
+# Default class for a source tag (prefix match) when the request doesn't say
+SOURCE_PRIORITIES = {
+    'LIVE-': 'live',
+    'IMAGE-EVIDENCE': 'evidence',
+    'VIDEO-ANALYSIS': 'evidence',
+    'BACKFILL': 'backfill',
+}
+
+# A frame expired on the cost estimate alone never runs, so it can't correct
+# the estimate: each such expiry decays it, and every PROBE_EVERY-th one runs
+# anyway to measure what frames cost now
+EXPIRY_DECAY = 0.9
+PROBE_EVERY = 8
+
+
+class QueueFull(Exception):
+    """Raised when a frame can't be admitted; carries the HTTP answer."""
+
+    def __init__(self, retry_after, status=503, message="Inference queue saturated"):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+        self.message = message
+
+
+class Ticket:
+    """One admitted frame waiting for (or finished with) inference."""
+
+    def __init__(self, source, frame, deadline, priority):
+        self.source = source
+        self.frame = frame
+        self.deadline = deadline
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+        self.status = 'queued'  # queued | running | done | failed | superseded | expired
+        self.profile = None  # inference profile chosen at dispatch
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def resolve(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.monotonic()
+        self.frame = None  # release the decoded frame as early as possible
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def wait_ms(self):
+        end = self.started_at or time.monotonic()
+        return (end - self.enqueued_at) * 1000
+
+
+class SourceAccount:
+    """Per-source scheduling state and CPU-time accounting."""
+
+    def __init__(self, source, priority):
+        self.source = source
+        self.default_priority = priority  # from the source tag or the request
+        self.priority_override = None  # set by the operator, wins over the default
+        self.weight_override = None
+        self.cap = None  # max share of inference time under contention (0-1)
+        self.last_finish = 0.0
+        self.cost = None  # EWMA of seconds per frame
+        self.frames = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.recent = deque()  # (monotonic end, wall seconds) inside the share window
+
+    @property
+    def priority(self):
+        return self.priority_override or self.default_priority
+
+    @property
+    def weight(self):
+        if self.weight_override:
+            return self.weight_override
+        return PRIORITY_WEIGHTS.get(self.priority, 1.0)
+
+
+class InferenceQueue:
+    """
+    Bounded, weighted-fair admission queue in front of AIProcessor.
+
+    - at most `max_pending` frames wait (backfill may use half of them);
+      beyond that callers get QueueFull
+    - frames are dispatched by self-clocked weighted fair queueing on the
+      source tag: each source's virtual finish time advances by its measured
+      cost per frame divided by its priority weight
+    - only the newest pending frame per source is kept; older ones are
+      resolved as 'superseded' so a live camera never builds a backlog
+    - frames that can no longer finish before their deadline are dropped
+      as 'expired' before any model runs
+    - a source over its configured share cap is throttled (429) while
+      other sources are competing
+    """
+
+    def __init__(self, processor, workers=1, max_pending=8, deadline_ms=3000, share_window_seconds=60,
+                 profile_provider=None):
+        self.processor = processor
+        # Called at dispatch time with the ticket; returns the process_frame profile
+        self.profile_provider = profile_provider
+        self.workers = workers
+        self.max_pending = max_pending
+        self.deadline = deadline_ms / 1000.0
+        self.share_window = share_window_seconds
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._size = 0
+        self._size_by_priority = {}
+        self._pending_by_source = {}
+        self._accounts = {}
+        self._virtual_time = 0.0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = 0
+
+        # EWMA of inference time, used for deadline checks and Retry-After
+        self.service_time = 0.5
+        self._estimate_expiries = 0  # consecutive frames expired on the estimate
+        self.wait_ms = RollingWindow()
+        self.inference_ms = RollingWindow()
+        self.counters = {"admitted": 0, "completed": 0, "failed": 0,
+                         "rejected": 0, "throttled": 0, "superseded": 0, "expired": 0, "probes": 0}
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        print(f"DEBUG: Inference queue started (workers={self.workers}, max_pending={self.max_pending}, "
+              f"deadline={int(self.deadline * 1000)}ms)")
+
+    # --- Accounting -----------------------------------------------------------
+
+    def resolve_priority(self, source, requested=None):
+        if requested in PRIORITY_WEIGHTS:
+            return requested
+        for prefix, priority in SOURCE_PRIORITIES.items():
+            if source.startswith(prefix):
+                return priority
+        return 'evidence'
+
+    def _account(self, source, priority):
+        account = self._accounts.get(source)
+        if account is None:
+            account = self._accounts[source] = SourceAccount(source, priority)
+        account.default_priority = priority
+        return account
+
+    def configure_source(self, source, priority=None, weight=None, cap=None):
+        with self._cond:
+            account = self._account(source, self.resolve_priority(source))
+            if priority is not None:
+                if priority and priority not in PRIORITY_WEIGHTS:
+                    raise ValueError(f"Unknown priority '{priority}' (use {', '.join(PRIORITY_WEIGHTS)})")
+                account.priority_override = priority or None  # "" goes back to the tag's default
+            if weight is not None:
+                account.weight_override = float(weight) or None
+            if cap is not None:
+                account.cap = float(cap) or None
+            return self._account_report(account, self._window_totals())
+
+    def source_settings(self, source, remove=False):
+        """
+        Operator settings and measured cost of a source, None if it was never
+        seen. remove=True also drops its account unless a frame is queued.
+        """
+        with self._cond:
+            account = self._accounts.get(source)
+            if account is None:
+                return None
+            if remove and source not in self._pending_by_source:
+                del self._accounts[source]
+            return {"priority": account.priority_override, "weight": account.weight_override,
+                    "cap": account.cap, "cost": account.cost}
+
+    def restore_source(self, source, settings):
+        """Apply source_settings() taken on another node; the measured cost seeds the new account."""
+        with self._cond:
+            account = self._account(source, self.resolve_priority(source))
+            account.priority_override = settings.get("priority") or None
+            account.weight_override = settings.get("weight") or None
+            account.cap = settings.get("cap") or None
+            if account.cost is None:
+                account.cost = settings.get("cost")
+
+    def _prune_window(self, account, now):
+        cutoff = now - self.share_window
+        while account.recent and account.recent[0][0] < cutoff:
+            account.recent.popleft()
+
+    def _window_totals(self):
+        now = time.monotonic()
+        totals = {}
+        for source, account in self._accounts.items():
+            self._prune_window(account, now)
+            totals[source] = sum(w for _, w in account.recent)
+        return totals
+
+    def _over_cap(self, account):
+        if not account.cap:
+            return False
+        totals = self._window_totals()
+        busy = [s for s, t in totals.items() if t > 0]
+        if len(busy) < 2:
+            return False  # no contention, let the feed use the idle capacity
+        total = sum(totals.values())
+        return total > 0 and totals.get(account.source, 0) / total > account.cap
+
+    # --- Admission ------------------------------------------------------------
+
+    def depth(self):
+        with self._cond:
+            return self._size
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        backlog = self._size + self._running
+        return max(1, int(math.ceil(backlog * self.service_time / self.workers)))
+
+    def _admission_error(self, account):
+        source, priority = account.source, account.priority
+        if source in self._pending_by_source:
+            return None  # will replace its own pending frame
+        if self._over_cap(account):
+            self.counters['throttled'] += 1
+            return QueueFull(self.retry_after(), 429, "Source is over its inference share")
+        limit = self.max_pending if priority != 'backfill' else max(1, self.max_pending // 2)
+        used = self._size if priority != 'backfill' else self._size_by_priority.get('backfill', 0)
+        if used >= limit or self._size >= self.max_pending:
+            self.counters['rejected'] += 1
+            return QueueFull(self.retry_after())
+        return None
+
+    def check_admission(self, source, priority=None):
+        """Cheap pre-check so saturated requests are rejected before decoding."""
+        with self._cond:
+            error = self._admission_error(self._account(source, self.resolve_priority(source, priority)))
+        if error is not None:
+            raise error
+
+    def submit(self, source, frame, deadline_ms=None, priority=None):
+        if not self._threads:
+            self.start()
+        priority = self.resolve_priority(source, priority)
+        deadline = time.monotonic() + (deadline_ms / 1000.0 if deadline_ms else self.deadline)
+        ticket = Ticket(source, frame, deadline, priority)
+        with self._cond:
+            account = self._account(source, priority)
+            ticket.priority = priority = account.priority
+            error = self._admission_error(account)
+            if error is not None:
+                raise error
+            previous = self._pending_by_source.get(source)
+            if previous is not None:
+                # Newest frame wins and inherits the stale frame's place in line
+                ticket.start_tag = previous.start_tag
+                self._drop(previous)
+                previous.resolve('superseded')
+                self.counters['superseded'] += 1
+            else:
+                ticket.start_tag = max(self._virtual_time, account.last_finish)
+            cost = account.cost if account.cost is not None else self.service_time
+            ticket.finish_tag = ticket.start_tag + cost / account.weight
+            account.last_finish = ticket.finish_tag
+
+            heapq.heappush(self._heap, (ticket.finish_tag, next(self._seq), ticket))
+            self._size += 1
+            self._size_by_priority[priority] = self._size_by_priority.get(priority, 0) + 1
+            self._pending_by_source[source] = ticket
+            self.counters['admitted'] += 1
+            self._cond.notify()
+        return ticket
+
+    def _drop(self, ticket):
+        # Lazy heap removal: the worker skips tickets that are no longer queued
+        self._size -= 1
+        self._size_by_priority[ticket.priority] -= 1
+        if self._pending_by_source.get(ticket.source) is ticket:
+            del self._pending_by_source[ticket.source]
+
+    def _next_ticket(self):
+        while self._heap:
+            _, _, ticket = heapq.heappop(self._heap)
+            if ticket.status == 'queued':
+                self._drop(ticket)
+                self._virtual_time = max(self._virtual_time, ticket.start_tag)
+                return ticket
+        return None
+
+    # --- Dispatch ---------------------------------------------------------------
+
+    def _expire(self, ticket):
+        ticket.resolve('expired')
+        self.counters['expired'] += 1
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                ticket = None
+                while ticket is None:
+                    while not self._size:
+                        self._cond.wait()
+                    ticket = self._next_ticket()
+
+                now = time.monotonic()
+                probe = False
+                if now >= ticket.deadline:
+                    self._expire(ticket)
+                    continue
+                if now + self.service_time > ticket.deadline:
+                    self._estimate_expiries += 1
+                    if self._estimate_expiries < PROBE_EVERY:
+                        self.service_time *= EXPIRY_DECAY
+                        self._expire(ticket)
+                        continue
+                    self.counters['probes'] += 1  # run it: the estimate may be stale
+                    probe = True
+                self._estimate_expiries = 0
+                self._running += 1
+                ticket.status = 'running'
+
+            ticket.started_at = time.monotonic()
+            cpu_start = time.process_time()
+            self.wait_ms.add(ticket.wait_ms)
+            try:
+                if self.profile_provider is not None:
+                    ticket.profile = self.profile_provider(ticket)
+                result = self.processor.process_frame(ticket.frame, ticket.profile)
+                ticket.resolve('done', result)
+                self.counters['completed'] += 1
+            except Exception as e:
+                print(f"ERROR: Inference failed for {ticket.source}: {e}")
+                ticket.resolve('failed', error=e)
+                self.counters['failed'] += 1
+            finally:
+                elapsed = time.monotonic() - ticket.started_at
+                # Process CPU time includes the model's intra-op threads; with
+                # several workers it is shared, so it is an upper bound per frame.
+                cpu = time.process_time() - cpu_start
+                self.inference_ms.add(elapsed * 1000)
+                with self._cond:
+                    # Capped at the deadline: a few slow frames can't expire everything behind them.
+                    # A probe ran because the estimate looked stale; its measurement replaces it.
+                    estimate = elapsed if probe else 0.8 * self.service_time + 0.2 * elapsed
+                    self.service_time = min(estimate, self.deadline)
+                    self._running -= 1
+                    account = self._accounts.get(ticket.source)
+                    if account is not None:  # None once the source was handed to another node
+                        account.cost = elapsed if account.cost is None else 0.8 * account.cost + 0.2 * elapsed
+                        account.frames += 1
+                        account.cpu_seconds += cpu
+                        account.wall_seconds += elapsed
+                        account.recent.append((time.monotonic(), elapsed))
+
+    # --- Reporting --------------------------------------------------------------
+
+    def _account_report(self, account, totals):
+        window_total = sum(totals.values())
+        pending = self._pending_by_source.get(account.source)
+        return {
+            "priority": account.priority,
+            "priority_override": account.priority_override,
+            "weight": account.weight,
+            "cap": account.cap,
+            "frames": account.frames,
+            "cpu_seconds": round(account.cpu_seconds, 3),
+            "wall_seconds": round(account.wall_seconds, 3),
+            "cost_ms": round(account.cost * 1000, 1) if account.cost is not None else None,
+            "share": round(totals.get(account.source, 0) / window_total, 3) if window_total else 0.0,
+            "queued": 1 if pending is not None else 0
+        }
+
+    def sources(self):
+        with self._cond:
+            totals = self._window_totals()
+            return {s: self._account_report(a, totals) for s, a in self._accounts.items()}
+
+    def metrics(self):
+        return {
+            "depth": self.depth(),
+            "running": self._running,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "deadline_ms": int(self.deadline * 1000),
+            "service_time_ms": round(self.service_time * 1000, 1),
+            "counters": dict(self.counters),
+            "wait_ms": self.wait_ms.summary(),
+            "inference_ms": self.inference_ms.summary()
+        }
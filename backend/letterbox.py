@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+
+# Same geometry as ultralytics' LetterBox(auto=True) used by predict(): scale
+# the long side to imgsz, pad the short side to a multiple of the stride.
+STRIDE = 32
+PAD_VALUE = 114
+_INV_255 = np.float32(1 / 255)
+
+
+def letterbox_geometry(h, w, imgsz, stride=STRIDE):
+    """(gain, new_w, new_h, left, top, out_w, out_h) of an imgsz letterbox of an h x w image."""
+    gain = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+    dw, dh = (imgsz - new_w) % stride / 2, (imgsz - new_h) % stride / 2
+    left, top = int(round(dw - 0.1)), int(round(dh - 0.1))
+    out_w, out_h = new_w + left + int(round(dw + 0.1)), new_h + top + int(round(dh + 0.1))
+    return gain, new_w, new_h, left, top, out_w, out_h
+
+
+class LetterboxPyramid:
+    """
+    One frame letterboxed for every detector resolution, built largest level
+    first: each smaller level is resized from the previous one rather than
+    from the full frame, and every image and input tensor lives in pooled
+    buffers. tensor(imgsz) is what the model gets; ultralytics skips its own
+    letterbox and normalisation for a ready BCHW tensor, so unmap() brings
+    the boxes back to frame coordinates. Use as a with-block; the buffers go
+    back to the pool on exit.
+    """
+
+    def __init__(self, frame, sizes, pool):
+        self.height, self.width = frame.shape[:2]
+        self._scratch = pool.scratch()
+        self._levels = {}
+        self._tensors = {}
+        source = frame
+        for imgsz in sorted(set(sizes), reverse=True):
+            gain, new_w, new_h, left, top, out_w, out_h = letterbox_geometry(self.height, self.width, imgsz)
+            canvas = self._scratch.get((out_h, out_w, 3))
+            content = canvas[top:top + new_h, left:left + new_w]
+            if source.shape[:2] == (new_h, new_w):
+                content[...] = source
+            else:
+                # Full frame -> first level as ultralytics does it; halving between levels is a box filter
+                interpolation = cv2.INTER_LINEAR if source is frame else cv2.INTER_AREA
+                cv2.resize(source, (new_w, new_h), dst=content, interpolation=interpolation)
+            canvas[:top] = PAD_VALUE
+            canvas[top + new_h:] = PAD_VALUE
+            canvas[top:top + new_h, :left] = PAD_VALUE
+            canvas[top:top + new_h, left + new_w:] = PAD_VALUE
+            self._levels[imgsz] = (canvas, gain, left, top)
+            source = content
+
+    def image(self, imgsz):
+        return self._levels[imgsz][0]
+
+    def array(self, imgsz):
+        """The level as a 1x3xHxW float32 RGB array in [0, 1]."""
+        chw = self._tensors.get(imgsz)
+        if chw is None:
+            canvas = self._levels[imgsz][0]
+            chw = self._tensors[imgsz] = self._scratch.get((1, 3) + canvas.shape[:2], np.float32)
+            np.multiply(canvas[..., ::-1].transpose(2, 0, 1), _INV_255, out=chw[0])
+        return chw
+
+    def tensor(self, imgsz, torch):
+        """array() as a torch tensor sharing its memory."""
+        return torch.from_numpy(self.array(imgsz))
+
+    def unmap(self, imgsz, xyxy):
+        """Boxes predicted on the imgsz level, in frame coordinates."""
+        _, gain, left, top = self._levels[imgsz]
+        boxes = (xyxy - np.array([left, top, left, top], dtype=xyxy.dtype)) / gain
+        xs, ys = boxes[:, 0::2], boxes[:, 1::2]
+        np.clip(xs, 0, self.width, out=xs)
+        np.clip(ys, 0, self.height, out=ys)
+        return boxes.astype(xyxy.dtype, copy=False)
+
+    def release(self):
+        self._scratch.release()
+        self._levels, self._tensors = {}, {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
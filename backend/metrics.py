@@ -0,0 +1,46 @@
+import threading
+from collections import deque
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an unsorted sequence (q in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return float(ordered[idx])
+
+
+class RollingWindow:
+    """Bounded window of recent samples with cheap summary statistics."""
+
+    def __init__(self, size=512):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        with self._lock:
+            self._samples.append(value)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def values(self):
+        with self._lock:
+            return list(self._samples)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def summary(self, digits=2):
+        values = self.values()
+        if not values:
+            return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        return {
+            "count": len(values),
+            "avg": round(sum(values) / len(values), digits),
+            "p50": round(percentile(values, 50), digits),
+            "p95": round(percentile(values, 95), digits),
+            "max": round(max(values), digits)
+        }
@@ -0,0 +1,336 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from detections import box_arrays
+from metrics import RollingWindow
+
+ROLES = ('helmet', 'plate')
+
+# What AIProcessor.__init__ always loaded; seeds a missing registry file
+DEFAULT_VERSIONS = {'helmet': ('v1', 'best (1).pt'), 'plate': ('v1', 'best (4).pt')}
+
+WARMUP_RUNS = 2
+SHADOW_IOU_MATCH = 0.5
+
+
+def _iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def result_boxes(result):
+    """[(x1, y1, x2, y2, cls, conf)] from one ultralytics result."""
+    return boxes_from_arrays(*box_arrays(result))
+
+
+def boxes_from_arrays(xyxy, cls, conf):
+    return [(x1, y1, x2, y2, c, p) for (x1, y1, x2, y2), c, p in zip(xyxy.tolist(), cls.tolist(), conf.tolist())]
+
+
+class ShadowRunner:
+    """
+    Runs a candidate model on a sample of the frames the active model sees,
+    on its own thread so /detect never waits for it, and compares outputs.
+    """
+
+    def __init__(self, role, version, model, sample_rate=0.1):
+        self.role = role
+        self.version = version
+        self.model = model
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=2)
+        self._lock = threading.Lock()
+        self.primary_ms = RollingWindow()
+        self.shadow_ms = RollingWindow()
+        self.ious = RollingWindow()
+        self.counts = {"frames": 0, "dropped": 0, "errors": 0, "primary_boxes": 0,
+                       "shadow_boxes": 0, "matched": 0, "frames_same_count": 0}
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=f"shadow-{role}", daemon=True)
+        self._thread.start()
+
+    def offer(self, frame, primary, primary_ms, kwargs):
+        """Called by AIProcessor after the active model ran on `frame`."""
+        if self._stopped or random.random() >= self.sample_rate:
+            return
+        try:
+            # /detect annotates the frame in place once inference is done
+            self._queue.put_nowait((frame.copy(), primary, primary_ms, kwargs))
+        except queue.Full:
+            with self._lock:
+                self.counts["dropped"] += 1
+
+    def stop(self):
+        self._stopped = True
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, primary, primary_ms, kwargs = item
+            try:
+                started = time.perf_counter()
+                shadow = result_boxes(self.model(frame, **kwargs)[0])
+                shadow_ms = (time.perf_counter() - started) * 1000
+            except Exception as e:
+                print(f"WARN: Shadow {self.role} {self.version} failed: {e}")
+                with self._lock:
+                    self.counts["errors"] += 1
+                continue
+            self._compare(primary, shadow, primary_ms, shadow_ms)
+
+    def _compare(self, primary, shadow, primary_ms, shadow_ms):
+        # Greedy same-class matching, best IoU first
+        pairs = sorted(((_iou(p, s), i, j) for i, p in enumerate(primary) for j, s in enumerate(shadow)
+                        if p[4] == s[4]), reverse=True)
+        used_p, used_s, matched = set(), set(), []
+        for iou, i, j in pairs:
+            if iou < SHADOW_IOU_MATCH:
+                break
+            if i in used_p or j in used_s:
+                continue
+            used_p.add(i)
+            used_s.add(j)
+            matched.append(iou)
+        self.primary_ms.add(primary_ms)
+        self.shadow_ms.add(shadow_ms)
+        for iou in matched:
+            self.ious.add(iou)
+        with self._lock:
+            self.counts["frames"] += 1
+            self.counts["primary_boxes"] += len(primary)
+            self.counts["shadow_boxes"] += len(shadow)
+            self.counts["matched"] += len(matched)
+            self.counts["frames_same_count"] += len(primary) == len(shadow)
+
+    def report(self):
+        with self._lock:
+            counts = dict(self.counts)
+        primary_ms, shadow_ms = self.primary_ms.summary(1), self.shadow_ms.summary(1)
+        return {
+            "role": self.role,
+            "version": self.version,
+            "sample_rate": self.sample_rate,
+            **counts,
+            # Share of the active model's boxes the candidate also finds, and vice versa
+            "recall_vs_active": round(counts["matched"] / counts["primary_boxes"], 3) if counts["primary_boxes"] else None,
+            "precision_vs_active": round(counts["matched"] / counts["shadow_boxes"], 3) if counts["shadow_boxes"] else None,
+            "mean_iou": self.ious.summary(3)["avg"],
+            "primary_ms": primary_ms,
+            "shadow_ms": shadow_ms,
+            "p50_latency_ratio": round(shadow_ms["p50"] / primary_ms["p50"], 2) if primary_ms["p50"] else None
+        }
+
+
+class ModelRegistry:
+    """
+    Versioned weights per model role, persisted as a small JSON manifest
+    (read before the processor is built, so startup loads the active
+    versions directly). Versions are loaded and warmed up in the
+    background, then swapped into AIProcessor with one attribute
+    assignment; process_frame snapshots its models per frame, so a swap
+    lands between frames. The previous version stays in memory for an
+    instant rollback.
+    """
+
+    def __init__(self, path, base_dir, loader=None):
+        self.path = path
+        self.base_dir = base_dir
+        self.loader = loader
+        self.processor = None
+        self._lock = threading.Lock()
+        self._loaded = {}  # (role, version) -> model, ready to swap in
+        self._state = {}  # (role, version) -> loading | ready | failed: ...
+        self._warmup_ms = {}
+        self.shadows = {}
+        self.swaps = 0
+        self.manifest = self._read()
+
+    # --- Manifest ---------------------------------------------------------------
+
+    def _read(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                return json.load(f)
+        now = datetime.utcnow().isoformat() + "Z"
+        return {role: {"active": version, "previous": None,
+                       "versions": {version: {"path": path, "registered_at": now, "notes": "initial weights"}}}
+                for role, (version, path) in DEFAULT_VERSIONS.items()}
+
+    def _write(self):
+        # Write-then-rename so a crash never leaves a truncated manifest
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def resolve(self, path):
+        """
+        Absolute path of weights inside the models directory. Loading a
+        checkpoint unpickles it, so anything outside (or a symlink leading
+        out) is refused with ValueError.
+        """
+        base = os.path.realpath(self.base_dir)
+        full = os.path.realpath(os.path.join(base, path))
+        if not full.startswith(base + os.sep):
+            raise ValueError(f"Model weights must be inside {base}")
+        return full
+
+    def active_paths(self):
+        return {role: self.resolve(self._entry(role, self.manifest[role]["active"])["path"]) for role in ROLES}
+
+    def _entry(self, role, version):
+        if role not in ROLES:
+            raise KeyError(f"Unknown model role '{role}'")
+        entry = self.manifest[role]["versions"].get(version)
+        if entry is None:
+            raise KeyError(f"No {role} model version '{version}'")
+        return entry
+
+    def register(self, role, version, path, notes=None):
+        if role not in ROLES:
+            raise KeyError(f"Unknown model role '{role}'")
+        full = self.resolve(path)
+        if not os.path.isfile(full):
+            raise ValueError(f"Weights not found at {full}")
+        with self._lock:
+            versions = self.manifest[role]["versions"]
+            if version in versions:
+                raise ValueError(f"{role} version '{version}' already exists")
+            # Stored relative to the models directory, as the defaults are
+            versions[version] = {"path": os.path.relpath(full, os.path.realpath(self.base_dir)), "registered_at": datetime.utcnow().isoformat() + "Z", "notes": notes}
+            self._write()
+        return versions[version]
+
+    # --- Loading and swapping -----------------------------------------------------
+
+    def attach(self, processor):
+        """Adopt the models the processor loaded at startup as the active versions."""
+        self.processor = processor
+        if self.loader is None:
+            self.loader = processor.load_detector
+        for role in ROLES:
+            model = getattr(processor, f"{role}_model")
+            if model is not None:
+                key = (role, self.manifest[role]["active"])
+                self._loaded[key] = model
+                self._state[key] = "active"
+
+    def load(self, role, version):
+        """Load and warm up a version on a background thread."""
+        entry = self._entry(role, version)
+        self.resolve(entry["path"])  # a manifest edited by hand may point anywhere
+        key = (role, version)
+        with self._lock:
+            if self._state.get(key) in ("loading", "ready", "active"):
+                return self._state[key]
+            self._state[key] = "loading"
+        threading.Thread(target=self._load, args=(role, version, entry["path"]),
+                         name=f"model-load-{role}-{version}", daemon=True).start()
+        return "loading"
+
+    def _load(self, role, version, path):
+        key = (role, version)
+        try:
+            started = time.perf_counter()
+            model = self.loader(self.resolve(path))
+            if model is None:
+                raise ValueError(f"Could not load {path}")
+            # First inferences pay for lazy init (fusing, allocator growth); do it here
+            imgsz = getattr(self.processor, f"{role}_imgsz", 640)
+            blank = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+            for _ in range(WARMUP_RUNS):
+                model(blank, imgsz=imgsz, verbose=False)
+            self._warmup_ms[key] = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._loaded[key] = model
+                self._state[key] = "ready"
+            print(f"DEBUG: {role} model {version} loaded and warmed up in {self._warmup_ms[key]:.0f}ms")
+        except Exception as e:
+            with self._lock:
+                self._state[key] = f"failed: {e}"
+            print(f"ERROR: Loading {role} model {version} failed: {e}")
+
+    def activate(self, role, version):
+        self._entry(role, version)
+        with self._lock:
+            model = self._loaded.get((role, version))
+            if model is None:
+                raise ValueError(f"{role} {version} is not loaded (state: {self._state.get((role, version), 'unloaded')})")
+            current = self.manifest[role]["active"]
+            if current == version:
+                return current
+            setattr(self.processor, f"{role}_model", model)  # atomic reference swap
+            self._state[(role, current)] = "ready"
+            self._state[(role, version)] = "active"
+            self.manifest[role]["previous"] = current
+            self.manifest[role]["active"] = version
+            self.manifest[role]["versions"][version]["activated_at"] = datetime.utcnow().isoformat() + "Z"
+            self._write()
+            self.swaps += 1
+            # Keep only the active and the rollback target in memory
+            for key in [k for k in self._loaded if k[0] == role and k[1] not in (version, current)]:
+                if self._state.get(key) == "ready" and not self._is_shadow(key):
+                    del self._loaded[key]
+                    self._state[key] = "unloaded"
+        self.stop_shadow(role, only_version=version)
+        print(f"WARN: {role} model switched {current} -> {version}")
+        return version
+
+    def rollback(self, role):
+        previous = self.manifest[role]["previous"] if role in ROLES else None
+        if not previous:
+            raise ValueError(f"No previous {role} version to roll back to")
+        return self.activate(role, previous)
+
+    # --- Shadow mode ---------------------------------------------------------------
+
+    def _is_shadow(self, key):
+        shadow = self.shadows.get(key[0])
+        return shadow is not None and shadow.version == key[1]
+
+    def start_shadow(self, role, version, sample_rate=0.1):
+        self._entry(role, version)
+        if version == self.manifest[role]["active"]:
+            raise ValueError("Shadowing the active version compares it with itself")
+        model = self._loaded.get((role, version))
+        if model is None:
+            raise ValueError(f"{role} {version} is not loaded")
+        self.stop_shadow(role)
+        runner = self.shadows[role] = ShadowRunner(role, version, model, sample_rate)
+        self.processor.shadows = dict(self.shadows)
+        return runner.report()
+
+    def stop_shadow(self, role, only_version=None):
+        runner = self.shadows.get(role)
+        if runner is None or (only_version is not None and runner.version != only_version):
+            return None
+        del self.shadows[role]
+        self.processor.shadows = dict(self.shadows)
+        runner.stop()
+        return runner.report()
+
+    def report(self):
+        roles = {}
+        for role in ROLES:
+            versions = {}
+            for version, entry in self.manifest[role]["versions"].items():
+                key = (role, version)
+                versions[version] = {**entry, "state": self._state.get(key, "unloaded"),
+                                     "warmup_ms": round(self._warmup_ms[key], 1) if key in self._warmup_ms else None}
+            shadow = self.shadows.get(role)
+            roles[role] = {"active": self.manifest[role]["active"], "previous": self.manifest[role]["previous"],
+                           "versions": versions, "shadow": shadow.report() if shadow else None}
+        return {"roles": roles, "swaps": self.swaps}
@@ -1,25 +1,75 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from flask_bcrypt import Bcrypt
-
-db = SQLAlchemy()
-bcrypt = Bcrypt()
-
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
-    role = db.Column(db.String(50), default='Sector Chief')
-    full_name = db.Column(db.String(120))
-    agency = db.Column(db.String(120))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-class Detection(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    type = db.Column(db.String(50))  # 'NO_HELMET' or 'COMPLIANT'
-    plate_number = db.Column(db.String(50))
-    confidence = db.Column(db.Float)
-    image_path = db.Column(db.String(255))
-    source = db.Column(db.String(100), default='IMAGE-EVIDENCE')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from flask_bcrypt import Bcrypt
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
+
+db = SQLAlchemy()
+bcrypt = Bcrypt()
+
+# WAL lets /stats and /logs read while the detection sink is writing;
+# NORMAL sync is durable across app crashes and much cheaper than FULL.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -32000,  # negative = KiB, ~32 MB page cache
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+@event.listens_for(Engine, "connect")
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password = db.Column(db.String(120), nullable=False)
+    role = db.Column(db.String(50), default='Sector Chief')
+    full_name = db.Column(db.String(120))
+    agency = db.Column(db.String(120))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Detection(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    type = db.Column(db.String(50))  # 'NO_HELMET' or 'COMPLIANT'
+    plate_number = db.Column(db.String(50))
+    confidence = db.Column(db.Float)
+    image_path = db.Column(db.String(255))
+    source = db.Column(db.String(100), default='IMAGE-EVIDENCE')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+class SourceRegion(db.Model):
+    # Region of interest per camera; coordinates are 0-1 fractions of the frame
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(100), unique=True, nullable=False)
+    polygons = db.Column(db.JSON)  # [[[x, y], ...], ...]
+    crop = db.Column(db.JSON)  # [x1, y1, x2, y2] or null
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SourceProfile(db.Model):
+    # Calibrated inference settings per camera (see calibration.py)
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(100), unique=True, nullable=False)
+    helmet_imgsz = db.Column(db.Integer)
+    plate_imgsz = db.Column(db.Integer)
+    helmet_conf = db.Column(db.Float)
+    plate_conf = db.Column(db.Float)
+    frames = db.Column(db.Integer)
+    stats = db.Column(db.JSON)  # box size / confidence distribution it was derived from
+    calibrated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class WatchlistEntry(db.Model):
+    # Wanted/stolen vehicle plates, matched against every plate read
+    id = db.Column(db.Integer, primary_key=True)
+    plate = db.Column(db.String(20), nullable=False, index=True)
+    reason = db.Column(db.String(255))
+    priority = db.Column(db.String(20), default='high')  # critical | high | normal
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,116 @@
+import re
+
+# Plate formats, written as tokens with optional {n} / {m,n} counts:
+# A = letter, 9 = digit, X = either. Built-in regions can be mixed with
+# custom formats in SAFECITY_PLATE_FORMATS, e.g. "IN" or "UK,AAA9{3,4}".
+REGIONS = {
+    # State, RTO district, 0-3 series letters, number (MH12AB1234, DL3C1234);
+    # Bharat series (22BH1234AA)
+    "IN": ["AA9{1,2}A{0,3}9{4}", "99AA9{4}A{1,2}"],
+    # Current style (AB12CDE) and the older prefix style (A123BCD)
+    "UK": ["AA99AAA", "A9{1,3}AAA"],
+    # Anything plate-like: 4-10 characters with letters and digits
+    "generic": ["X{4,10}"],
+}
+
+_CLASSES = {"A": "[A-Z]", "9": "[0-9]", "X": "[A-Z0-9]"}
+
+# Characters OCR mixes up. Where a format expects a letter, a confusable
+# digit is accepted and read as its letter, and vice versa.
+_DIGIT_FOR = {"O": "0", "D": "0", "I": "1", "Z": "2", "S": "5", "G": "6", "B": "8"}
+_LETTER_FOR = {"0": "O", "1": "I", "2": "Z", "5": "S", "6": "G", "8": "B"}
+_TOLERANT = {
+    "A": "[A-Z%s]" % "".join(_LETTER_FOR),
+    "9": "[0-9%s]" % "".join(_DIGIT_FOR),
+    "X": "[A-Z0-9]",
+}
+_FIX = {"A": str.maketrans(_LETTER_FOR), "9": str.maketrans(_DIGIT_FOR), "X": str.maketrans({})}
+
+_TOKEN = re.compile(r"([A9X])(?:\{(\d+)(?:,(\d+))?\})?")
+
+
+def parse_format(pattern):
+    """[(kind, min, max)] of a format string; ValueError if it is not one."""
+    tokens, pos = [], 0
+    pattern = pattern.strip().upper()
+    while pos < len(pattern):
+        m = _TOKEN.match(pattern, pos)
+        if m is None:
+            raise ValueError(f"bad plate format {pattern!r} at {pos}: use A, 9, X and {{n}} / {{m,n}}")
+        kind, lo, hi = m.group(1), int(m.group(2) or 1), m.group(3)
+        hi = int(hi) if hi is not None else lo if m.group(2) else 1
+        if hi < lo:
+            raise ValueError(f"bad plate format {pattern!r}: {{{lo},{hi}}}")
+        # Merge runs of the same kind (AA -> A{2}) so each run is one group
+        if tokens and tokens[-1][0] == kind:
+            _, plo, phi = tokens[-1]
+            tokens[-1] = (kind, plo + lo, phi + hi)
+        else:
+            tokens.append((kind, lo, hi))
+        pos = m.end()
+    if not tokens:
+        raise ValueError("empty plate format")
+    return tokens
+
+
+class PlateFormat:
+    """One format compiled to an exact regex and a confusion-tolerant one."""
+
+    def __init__(self, name, pattern):
+        self.name = name
+        self.pattern = pattern
+        tokens = parse_format(pattern)
+        self.kinds = [kind for kind, _, _ in tokens]
+        self.exact = re.compile("".join(f"{_CLASSES[k]}{{{lo},{hi}}}" for k, lo, hi in tokens))
+        self.tolerant = re.compile("".join(f"({_TOLERANT[k]}{{{lo},{hi}}})" for k, lo, hi in tokens))
+        self.needs_both = set(self.kinds) == {"X"}  # all-X formats must still mix letters and digits
+
+    def match(self, text):
+        """The plate as this format reads it (confusions corrected), or None."""
+        if self.exact.fullmatch(text):
+            plate = text
+        else:
+            m = self.tolerant.fullmatch(text)
+            if m is None:
+                return None
+            plate = "".join(group.translate(_FIX[kind]) for group, kind in zip(m.groups(), self.kinds))
+        if self.needs_both and (plate.isalpha() or plate.isdigit()):
+            return None
+        return plate
+
+
+class PlateGrammar:
+    """
+    The plate formats a deployment accepts, tried in order. match() is what
+    the OCR cascade stops on: the first read that fits a format (with
+    confusable characters fixed by position) and is confident enough.
+    """
+
+    def __init__(self, spec="generic"):
+        self.formats = []
+        for item in (s.strip() for s in re.split(r"[,;]", spec or "")):
+            if not item:
+                continue
+            patterns = REGIONS.get(item) or REGIONS.get(item.upper())
+            try:
+                if patterns:
+                    self.formats.extend(PlateFormat(item, p) for p in patterns)
+                else:
+                    self.formats.append(PlateFormat(item, item))
+            except ValueError as e:
+                print(f"WARN: Ignoring plate format: {e}")
+
+    def __bool__(self):
+        return bool(self.formats)
+
+    def match(self, text):
+        """(plate, format name) for the first format the text fits, else None."""
+        text = "".join(c for c in str(text).upper() if c.isalnum())
+        for plate_format in self.formats:
+            plate = plate_format.match(text)
+            if plate is not None:
+                return plate, plate_format.name
+        return None
+
+    def describe(self):
+        return [f"{f.name}:{f.pattern}" if f.name != f.pattern else f.pattern for f in self.formats]
@@ -0,0 +1,198 @@
+import threading
+import time
+from itertools import islice
+
+from sqlalchemy import select
+
+# Characters OCR mixes up on plates; both sides map to the digit so
+# "AB1O8" and "A81O8" land on the same canonical key.
+CONFUSIONS = str.maketrans({"O": "0", "B": "8", "I": "1", "S": "5"})
+
+# Shorter queries match too much of the history to be useful (and have no trigrams)
+MIN_QUERY = 3
+
+# Plate values that are placeholders, not reads
+NON_PLATES = {"", "UNKNOWN", "NUMBER PLATE"}
+
+# Keys verified per query at most; a query that reaches more is too vague to rank them all
+MAX_CANDIDATES = 5000
+
+_EMPTY = frozenset()
+
+
+def canonical(plate):
+    """Uppercase alphanumerics with OCR-confusable characters folded together."""
+    return "".join(c for c in str(plate).upper() if c.isalnum()).translate(CONFUSIONS)
+
+
+def trigrams(key, padded=True):
+    if padded:
+        key = f"^{key}$"
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it must exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class PlateIndex:
+    """
+    In-memory trigram index over the distinct plate numbers in the detection
+    table. Keys are canonical plates, so OCR confusions match for free; a
+    query is expanded to candidate keys through shared trigrams and then
+    verified and ranked by edit distance (or as a partial plate). Rows are
+    fetched afterwards with an indexed plate_number IN (...) query.
+    """
+
+    def __init__(self):
+        self._variants = {}  # canonical -> set of plate strings as stored
+        self._grams = {}  # trigram -> set of canonical keys
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.queries = 0
+
+    def __len__(self):
+        return len(self._variants)
+
+    def load(self, engine, table):
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            plates = conn.execute(select(table.c.plate_number).distinct()).scalars().all()
+        self.add_many(plates)
+        self.loaded = True
+        print(f"DEBUG: Plate index loaded {len(self)} plates in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def add_many(self, plates):
+        with self._lock:
+            for plate in plates:
+                if plate is None or plate in NON_PLATES:
+                    continue
+                key = canonical(plate)
+                if not key:
+                    continue
+                variants = self._variants.get(key)
+                if variants is None:
+                    variants = self._variants[key] = set()
+                    for gram in trigrams(key):
+                        self._grams.setdefault(gram, set()).add(key)
+                variants.add(plate)
+
+    def add_rows(self, rows):
+        """DetectionSink hook: index the plates of a freshly written batch."""
+        self.add_many(r.get('plate_number') for r in rows)
+
+    def remove(self, plates):
+        """Forget plates that no detection row carries any more."""
+        with self._lock:
+            for plate in plates:
+                key = canonical(plate)
+                variants = self._variants.get(key)
+                if variants is None:
+                    continue
+                variants.discard(plate)
+                if variants:
+                    continue
+                del self._variants[key]
+                for gram in trigrams(key):
+                    posting = self._grams.get(gram)
+                    if posting is not None:
+                        posting.discard(key)
+                        if not posting:
+                            del self._grams[gram]
+
+    def prune(self, engine, table):
+        """RetentionManager hook: drop the plates whose rows were all purged."""
+        start = time.perf_counter()
+        # Snapshot first: a plate indexed after it is already stored, so never looks stale
+        with self._lock:
+            indexed = {plate for variants in self._variants.values() for plate in variants}
+        with engine.connect() as conn:
+            present = set(conn.execute(select(table.c.plate_number).distinct()).scalars().all())
+        stale = indexed - present
+        self.remove(stale)
+        print(f"DEBUG: Plate index pruned {len(stale)} purged plates in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return len(stale)
+
+    def _candidates(self, key, max_distance):
+        internal = trigrams(key, padded=False)
+        grams = trigrams(key)
+        # One edit destroys at most three trigrams; a partial plate keeps all internal ones
+        needed = max(1, min(len(internal), len(grams) - 3 * max_distance))
+        with self._lock:
+            postings = sorted((self._grams.get(gram, _EMPTY) for gram in grams), key=len)
+            # A key sharing `needed` grams is in at least one of the rarest
+            # len - needed + 1 postings: only those are walked, from a capped copy
+            seeds = len(postings) - needed + 1
+            rare = [tuple(islice(p, MAX_CANDIDATES)) for p in postings[:seeds]]
+            exact = key in self._variants
+        # The common postings are only probed; `in` on a set another thread
+        # is adding to is safe, and a plate added meanwhile is seen or not
+        common = postings[seeds:]
+        shared = {}
+        for posting in rare:
+            for k in posting:
+                if k in shared:
+                    shared[k] += 1
+                elif len(shared) < MAX_CANDIDATES:
+                    shared[k] = 1
+        candidates = [k for k, n in shared.items() if n + sum(k in p for p in common) >= needed]
+        if exact and key not in shared:
+            candidates.append(key)
+        return candidates
+
+    def search(self, query, max_distance=1, limit=50):
+        """
+        Return [{"plate", "canonical", "match", "distance", "score"}] best
+        first. match is exact, confusable (same canonical key), fuzzy
+        (within max_distance edits) or partial (query is part of the plate).
+        """
+        raw = "".join(c for c in str(query).upper() if c.isalnum())
+        key = canonical(raw)
+        if len(key) < MIN_QUERY:
+            return []
+        self.queries += 1
+        # Verified outside the lock so /detect's index updates never wait on a search
+        verified = []
+        for candidate in self._candidates(key, max_distance):
+            distance = edit_distance(key, candidate, max_distance)
+            if distance <= max_distance:
+                score = 1.0 - distance / float(max(len(key), len(candidate)))
+                kind = "fuzzy" if distance else "confusable"
+            elif key in candidate:
+                score = 0.5 + 0.4 * len(key) / float(len(candidate))
+                kind = "partial"
+            else:
+                continue
+            verified.append((candidate, distance, score, kind))
+        with self._lock:
+            # A plate purged since the candidates were taken has no variants left
+            variants = {candidate: tuple(self._variants.get(candidate, ())) for candidate, *_ in verified}
+        matches = []
+        for candidate, distance, score, kind in verified:
+            for plate in variants[candidate]:
+                exact = kind == "confusable" and plate.upper() == raw
+                matches.append({
+                    "plate": plate,
+                    "canonical": candidate,
+                    "match": "exact" if exact else kind,
+                    "distance": distance if distance <= max_distance else None,
+                    "score": round(1.0 if exact else min(score, 0.99), 3)
+                })
+        matches.sort(key=lambda m: (-m["score"], m["plate"]))
+        return matches[:limit]
+
+    def metrics(self):
+        with self._lock:
+            return {"plates": len(self._variants), "trigrams": len(self._grams),
+                    "loaded": self.loaded, "queries": self.queries}
@@ -1,269 +1,588 @@
-import cv2
-import numpy as np
-from ultralytics import YOLO
-import easyocr
-try:
-    from paddleocr import PaddleOCR
-    PADDLEOCR_AVAILABLE = True
-except ImportError:
-    PADDLEOCR_AVAILABLE = False
-    print("WARNING: PaddleOCR not available, falling back to EasyOCR")
-import os
-
-import PIL.Image
-if not hasattr(PIL.Image, 'ANTIALIAS'):
-    PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
-
-class AIProcessor:
-    def __init__(self):
-        # Base directory for models
-        self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Load YOLOv8 models with absolute paths
-        helmet_model_path = os.path.join(self.base_dir, 'best (1).pt')
-        plate_model_path = os.path.join(self.base_dir, 'best (4).pt')
-        
-        self.helmet_model = None
-        self.plate_model = None
-        self.paddle_ocr = None
-        self.easyocr_reader = None
-        self.ocr_engine = None  # Will be 'paddle' or 'easy'
-
-        try:
-            if os.path.exists(helmet_model_path):
-                # Load helmet model explicitly on CPU
-                self.helmet_model = YOLO(helmet_model_path, task='detect')
-                self.helmet_model.to('cpu')
-                print(f"DEBUG: Helmet model loaded. Classes: {self.helmet_model.names}")
-            else:
-                print(f"ERROR: Helmet model not found at {helmet_model_path}")
-        except Exception as e:
-            print(f"CRITICAL: Failed to load helmet model: {e}")
-
-        try:
-            if os.path.exists(plate_model_path):
-                # Load plate model explicitly on CPU
-                self.plate_model = YOLO(plate_model_path, task='detect')
-                self.plate_model.to('cpu')
-                print(f"DEBUG: Plate model loaded from {plate_model_path}")
-            else:
-                print(f"ERROR: Plate model not found at {plate_model_path}")
-        except Exception as e:
-            print(f"CRITICAL: Failed to load plate model: {e}")
-        
-        # Pre-initialize OCR to avoid lag during first detection
-        self._init_ocr()
-        
-    def _init_ocr(self):
-        """Initialize OCR engine, trying PaddleOCR first, then EasyOCR as fallback"""
-        if self.ocr_engine is not None:
-            return  # Already initialized
-        
-        # Try PaddleOCR first (better for license plates)
-        if PADDLEOCR_AVAILABLE and self.paddle_ocr is None:
-            try:
-                print("DEBUG: Initializing PaddleOCR...")
-                self.paddle_ocr = PaddleOCR(
-                    use_angle_cls=True,
-                    lang='en',
-                    use_gpu=False,
-                    show_log=False
-                )
-                self.ocr_engine = 'paddle'
-                print("DEBUG: PaddleOCR initialized successfully")
-                return
-            except Exception as e:
-                print(f"WARN: PaddleOCR initialization failed: {e}, falling back to EasyOCR")
-        
-        # Fallback to EasyOCR
-        if self.easyocr_reader is None:
-            try:
-                print("DEBUG: Initializing EasyOCR...")
-                self.easyocr_reader = easyocr.Reader(['en'], gpu=False)
-                self.ocr_engine = 'easy'
-                print("DEBUG: EasyOCR initialized successfully")
-            except Exception as e:
-                print(f"ERROR: All OCR engines failed to initialize: {e}")
-                self.ocr_engine = None
-
-    def process_frame(self, frame):
-        results = []
-        if frame is None:
-            return results
-
-        # 1. Detect helmets/riders
-        if self.helmet_model:
-            try:
-                # Lowered helmet conf to 0.3 for better sensitivity on multi-bike images
-                helmet_results = self.helmet_model(frame, conf=0.3, imgsz=640, verbose=False)[0]
-                print(f"DEBUG: Helmet model found {len(helmet_results.boxes)} raw boxes")
-                for box in helmet_results.boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    cls = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    
-                    label = "with helmets" if cls == 0 else "No_helmets"
-                    color = (0, 255, 0) if cls == 0 else (0, 0, 255) # BGR
-                    results.append({
-                        "type": "COMPLIANT" if cls == 0 else "NO_HELMET",
-                        "box": [x1, y1, x2, y2],
-                        "label": label,
-                        "color": color,
-                        "confidence": conf
-                    })
-            except Exception as e:
-                print(f"ERROR: Helmet inference failed: {e}")
-        
-        # 2. Detect license plates
-        if self.plate_model:
-            try:
-                # Hyper-sensitivity mode: 0.05 conf, 1280px res, and agnostic NMS to prevent suppression
-                print(f"DEBUG: Running plate detection on frame size {frame.shape[:2]} with imgz=1280, conf=0.05")
-                plate_results = self.plate_model(frame, conf=0.05, imgsz=1280, agnostic_nms=True, verbose=False)[0]
-                print(f"DEBUG: Plate model found {len(plate_results.boxes)} raw boxes")
-                
-                for box in plate_results.boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    conf = float(box.conf[0])
-                    
-                    # Crop plate with slightly more padding for context
-                    h, w = frame.shape[:2]
-                    padding = 15
-                    crop_x1, crop_y1 = max(0, int(x1) - padding), max(0, int(y1) - padding)
-                    crop_x2, crop_y2 = min(w, int(x2) + padding), min(h, int(y2) + padding)
-                    plate_img = frame[crop_y1:crop_y2, crop_x1:crop_x2]
-                    
-                    plate_text = "NUMBER PLATE"
-                    if plate_img.size > 0:
-                        # Upscale if too small
-                        orig_h, orig_w = plate_img.shape[:2]
-                        if orig_w < 200:
-                            scale = 200 / orig_w
-                            plate_img = cv2.resize(plate_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
-
-                        self._init_ocr()
-                        if self.ocr_engine:
-                            try:
-                                # Enhanced preprocessing for better OCR accuracy
-                                gray_plate = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
-                                
-                                # CLAHE for contrast enhancement
-                                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-                                enhanced = clahe.apply(gray_plate)
-                                
-                                # Denoise
-                                denoised = cv2.fastNlMeansDenoising(enhanced, None, 10, 7, 21)
-                                
-                                # Run OCR based on available engine
-                                if self.ocr_engine == 'paddle':
-                                    try:
-                                        # PaddleOCR returns: [[[bbox], (text, confidence)]]
-                                        result = self.paddle_ocr.ocr(denoised, cls=True)
-                                        
-                                        if result and result[0]:
-                                            # Extract text and confidence, sort left to right
-                                            detections = [(box[0][0][0], box[1][0], box[1][1]) for box in result[0]]
-                                            detections.sort(key=lambda x: x[0])  # Sort by x-coordinate
-                                            
-                                            # Concatenate text, filter alphanumeric
-                                            text = "".join([d[1] for d in detections]).upper()
-                                            text = "".join([c for c in text if c.isalnum()])
-                                            
-                                            avg_conf = sum([d[2] for d in detections]) / len(detections) if detections else 0
-                                            
-                                            if len(text) >= 4:
-                                                plate_text = text
-                                                print(f"DEBUG: PaddleOCR read '{plate_text}' (conf: {avg_conf:.2f})")
-                                    except Exception as e:
-                                        print(f"ERROR: PaddleOCR failed: {e}")
-                                
-                                elif self.ocr_engine == 'easy':
-                                    # Multi-technique approach for EasyOCR
-                                    candidates = []
-                                    
-                                    # Technique 1: Enhanced + Adaptive Threshold
-                                    try:
-                                        adaptive = cv2.adaptiveThreshold(
-                                            denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                            cv2.THRESH_BINARY, 15, 3
-                                        )
-                                        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
-                                        cleaned = cv2.morphologyEx(adaptive, cv2.MORPH_CLOSE, kernel)
-                                        
-                                        result1 = self.easyocr_reader.readtext(
-                                            cleaned, 
-                                            allowlist='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-                                        )
-                                        if result1:
-                                            result1.sort(key=lambda x: x[0][0][0])
-                                            text1 = "".join([res[1] for res in result1]).upper()
-                                            avg_conf1 = sum([res[2] for res in result1]) / len(result1)
-                                            candidates.append((text1, avg_conf1, "adaptive"))
-                                    except Exception as e:
-                                        print(f"WARN: EasyOCR adaptive failed: {e}")
-                                    
-                                    # Technique 2: Enhanced + OTSU
-                                    try:
-                                        _, otsu = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                                        result2 = self.easyocr_reader.readtext(
-                                            otsu, 
-                                            allowlist='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-                                        )
-                                        if result2:
-                                            result2.sort(key=lambda x: x[0][0][0])
-                                            text2 = "".join([res[1] for res in result2]).upper()
-                                            avg_conf2 = sum([res[2] for res in result2]) / len(result2)
-                                            candidates.append((text2, avg_conf2, "otsu"))
-                                    except Exception as e:
-                                        print(f"WARN: EasyOCR otsu failed: {e}")
-                                    
-                                    # Select best candidate
-                                    if candidates:
-                                        valid_candidates = [(t, c, m) for t, c, m in candidates if len(t) >= 4]
-                                        
-                                        if valid_candidates:
-                                            def score_candidate(text, conf):
-                                                has_numbers = any(c.isdigit() for c in text)
-                                                has_letters = any(c.isalpha() for c in text)
-                                                both = has_numbers and has_letters
-                                                return (both, len(text), conf)
-                                            
-                                            valid_candidates.sort(key=lambda x: score_candidate(x[0], x[1]), reverse=True)
-                                            plate_text = valid_candidates[0][0]
-                                            print(f"DEBUG: EasyOCR selected '{plate_text}' (method: {valid_candidates[0][2]}, conf: {valid_candidates[0][1]:.2f})")
-                                
-                            except Exception as ocr_e:
-                                print(f"ERROR: OCR processing failed: {ocr_e}")
-                    
-                    results.append({
-                        "type": "plate",
-                        "box": [x1, y1, x2, y2],
-                        "label": plate_text,
-                        "color": (0, 255, 255), # Yellow in BGR
-                        "confidence": conf,
-                        "plate_number": plate_text
-                    })
-            except Exception as e:
-                print(f"ERROR: Plate inference failed: {e}")
-            
-        return results
-
-    def annotate_frame(self, frame, detections):
-        if frame is None:
-            return None
-        
-        # Dynamic thickness based on resolution
-        h, w = frame.shape[:2]
-        thickness = max(1, int(w / 640))
-        font_scale = max(0.4, w / 1280)
-
-        for det in detections:
-            try:
-                x1, y1, x2, y2 = map(int, det["box"])
-                color = det.get("color", (255, 255, 255))
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
-                cv2.putText(frame, f"{det['label']} ({det['confidence']:.2f})", 
-                            (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
-            except Exception as e:
-                print(f"ERROR: Annotation failed for detection {det}: {e}")
-        return frame
+import cv2
+import numpy as np
+import os
+import sys
+import threading
+import time
+import zlib
+from frame_decode import DecodedFrame
+from buffer_pool import BufferPool
+from letterbox import LetterboxPyramid
+from association import associate_plates, plates_to_read
+from cascade import CascadeGate
+from detections import DetectionRecord, box_arrays
+from plate_grammar import PlateGrammar
+from model_registry import boxes_from_arrays
+from startup_report import startup
+
+# Ultralytics (torch) and the OCR engines cost seconds and hundreds of MB to
+# import; they are only imported once something actually needs them.
+_YOLO = None
+
+CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+OCR_ALLOWLIST = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# OCR variants per engine, cheapest first: (name, image, binarisation).
+# 'enhanced' is the CLAHE crop, 'denoised' adds non-local-means denoising and
+# 'upscaled' is the denoised crop at twice the size. The cascade stops at
+# the first read that fits a plate format; the fast profile only tries the
+# 'enhanced' variants.
+OCR_VARIANTS = {
+    'easy': (('adaptive', 'enhanced', 'adaptive'), ('otsu', 'enhanced', 'otsu'),
+             ('denoised-adaptive', 'denoised', 'adaptive'), ('denoised-otsu', 'denoised', 'otsu'),
+             ('upscaled-otsu', 'upscaled', 'otsu')),
+    'paddle': (('enhanced', 'enhanced', None), ('denoised', 'denoised', None), ('upscaled', 'upscaled', None)),
+}
+
+
+def yolo_class():
+    global _YOLO
+    if _YOLO is None:
+        with startup.measure('import:ultralytics'):
+            from ultralytics import YOLO
+        _YOLO = YOLO
+    return _YOLO
+
+
+def _patch_pil():
+    # EasyOCR still uses the alias Pillow 10 removed
+    import PIL.Image
+    if not hasattr(PIL.Image, 'ANTIALIAS'):
+        PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
+
+
+class AIProcessor:
+    def __init__(self, model_paths=None, load_models=True):
+        # Base directory for models
+        self.base_dir = os.path.dirname(os.path.abspath(__file__))
+        
+        # Load YOLOv8 models with absolute paths (the model registry passes the active versions)
+        model_paths = model_paths or {}
+        helmet_model_path = model_paths.get('helmet') or os.path.join(self.base_dir, 'best (1).pt')
+        plate_model_path = model_paths.get('plate') or os.path.join(self.base_dir, 'best (4).pt')
+        
+        self.helmet_model = None
+        self.plate_model = None
+        self.paddle_ocr = None
+        self.easyocr_reader = None
+        self.ocr_engine = None  # Will be 'paddle' or 'easy'
+        # auto (PaddleOCR, falling back to EasyOCR) | paddle | easy; only that engine is imported
+        self.ocr_preference = os.environ.get('SAFECITY_OCR_ENGINE', 'auto')
+        self._ocr_failed = False
+
+        # Inference resolutions (the decoder only needs to deliver this much)
+        self.helmet_imgsz = 640
+        self.plate_imgsz = 1280
+
+        # Which plate boxes get OCR: 'violations' (linked to a NO_HELMET rider),
+        # 'violations+confident' (also any plate above the floor) or 'all'
+        self.plate_ocr_mode = os.environ.get('SAFECITY_PLATE_OCR_MODE', 'violations+confident')
+        self.plate_ocr_floor = float(os.environ.get('SAFECITY_PLATE_OCR_FLOOR', 0.5))
+
+        # OCR variant cascade: stop at the first read that fits one of the plate
+        # formats (see plate_grammar.py) with at least this confidence
+        self.plate_grammar = PlateGrammar(os.environ.get('SAFECITY_PLATE_FORMATS', 'generic'))
+        self.ocr_accept_conf = float(os.environ.get('SAFECITY_OCR_ACCEPT_CONF', 0.5))
+        self.ocr_stats = {"plates": 0, "calls": 0, "early_exits": 0, "grammar_matches": 0,
+                          "variants_tried": {}, "accepted_by": {}}
+
+        # Pixels actually fed to the models vs. decoded, and detections
+        # discarded for falling outside a source's region of interest
+        self.roi_stats = {"frames": 0, "pixels_in": 0, "pixels_used": 0, "discarded": 0}
+        self._stats_lock = threading.Lock()
+
+        # Candidate models running in shadow mode, by role (see model_registry.py)
+        self.shadows = {}
+
+        # Optional cascade gate: a tiny COCO model that skips frames with no
+        # person/motorcycle before the full detectors run
+        self.cascade = None
+
+        # Reused per-frame buffers: letterbox levels, input tensors, OCR intermediates
+        self.buffers = BufferPool(max_mb=int(os.environ.get('SAFECITY_BUFFER_POOL_MB', 128)))
+        # Letterbox once for both detectors and pass tensors (needs torch, i.e. real YOLO models)
+        self.shared_letterbox = os.environ.get('SAFECITY_SHARED_LETTERBOX', '1') == '1'
+
+        if not load_models:  # StubProcessor: same state, no weights or OCR engines
+            return
+
+        self.helmet_model = self.load_detector(helmet_model_path)
+        if self.helmet_model is not None:
+            print(f"DEBUG: Helmet model loaded. Classes: {self.helmet_model.names}")
+        self.plate_model = self.load_detector(plate_model_path)
+        if self.plate_model is not None:
+            print(f"DEBUG: Plate model loaded from {plate_model_path}")
+
+        if os.environ.get('SAFECITY_CASCADE', '0') == '1':
+            self._init_cascade()
+
+        # Pre-initialize OCR to avoid lag during first detection (and so that
+        # forked workers share it); scripts that only need a detector can skip it
+        if os.environ.get('SAFECITY_OCR_PRELOAD', '1') == '1':
+            self._init_ocr()
+
+    @staticmethod
+    def load_detector(path):
+        """Load YOLO weights explicitly on CPU; None if missing or broken."""
+        try:
+            if not os.path.exists(path):
+                print(f"ERROR: Model not found at {path}")
+                return None
+            with startup.measure(f"model:{os.path.basename(path)}"):
+                model = yolo_class()(path, task='detect')
+                model.to('cpu')
+            return model
+        except Exception as e:
+            print(f"CRITICAL: Failed to load model {path}: {e}")
+            return None
+
+    def _init_cascade(self):
+        gate_model_path = os.environ.get('SAFECITY_CASCADE_MODEL', os.path.join(self.base_dir, 'yolov8n.pt'))
+        try:
+            # Stock weights are fetched by ultralytics on first use if missing
+            with startup.measure('model:cascade'):
+                gate_model = yolo_class()(gate_model_path, task='detect')
+                gate_model.to('cpu')
+            self.cascade = CascadeGate(
+                gate_model,
+                imgsz=int(os.environ.get('SAFECITY_CASCADE_IMGSZ', 320)),
+                conf=float(os.environ.get('SAFECITY_CASCADE_CONF', 0.25)),
+                crop_regions=os.environ.get('SAFECITY_CASCADE_CROP', '1') == '1'
+            )
+            print(f"DEBUG: Cascade gate loaded from {gate_model_path} (imgsz={self.cascade.imgsz}, conf={self.cascade.conf})")
+        except Exception as e:
+            print(f"WARN: Cascade gate unavailable, running full models on every frame: {e}")
+            self.cascade = None
+        
+    def _init_ocr(self):
+        """Initialize OCR engine, trying PaddleOCR first, then EasyOCR as fallback"""
+        if self.ocr_engine is not None or self._ocr_failed:
+            return  # Already initialized (or nothing to try)
+        
+        # Try PaddleOCR first (better for license plates)
+        if self.ocr_preference in ('auto', 'paddle') and self.paddle_ocr is None:
+            try:
+                print("DEBUG: Initializing PaddleOCR...")
+                with startup.measure('ocr:paddle'):
+                    from paddleocr import PaddleOCR
+                    self.paddle_ocr = PaddleOCR(
+                        use_angle_cls=True,
+                        lang='en',
+                        use_gpu=False,
+                        show_log=False
+                    )
+                self.ocr_engine = 'paddle'
+                print("DEBUG: PaddleOCR initialized successfully")
+                return
+            except ImportError:
+                print("WARNING: PaddleOCR not available, falling back to EasyOCR")
+            except Exception as e:
+                print(f"WARN: PaddleOCR initialization failed: {e}, falling back to EasyOCR")
+        
+        # Fallback to EasyOCR
+        if self.ocr_preference in ('auto', 'easy') and self.easyocr_reader is None:
+            try:
+                print("DEBUG: Initializing EasyOCR...")
+                with startup.measure('ocr:easy'):
+                    _patch_pil()
+                    import easyocr
+                    self.easyocr_reader = easyocr.Reader(['en'], gpu=False)
+                self.ocr_engine = 'easy'
+                print("DEBUG: EasyOCR initialized successfully")
+                return
+            except Exception as e:
+                print(f"ERROR: All OCR engines failed to initialize: {e}")
+        self.ocr_engine = None
+        self._ocr_failed = True
+
+    def max_input_size(self, profile=None):
+        """Largest resolution any enabled model consumes."""
+        profile = profile or {}
+        plate_enabled = self.plate_model and profile.get('plate_enabled', True)
+        sizes = [
+            profile.get('helmet_imgsz', self.helmet_imgsz) if self.helmet_model else 0,
+            profile.get('plate_imgsz', self.plate_imgsz) if plate_enabled else 0
+        ]
+        return max(sizes) or self.helmet_imgsz
+
+    def process_frame(self, frame, profile=None):
+        """
+        Run helmet + plate detection and OCR. `profile` optionally overrides the
+        cost knobs: helmet_imgsz/helmet_conf and plate_imgsz/plate_conf (a
+        source's calibrated settings), plate_enabled and ocr_profile ('full' runs
+        the OCR variant cascade until a read fits a plate format, 'fast' skips
+        the denoised variants and stops after the first usable read), cascade
+        (False bypasses the gate) and roi (the source's RegionOfInterest).
+        """
+        results = []
+        profile = profile or {}
+        helmet_imgsz = profile.get('helmet_imgsz', self.helmet_imgsz)
+        helmet_conf = profile.get('helmet_conf', 0.3)
+        plate_imgsz = profile.get('plate_imgsz', self.plate_imgsz)
+        plate_conf = profile.get('plate_conf', 0.05)
+        plate_enabled = profile.get('plate_enabled', True)
+        fast_ocr = profile.get('ocr_profile', 'full') == 'fast'
+        ocr_mode = profile.get('plate_ocr_mode', self.plate_ocr_mode)
+        # A DecodedFrame may carry a reduced image; plate crops come from full resolution
+        decoded = frame if isinstance(frame, DecodedFrame) else None
+        if decoded is not None:
+            frame = decoded.image
+        if frame is None:
+            return results
+        full_frame = frame
+        full_h, full_w = frame.shape[:2]
+        # One consistent set of models per frame, even if the registry swaps mid-frame
+        helmet_model, plate_model, shadows = self.helmet_model, self.plate_model, self.shadows
+
+        # 0a. Region of interest: only the part of the frame riders can be in
+        ox, oy = 0, 0
+        roi = profile.get('roi')
+        if roi is not None:
+            window = roi.window(full_w, full_h)
+            if window is None:
+                return results
+            ox, oy, wx2, wy2 = window
+            frame = frame[oy:wy2, ox:wx2]
+            self._count_roi(full_w * full_h, frame.shape[0] * frame.shape[1])
+
+        # 0b. Cascade gate: skip frames without candidates, crop to the ones with
+        gated = self.cascade is not None and profile.get('cascade', True)
+        if gated:
+            passed, region = self.cascade.check(frame)
+            if not passed:
+                return results
+            if region is not None:
+                rx1, ry1, rx2, ry2 = region
+                frame = frame[ry1:ry2, rx1:rx2]
+                ox, oy = ox + rx1, oy + ry1
+
+        # 0c. One letterbox pyramid shared by both detectors, passed as ready tensors
+        torch = sys.modules.get('torch') if self.shared_letterbox else None
+        sizes = ([helmet_imgsz] if helmet_model else []) + ([plate_imgsz] if plate_model and plate_enabled else [])
+        pyramid = LetterboxPyramid(frame, sizes, self.buffers) if torch is not None and sizes else None
+
+        # 1. Detect helmets/riders
+        rider_boxes = np.zeros((0, 4), np.float32)
+        if helmet_model:
+            try:
+                # Lowered helmet conf to 0.3 for better sensitivity on multi-bike images
+                helmet_kwargs = dict(conf=helmet_conf, imgsz=helmet_imgsz, verbose=False)
+                started = time.perf_counter()
+                if pyramid is not None:
+                    xyxy, cls, conf = box_arrays(helmet_model(pyramid.tensor(helmet_imgsz, torch), **helmet_kwargs)[0])
+                    xyxy = pyramid.unmap(helmet_imgsz, xyxy)
+                else:
+                    xyxy, cls, conf = box_arrays(helmet_model(frame, **helmet_kwargs)[0])
+                if 'helmet' in shadows:
+                    shadows['helmet'].offer(frame, boxes_from_arrays(xyxy, cls, conf),
+                                            (time.perf_counter() - started) * 1000, helmet_kwargs)
+                print(f"DEBUG: Helmet model found {len(xyxy)} raw boxes")
+                xyxy, cls, conf = self._place(xyxy, cls, conf, ox, oy, roi, full_w, full_h)
+                rider_boxes = xyxy
+                for box, c, p in zip(xyxy.tolist(), cls.tolist(), conf.tolist()):
+                    if c == 0:
+                        results.append(DetectionRecord("COMPLIANT", box, "with helmets", p))
+                    else:
+                        results.append(DetectionRecord("NO_HELMET", box, "No_helmets", p))
+            except Exception as e:
+                print(f"ERROR: Helmet inference failed: {e}")
+            if gated:
+                self.cascade.count("helmet", not results)
+        
+        # 2. Detect license plates
+        if plate_model and plate_enabled:
+            try:
+                # Hyper-sensitivity mode: 0.05 conf, 1280px res, and agnostic NMS to prevent suppression
+                print(f"DEBUG: Running plate detection on frame size {frame.shape[:2]} with imgz={plate_imgsz}, conf={plate_conf}")
+                plate_kwargs = dict(conf=plate_conf, imgsz=plate_imgsz, agnostic_nms=True, verbose=False)
+                started = time.perf_counter()
+                if pyramid is not None:
+                    xyxy, cls, conf = box_arrays(plate_model(pyramid.tensor(plate_imgsz, torch), **plate_kwargs)[0])
+                    xyxy = pyramid.unmap(plate_imgsz, xyxy)
+                else:
+                    xyxy, cls, conf = box_arrays(plate_model(frame, **plate_kwargs)[0])
+                if 'plate' in shadows:
+                    shadows['plate'].offer(frame, boxes_from_arrays(xyxy, cls, conf),
+                                           (time.perf_counter() - started) * 1000, plate_kwargs)
+                print(f"DEBUG: Plate model found {len(xyxy)} raw boxes")
+                plate_boxes, _, plate_conf = self._place(xyxy, cls, conf, ox, oy, roi, full_w, full_h)
+
+                if gated:
+                    self.cascade.count("plate", len(plate_boxes) == 0)
+
+                # 3. Link plates to riders by geometry; only OCR the plates that matter
+                riders = results[:]
+                links = associate_plates(rider_boxes, plate_boxes)
+                ocr_targets = plates_to_read([r.type for r in riders], plate_conf, links, ocr_mode, self.plate_ocr_floor)
+                print(f"DEBUG: OCR on {len(ocr_targets)}/{len(plate_boxes)} plates (mode: {ocr_mode})")
+
+                # Unlinked low-confidence boxes (the bulk at a 0.05 floor) are most
+                # likely false positives and never become records
+                keep = range(len(plate_boxes)) if ocr_mode == 'all' else sorted(ocr_targets.union(links.values()))
+                plate_texts = {}
+                for idx in keep:
+                    box = plate_boxes[idx].tolist()
+                    plate_text, variants = "NUMBER PLATE", None
+                    if idx in ocr_targets:
+                        plate_text, variants = self._read_plate(full_frame, decoded, box, fast_ocr)
+                    plate_texts[idx] = plate_text
+                    results.append(DetectionRecord("plate", box, plate_text, float(plate_conf[idx]),
+                                                   plate_number=plate_text, ocr=idx in ocr_targets,
+                                                   ocr_variants=variants))
+
+                # Each rider carries the plate of its own motorcycle
+                for rider_idx, plate_idx in links.items():
+                    text = plate_texts.get(plate_idx)
+                    if text and text != "NUMBER PLATE":
+                        riders[rider_idx].plate_number = text
+            except Exception as e:
+                print(f"ERROR: Plate inference failed: {e}")
+
+        # Both steps catch their own errors; a pyramid that was never released
+        # is simply garbage-collected
+        if pyramid is not None:
+            pyramid.release()
+        return results
+
+    def _place(self, xyxy, cls, conf, ox, oy, roi, full_w, full_h):
+        """Shift boxes from crop to frame coordinates and drop those outside the ROI."""
+        if ox or oy:
+            xyxy = xyxy + np.array([ox, oy, ox, oy], dtype=xyxy.dtype)
+        if roi is not None and len(xyxy):
+            inside = roi.contains_boxes(xyxy, full_w, full_h)
+            if not inside.all():
+                self._count_roi(discarded=int(len(inside) - inside.sum()))
+                xyxy, cls, conf = xyxy[inside], cls[inside], conf[inside]
+        return xyxy, cls, conf
+
+    def _count_roi(self, pixels_in=0, pixels_used=0, discarded=0):
+        with self._stats_lock:
+            if pixels_in:
+                self.roi_stats["frames"] += 1
+            self.roi_stats["pixels_in"] += pixels_in
+            self.roi_stats["pixels_used"] += pixels_used
+            self.roi_stats["discarded"] += discarded
+
+    def _read_plate(self, frame, decoded, box, fast_ocr=False):
+        """
+        Crop a plate box (from full resolution when available) and OCR it.
+        Returns (text, number of OCR variants tried).
+        """
+        x1, y1, x2, y2 = box
+        # Crop plate with slightly more padding for context
+        crop_frame, crop_scale = frame, 1
+        if decoded is not None and decoded.scale != 1 and decoded.full is not None:
+            crop_frame, crop_scale = decoded.full, decoded.scale
+        h, w = crop_frame.shape[:2]
+        padding = int(15 * crop_scale)
+        crop_x1, crop_y1 = max(0, int(x1 * crop_scale) - padding), max(0, int(y1 * crop_scale) - padding)
+        crop_x2, crop_y2 = min(w, int(x2 * crop_scale) + padding), min(h, int(y2 * crop_scale) + padding)
+        plate_img = crop_frame[crop_y1:crop_y2, crop_x1:crop_x2]
+
+        plate_text = "NUMBER PLATE"
+        if plate_img.size == 0:
+            return plate_text, 0
+
+        # Every intermediate below lives in pooled buffers, returned at the end
+        scratch = self.buffers.scratch()
+
+        # Upscale if too small
+        orig_h, orig_w = plate_img.shape[:2]
+        if orig_w < 200:
+            size = (200, max(1, int(round(orig_h * 200 / orig_w))))
+            plate_img = cv2.resize(plate_img, size, scratch.get((size[1], size[0], 3)), interpolation=cv2.INTER_CUBIC)
+
+        self._init_ocr()
+        tried, accepted = 0, None
+        if self.ocr_engine:
+            try:
+                # Enhanced preprocessing for better OCR accuracy
+                gray_plate = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY, scratch.get(plate_img.shape[:2]))
+
+                # CLAHE for contrast enhancement
+                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+                images = {"enhanced": clahe.apply(gray_plate, scratch.like(gray_plate))}
+
+                # Variants cheapest first, until one reads as a plate with confidence
+                candidates = []  # (text, conf, variant, format)
+                for name, base, binarize in OCR_VARIANTS[self.ocr_engine]:
+                    if fast_ocr and base != "enhanced":
+                        break
+                    image = self._ocr_image(images, base, binarize, scratch)
+                    tried += 1
+                    read = self._recognize(image, name)
+                    if read is None:
+                        continue
+                    text, conf = read
+                    match = self.plate_grammar.match(text)
+                    if match is not None:
+                        candidates.append((match[0], conf, name, match[1]))
+                        if conf >= self.ocr_accept_conf:
+                            accepted = candidates[-1]
+                            break
+                    elif len(text) >= 4:
+                        candidates.append((text, conf, name, None))
+                    # Fast profile: the first usable read will do
+                    if fast_ocr and candidates:
+                        break
+
+                if candidates:
+                    def score_candidate(text, conf, fmt):
+                        has_numbers = any(c.isdigit() for c in text)
+                        has_letters = any(c.isalpha() for c in text)
+                        both = has_numbers and has_letters
+                        return (fmt is not None, both, len(text), conf)
+
+                    best = accepted or max(candidates, key=lambda c: score_candidate(c[0], c[1], c[3]))
+                    plate_text = best[0]
+                    print(f"DEBUG: {self.ocr_engine} OCR selected '{plate_text}' (variant: {best[2]}, "
+                          f"format: {best[3]}, conf: {best[1]:.2f}, {tried} variant(s) tried)")
+
+            except Exception as ocr_e:
+                print(f"ERROR: OCR processing failed: {ocr_e}")
+
+        scratch.release()
+        if tried:
+            self._count_ocr(tried, accepted, plate_text)
+        return plate_text, tried
+
+    def _ocr_image(self, images, base, binarize, scratch):
+        """One variant's input image; shared steps (denoising, upscaling) are computed once."""
+        if base not in images:
+            if base == "denoised":
+                enhanced = images["enhanced"]
+                images[base] = cv2.fastNlMeansDenoising(enhanced, scratch.like(enhanced), 10, 7, 21)
+            elif base == "upscaled":
+                denoised = self._ocr_image(images, "denoised", None, scratch)
+                h, w = denoised.shape[:2]
+                images[base] = cv2.resize(denoised, (w * 2, h * 2), scratch.get((h * 2, w * 2)),
+                                          interpolation=cv2.INTER_CUBIC)
+        image = images[base]
+        if binarize == "adaptive":
+            adaptive = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                             cv2.THRESH_BINARY, 15, 3, scratch.like(image))
+            return cv2.morphologyEx(adaptive, cv2.MORPH_CLOSE, CLOSE_KERNEL, scratch.like(adaptive))
+        if binarize == "otsu":
+            return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, scratch.like(image))[1]
+        return image
+
+    def _recognize(self, image, variant):
+        """(text, mean confidence) of one recognizer call, read left to right, or None."""
+        try:
+            if self.ocr_engine == 'paddle':
+                # PaddleOCR returns: [[[bbox], (text, confidence)]]
+                result = self.paddle_ocr.ocr(image, cls=True)
+                detections = [(box[0][0][0], box[1][0], box[1][1]) for box in result[0]] if result and result[0] else []
+            else:
+                result = self.easyocr_reader.readtext(image, allowlist=OCR_ALLOWLIST)
+                detections = [(res[0][0][0], res[1], res[2]) for res in result or []]
+        except Exception as e:
+            print(f"WARN: {self.ocr_engine} OCR ({variant}) failed: {e}")
+            return None
+        if not detections:
+            return None
+        detections.sort(key=lambda d: d[0])  # Sort by x-coordinate
+        text = "".join(c for c in "".join(d[1] for d in detections).upper() if c.isalnum())
+        return text, sum(d[2] for d in detections) / len(detections)
+
+    def _count_ocr(self, tried, accepted, plate_text):
+        with self._stats_lock:
+            stats = self.ocr_stats
+            stats["plates"] += 1
+            stats["calls"] += tried
+            stats["variants_tried"][tried] = stats["variants_tried"].get(tried, 0) + 1
+            if accepted is not None:
+                stats["early_exits"] += 1
+                stats["accepted_by"][accepted[2]] = stats["accepted_by"].get(accepted[2], 0) + 1
+            if plate_text != "NUMBER PLATE" and self.plate_grammar.match(plate_text) is not None:
+                stats["grammar_matches"] += 1
+
+    def annotate_frame(self, frame, detections, scale=1):
+        """Draw detections in place; `scale` maps their boxes onto a larger frame."""
+        if frame is None:
+            return None
+
+        # Dynamic thickness based on resolution
+        h, w = frame.shape[:2]
+        thickness = max(1, int(w / 640))
+        font_scale = max(0.4, w / 1280)
+
+        for det in detections:
+            try:
+                x1, y1, x2, y2 = (int(v * scale) for v in det["box"])
+                color = det.get("color", (255, 255, 255))
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+                cv2.putText(frame, f"{det['label']} ({det['confidence']:.2f})", 
+                            (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+            except Exception as e:
+                print(f"ERROR: Annotation failed for detection {det}: {e}")
+        return frame
+
+    def metrics(self):
+        return {
+            "helmet_imgsz": self.helmet_imgsz,
+            "plate_imgsz": self.plate_imgsz,
+            "plate_ocr_mode": self.plate_ocr_mode,
+            "cascade": self.cascade.metrics() if self.cascade is not None else None,
+            "roi": self._roi_metrics(),
+            "buffer_pool": self.buffers.metrics(),
+            "ocr": self._ocr_metrics()
+        }
+
+    def _ocr_metrics(self):
+        with self._stats_lock:
+            stats = dict(self.ocr_stats, variants_tried=dict(self.ocr_stats["variants_tried"]),
+                         accepted_by=dict(self.ocr_stats["accepted_by"]))
+        stats["variants_per_plate"] = round(stats["calls"] / stats["plates"], 2) if stats["plates"] else 0.0
+        stats["formats"] = self.plate_grammar.describe()
+        stats["accept_conf"] = self.ocr_accept_conf
+        return stats
+
+    def _roi_metrics(self):
+        with self._stats_lock:
+            stats = dict(self.roi_stats)
+        stats["pixel_fraction"] = round(stats["pixels_used"] / stats["pixels_in"], 3) if stats["pixels_in"] else 1.0
+        return stats
+
+
+class StubProcessor(AIProcessor):
+    """
+    AIProcessor without models, for load tests of the web, database and
+    encode tiers (SAFECITY_STUB_PROCESSOR=1). Every frame yields one rider
+    and its plate after a fixed delay; the plate is derived from the pixels,
+    so distinct frames produce distinct records just like real reads.
+    """
+
+    def __init__(self, latency_ms=0):
+        super().__init__(load_models=False)
+        self.ocr_engine = 'stub'
+        self.plate_ocr_mode = 'all'
+        self.plate_grammar = PlateGrammar("")
+        self.ocr_accept_conf = 0.0
+        self.buffers = BufferPool(max_mb=16)
+        self.shared_letterbox = False
+        self.latency_ms = latency_ms
+        print(f"WARN: Stub processor active, no models loaded ({latency_ms}ms per frame)")
+
+    @staticmethod
+    def load_detector(path):
+        return None
+
+    def max_input_size(self, profile=None):
+        return self.helmet_imgsz
+
+    def process_frame(self, frame, profile=None):
+        if isinstance(frame, DecodedFrame):
+            frame = frame.image
+        if frame is None:
+            return []
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        h, w = frame.shape[:2]
+        plate = f"ST{zlib.crc32(np.ascontiguousarray(frame[::16, ::16]).data) % 100000:05d}"
+        rider = [w * 0.4, h * 0.2, w * 0.6, h * 0.7]
+        plate_box = [w * 0.45, h * 0.72, w * 0.55, h * 0.8]
+        return [
+            DetectionRecord("NO_HELMET", rider, "No_helmets", 0.9, plate_number=plate),
+            DetectionRecord("plate", plate_box, plate, 0.8, plate_number=plate, ocr=True)
+        ]
@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text, bindparam
+
+from storage import purge_range, delete_in_batches
+from evidence_store import thumbnail_for
+
+
+class RetentionManager:
+    """
+    Deletes detections in bounded batches together with exactly the evidence
+    files they referenced, sweeps orphaned files, and enforces age / disk
+    quota policies from a background thread so /detect is never blocked.
+    """
+
+    def __init__(self, app, db, upload_folder, partitions=None, batch_size=500, batch_pause=0.05,
+                 max_age_days=0, max_disk_mb=0, interval_seconds=3600, orphan_grace_seconds=3600,
+                 after_purge=None):
+        self.app = app
+        self.db = db
+        self.upload_folder = upload_folder
+        self.partitions = partitions
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.max_age_days = max_age_days
+        self.max_disk_bytes = max_disk_mb * 1024 * 1024
+        self.interval = interval_seconds
+        # Files younger than this may belong to rows still buffered in the sink
+        self.orphan_grace = orphan_grace_seconds
+        # Called once rows were deleted (e.g. to drop purged plates from the search index)
+        self.after_purge = after_purge
+
+        self._lock = threading.Lock()  # one purge/sweep at a time
+        self._thread = None
+        self._wakeup = threading.Event()
+
+        self.last_run = None
+        self.rows_deleted = 0
+        self.files_deleted = 0
+        self.bytes_freed = 0
+        self.orphans_deleted = 0
+
+    # --- File bookkeeping ---------------------------------------------------
+
+    def _file_path(self, image_path):
+        # Stored as "uploads/<relative path>"
+        rel = image_path.split('/', 1)[1] if image_path.startswith('uploads/') else image_path
+        full = os.path.normpath(os.path.join(self.upload_folder, rel))
+        if not full.startswith(os.path.normpath(self.upload_folder) + os.sep):
+            return None
+        return full
+
+    def _remove_file(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        self.files_deleted += 1
+        self.bytes_freed += size
+        return size
+
+    def release_images(self, image_paths):
+        """Remove the files of deleted rows unless another row still references them."""
+        image_paths = [p for p in set(image_paths) if p]
+        if not image_paths:
+            return 0
+        with self.db.engine.connect() as conn:
+            still_used = set(conn.execute(
+                text("SELECT DISTINCT image_path FROM detection WHERE image_path IN :paths")
+                .bindparams(bindparam("paths", expanding=True)),
+                {"paths": image_paths}
+            ).scalars().all())
+        freed = 0
+        for image_path in image_paths:
+            if image_path in still_used:
+                continue
+            for candidate in (image_path, thumbnail_for(image_path)):
+                path = candidate and self._file_path(candidate)
+                if path:
+                    freed += self._remove_file(path)
+        return freed
+
+    def _iter_files(self):
+        for root, _, files in os.walk(self.upload_folder):
+            for name in files:
+                if name.endswith('.jpg'):
+                    yield os.path.join(root, name)
+
+    def disk_usage(self):
+        total = 0
+        for path in self._iter_files():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    # --- Purge ----------------------------------------------------------------
+
+    def purge(self, start=None, end=None):
+        """Delete detections in [start, end] and their evidence files. Returns row count."""
+        with self._lock, self.app.app_context():
+            if start is None and end is None:
+                count = purge_range(self.db.engine, partitions=self.partitions, batch_size=self.batch_size,
+                                    pause=self.batch_pause)
+                for path in self._iter_files():
+                    self._remove_file(path)
+            else:
+                count = purge_range(self.db.engine, start, end, partitions=self.partitions,
+                                    batch_size=self.batch_size, pause=self.batch_pause,
+                                    on_images=self.release_images)
+            self.rows_deleted += count
+        if count:
+            self._after_purge()
+        return count
+
+    def sweep_orphans(self):
+        """Delete evidence files that no detection row references."""
+        with self._lock, self.app.app_context():
+            return self._sweep_orphans()[0]
+
+    def _sweep_orphans(self):
+        """(files removed, bytes of the orphans still in their grace period)."""
+        with self.db.engine.connect() as conn:
+            referenced = set()
+            for p in conn.execute(text("SELECT DISTINCT image_path FROM detection")).scalars():
+                if p:
+                    referenced.add(self._file_path(p))
+                    if thumbnail_for(p):
+                        referenced.add(self._file_path(thumbnail_for(p)))
+        cutoff = time.time() - self.orphan_grace
+        removed = pending = 0
+        for path in self._iter_files():
+            if path in referenced:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_mtime > cutoff:
+                pending += stat.st_size
+                continue
+            if self._remove_file(path):
+                removed += 1
+        self.orphans_deleted += removed
+        if removed:
+            print(f"DEBUG: Orphan sweep removed {removed} evidence files")
+        return removed, pending
+
+    # --- Policies ---------------------------------------------------------------
+
+    def enforce_max_age(self):
+        if not self.max_age_days:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(days=self.max_age_days)
+        count = self.purge(end=cutoff)
+        if count:
+            print(f"DEBUG: Retention removed {count} detections older than {self.max_age_days} days")
+        return count
+
+    def enforce_disk_quota(self):
+        if not self.max_disk_bytes:
+            return 0
+        with self._lock, self.app.app_context():
+            # Deleting rows never frees orphans: sweep them first, and leave the
+            # ones still in their grace period (rows not yet flushed) out of usage
+            _, pending = self._sweep_orphans()
+            usage = self.disk_usage() - pending
+            removed = 0
+            while usage > self.max_disk_bytes:
+                freed = []
+                count = delete_in_batches(
+                    self.db.engine, batch_size=self.batch_size, oldest_first=True,
+                    max_rows=self.batch_size,
+                    on_images=lambda paths: freed.append(self.release_images(paths))
+                )
+                if not count:
+                    break
+                removed += count
+                if not sum(freed):
+                    # The excess is not held by old rows: deleting more would only lose data
+                    break
+                usage -= sum(freed)
+                time.sleep(self.batch_pause)
+            self.rows_deleted += removed
+        if removed:
+            print(f"DEBUG: Disk quota removed {removed} oldest detections")
+            self._after_purge()
+        return removed
+
+    def _after_purge(self):
+        if self.after_purge is None:
+            return
+        try:
+            with self.app.app_context():
+                self.after_purge()
+        except Exception as e:
+            # The rows are gone either way; a stale index only shows plates with no records
+            print(f"WARN: Retention after_purge hook failed: {e}")
+
+    def run_policies(self):
+        try:
+            self.enforce_max_age()
+            if self.max_disk_bytes:
+                self.enforce_disk_quota()  # sweeps orphans first
+            else:
+                self.sweep_orphans()
+        except Exception as e:
+            print(f"ERROR: Retention run failed: {e}")
+        self.last_run = datetime.utcnow()
+
+    # --- Scheduler --------------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+        print(f"DEBUG: Retention scheduler started (every {self.interval}s, "
+              f"max_age_days={self.max_age_days}, max_disk_mb={self.max_disk_bytes // (1024 * 1024)})")
+
+    def trigger(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.run_policies()
+
+    def metrics(self):
+        return {
+            "last_run": self.last_run.isoformat() + "Z" if self.last_run else None,
+            "max_age_days": self.max_age_days,
+            "max_disk_mb": self.max_disk_bytes // (1024 * 1024),
+            "rows_deleted": self.rows_deleted,
+            "files_deleted": self.files_deleted,
+            "orphans_deleted": self.orphans_deleted,
+            "bytes_freed": self.bytes_freed
+        }
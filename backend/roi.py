@@ -0,0 +1,159 @@
+import threading
+
+import numpy as np
+
+# Per-source regions of interest. Coordinates are fractions of the frame
+# (0-1, origin top-left) so one configuration holds for every resolution a
+# camera is decoded at.
+
+
+def _point(value):
+    x, y = (float(v) for v in value)
+    if not (0.0 <= x <= 1.0 and 0.0 <= y <= 1.0):
+        raise ValueError(f"Point {value} outside the frame (coordinates are 0-1 fractions)")
+    return x, y
+
+
+def points_in_polygon(xs, ys, polygon):
+    """Even-odd ray casting test for arrays of points; returns a boolean mask."""
+    inside = np.zeros(len(xs), dtype=bool)
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        crosses = (yi > ys) != (yj > ys)
+        # Horizontal edges never cross; their division by zero is masked out
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inside ^= crosses & (xs < (xj - xi) * (ys - yi) / (yj - yi) + xi)
+        j = i
+    return inside
+
+
+class RegionOfInterest:
+    """
+    Polygons where riders can appear plus an optional crop rectangle. The
+    frame is cropped to the bounding box of the active region before
+    inference; detections whose centre falls outside every polygon are
+    discarded.
+    """
+
+    def __init__(self, polygons=None, crop=None):
+        self.polygons = [[_point(p) for p in polygon] for polygon in (polygons or [])]
+        for polygon in self.polygons:
+            if len(polygon) < 3:
+                raise ValueError("A polygon needs at least 3 points")
+        self.crop = None
+        if crop is not None:
+            if len(crop) != 4:
+                raise ValueError("crop must be [x1, y1, x2, y2]")
+            x1, y1 = _point(crop[:2])
+            x2, y2 = _point(crop[2:])
+            if x2 <= x1 or y2 <= y1:
+                raise ValueError("crop must be [x1, y1, x2, y2] with x1 < x2 and y1 < y2")
+            self.crop = (x1, y1, x2, y2)
+        if not self.polygons and self.crop is None:
+            raise ValueError("Provide at least one polygon or a crop rectangle")
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object with polygons and/or crop")
+        return cls(data.get('polygons'), data.get('crop'))
+
+    def to_dict(self):
+        return {
+            "polygons": [[list(p) for p in polygon] for polygon in self.polygons],
+            "crop": list(self.crop) if self.crop else None
+        }
+
+    def bounds(self):
+        """Normalised (x1, y1, x2, y2) of the active region, or None if empty."""
+        x1, y1, x2, y2 = self.crop or (0.0, 0.0, 1.0, 1.0)
+        if self.polygons:
+            xs = [p[0] for polygon in self.polygons for p in polygon]
+            ys = [p[1] for polygon in self.polygons for p in polygon]
+            x1, y1 = max(x1, min(xs)), max(y1, min(ys))
+            x2, y2 = min(x2, max(xs)), min(y2, max(ys))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return x1, y1, x2, y2
+
+    def window(self, width, height):
+        """Pixel crop (x1, y1, x2, y2) for a frame of the given size, or None."""
+        bounds = self.bounds()
+        if bounds is None:
+            return None
+        x1, y1, x2, y2 = bounds
+        window = (int(x1 * width), int(y1 * height),
+                  min(width, int(round(x2 * width))), min(height, int(round(y2 * height))))
+        if window[2] <= window[0] or window[3] <= window[1]:
+            return None
+        return window
+
+    def contains_boxes(self, boxes, width, height):
+        """Mask of the pixel boxes ((N, 4) xyxy) whose centre lies in the active region."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        cx = (boxes[:, 0] + boxes[:, 2]) / (2.0 * width)
+        cy = (boxes[:, 1] + boxes[:, 3]) / (2.0 * height)
+        mask = np.ones(len(boxes), dtype=bool)
+        if self.crop is not None:
+            x1, y1, x2, y2 = self.crop
+            mask &= (cx >= x1) & (cx <= x2) & (cy >= y1) & (cy <= y2)
+        if self.polygons:
+            inside = np.zeros(len(boxes), dtype=bool)
+            for polygon in self.polygons:
+                inside |= points_in_polygon(cx, cy, polygon)
+            mask &= inside
+        return mask
+
+
+class RegionRegistry:
+    """In-memory cache of SourceRegion rows, read on every inference."""
+
+    def __init__(self, app, db, model):
+        self.app = app
+        self.db = db
+        self.model = model
+        self._regions = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self.app.app_context():
+            rows = self.model.query.all()
+        regions = {}
+        for row in rows:
+            try:
+                regions[row.source] = RegionOfInterest(row.polygons, row.crop)
+            except (TypeError, ValueError) as e:
+                print(f"WARN: Ignoring invalid region for {row.source}: {e}")
+        with self._lock:
+            self._regions = regions
+        print(f"DEBUG: Loaded regions of interest for {len(regions)} sources")
+
+    def get(self, source):
+        with self._lock:
+            return self._regions.get(source)
+
+    def all(self):
+        with self._lock:
+            return {source: roi.to_dict() for source, roi in self._regions.items()}
+
+    def set(self, source, roi):
+        """Persist a region for `source` (None removes it). Call inside an app context."""
+        row = self.model.query.filter_by(source=source).first()
+        if roi is None:
+            if row is not None:
+                self.db.session.delete(row)
+        else:
+            if row is None:
+                row = self.model(source=source)
+                self.db.session.add(row)
+            data = roi.to_dict()
+            row.polygons = data["polygons"]
+            row.crop = data["crop"]
+        self.db.session.commit()
+        with self._lock:
+            if roi is None:
+                self._regions.pop(source, None)
+            else:
+                self._regions[source] = roi
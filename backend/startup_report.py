@@ -0,0 +1,55 @@
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StartupReport:
+    """Wall time and RSS growth of each heavy component as it is imported/loaded."""
+
+    def __init__(self):
+        self.components = {}
+        self.baseline_mb = rss_mb()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, component):
+        start, before = time.perf_counter(), rss_mb()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            record = {"seconds": round(time.perf_counter() - start, 3), "rss_mb": round(rss_mb() - before, 1), "ok": ok}
+            with self._lock:
+                self.components[component] = record
+
+    def summary(self):
+        with self._lock:
+            components = dict(self.components)
+        return {"baseline_mb": round(self.baseline_mb, 1), "rss_mb": round(rss_mb(), 1),
+                "pid": os.getpid(), "components": components}
+
+    def log(self):
+        summary = self.summary()
+        print(f"DEBUG: Startup footprint: {summary['rss_mb']} MB RSS (baseline {summary['baseline_mb']} MB)")
+        for name, c in summary["components"].items():
+            print(f"DEBUG:   {name:<20} {c['seconds']:>7.2f}s  {c['rss_mb']:>+8.1f} MB{'' if c['ok'] else '  (failed)'}")
+
+
+# One report per process; filled in by processor.py as components load
+startup = StartupReport()
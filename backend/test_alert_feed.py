@@ -0,0 +1,57 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dedup import RecentEventCache
+from watchlist import AlertFeed, Watchlist, WatchlistMatcher
+
+
+def test_ids_survive_a_restart():
+    before = AlertFeed()
+    last_id = [before.publish({"plate": f"AB{i}"}) for i in range(5)][-1]["id"]
+
+    # Server restarts; the EventSource reconnects with its old Last-Event-ID
+    time.sleep(0.01)
+    after = AlertFeed()
+    event = after.publish({"plate": "CD1"})
+    assert event["id"] > last_id
+    assert [e["plate"] for e in after.wait(last_id, timeout=0)] == ["CD1"]
+
+    # An id the feed never issued replays the buffer instead of hiding it
+    assert [e["plate"] for e in after.since(event["id"] + 10 ** 9)] == ["CD1"]
+    assert after.wait(event["id"], timeout=0) == []
+
+
+def test_wait_blocks_for_an_id_from_the_future():
+    # Reconnect with a Last-Event-ID above anything issued and nothing buffered:
+    # the SSE loop must sleep between keep-alives, not spin
+    feed = AlertFeed(size=1)
+    last_id = feed.publish({"plate": "AB1"})["id"] + 10 ** 9
+    feed._events.clear()
+    started = time.monotonic()
+    assert feed.wait(last_id, timeout=0.2) == []
+    assert time.monotonic() - started >= 0.19
+
+    threading.Timer(0.05, feed.publish, args=({"plate": "CD1"},)).start()
+    assert [e["plate"] for e in feed.wait(last_id, timeout=5)] == ["CD1"]
+
+
+def test_short_watchlist_plates_alert_separately():
+    # Plates of 3 characters or fewer only get the weak dedup check, which
+    # treated any recent hit on the camera as the same vehicle
+    watchlist = Watchlist(None, None, None, AlertFeed(), recent=RecentEventCache(window_seconds=60))
+    watchlist._matcher = WatchlistMatcher([{"plate": p, "reason": "stolen", "priority": "high"}
+                                           for p in ("K70", "MH12AB1234")])
+    assert len(watchlist.check("MH12AB1234", "CAM-1")) == 1
+    assert len(watchlist.check("K70", "CAM-1")) == 1
+    assert watchlist.check("K70", "CAM-1") == []
+
+
+if __name__ == "__main__":
+    test_ids_survive_a_restart()
+    test_wait_blocks_for_an_id_from_the_future()
+    test_short_watchlist_plates_alert_separately()
+    print("Alert feed OK")
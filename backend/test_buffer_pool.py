@@ -0,0 +1,61 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from buffer_pool import BufferPool, bucket_size
+from letterbox import LetterboxPyramid, letterbox_geometry, PAD_VALUE
+
+
+def ultralytics_letterbox(frame, imgsz):
+    # What ultralytics' LetterBox(auto=True) does to a numpy frame before predict()
+    _, new_w, new_h, left, top, out_w, out_h = letterbox_geometry(*frame.shape[:2], imgsz)
+    image = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return cv2.copyMakeBorder(image, top, out_h - new_h - top, left, out_w - new_w - left,
+                              cv2.BORDER_CONSTANT, value=(PAD_VALUE,) * 3)
+
+
+def test_pool_reuses_buffers():
+    pool = BufferPool(max_mb=8)
+    for nbytes in (1, 4096, 5000, 100000, 3 * 2 ** 20):
+        assert nbytes <= bucket_size(nbytes) <= max(4096, nbytes * 1.25)
+    a = pool.acquire((480, 640, 3))
+    pool.release(a)
+    b = pool.acquire((450, 700, 3))  # same bucket
+    assert np.shares_memory(a, b)
+    f = pool.acquire((1, 3, 64, 64), np.float32)
+    assert f.dtype == np.float32 and f.flags.c_contiguous
+    pool.release(b, f, np.zeros(3))  # foreign arrays are ignored
+    metrics = pool.metrics()
+    assert metrics["reused"] == 1 and metrics["leased"] == 0, metrics
+
+
+def test_pyramid_matches_ultralytics_letterbox():
+    pool = BufferPool()
+    rng = np.random.default_rng(0)
+    for h, w in ((1080, 1920), (480, 640), (1000, 750)):
+        frame = cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3), dtype=np.uint8), (0, 0), 3)
+        with LetterboxPyramid(frame, [640, 1280], pool) as pyramid:
+            # The largest level is exactly what ultralytics would build
+            assert np.array_equal(pyramid.image(1280), ultralytics_letterbox(frame, 1280))
+            # Smaller levels come from the larger one; same geometry, near-identical pixels
+            reference = ultralytics_letterbox(frame, 640)
+            assert pyramid.image(640).shape == reference.shape
+            assert np.abs(pyramid.image(640).astype(int) - reference).mean() < 2.0
+            chw = pyramid.array(640)
+            assert chw.shape == (1, 3) + reference.shape[:2] and chw.dtype == np.float32
+            assert np.allclose(chw[0], pyramid.image(640)[..., ::-1].transpose(2, 0, 1) / 255.0, atol=1e-6)
+
+            gain, new_w, new_h, left, top, _, _ = letterbox_geometry(h, w, 640)
+            box = np.array([[left + 10 * gain, top + 20 * gain, left + new_w + 5, top + new_h]], np.float32)
+            assert np.allclose(pyramid.unmap(640, box), [[10, 20, w, h]], atol=1e-3)
+    assert pool.metrics()["leased"] == 0
+
+
+if __name__ == "__main__":
+    test_pool_reuses_buffers()
+    test_pyramid_matches_ultralytics_letterbox()
+    print("Buffer pool and letterbox pyramid OK")
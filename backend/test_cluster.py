@@ -0,0 +1,161 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cluster import HashRing, ClusterCoordinator
+
+# The ring on its own, then a real cluster on localhost: stub-model app.py
+# nodes as separate processes sharing one SQLite database, driven through
+# an in-process coordinator.
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCES = [f"CAM-{i:02d}" for i in range(12)]
+
+
+def test_ring_moves_only_the_new_nodes_share():
+    keys = [f"CAM-{i}" for i in range(3000)]
+    ring = HashRing(["a", "b", "c"])
+    before = {k: ring.node_for(k) for k in keys}
+    for node in "abc":
+        share = sum(owner == node for owner in before.values()) / len(keys)
+        assert 0.2 < share < 0.47, f"node {node} owns {share:.0%} of the keys"
+
+    ring.add("d")
+    after = {k: ring.node_for(k) for k in keys}
+    moved = [k for k in keys if before[k] != after[k]]
+    assert all(after[k] == "d" for k in moved), "a key moved between two old nodes"
+    print(f"joining a 4th node moved {len(moved) / len(keys):.0%} of the keys")
+    assert 0.15 < len(moved) / len(keys) < 0.35
+
+    ring.remove("d")
+    assert {k: ring.node_for(k) for k in keys} == before
+    assert ring.nodes_for("CAM-1", 2)[0] == before["CAM-1"] and len(set(ring.nodes_for("CAM-1", 2))) == 2
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_node(work_dir):
+    port = free_port()
+    env = {**os.environ, "SAFECITY_STUB_PROCESSOR": "1", "SAFECITY_PORT": str(port),
+           "SAFECITY_DATABASE_URL": f"sqlite:///{work_dir}/cluster.db",
+           "SAFECITY_UPLOAD_DIR": os.path.join(work_dir, "uploads"),
+           "SAFECITY_VIDEO_JOB_DIR": os.path.join(work_dir, "video"),
+           "SAFECITY_RECORD_DIR": os.path.join(work_dir, "recordings")}
+    log = open(os.path.join(work_dir, f"node_{port}.log"), "w")
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise AssertionError(f"node on port {port} exited, see {log.name}")
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise AssertionError(f"node on port {port} did not come up")
+
+
+def frame(source):
+    # The stub reads a plate from the pixels: one fixed frame per camera
+    image = np.full((240, 320, 3), (sum(map(ord, source)) * 7) % 256, dtype=np.uint8)
+    cv2.putText(image, source, (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def send(cluster, source):
+    url, response = cluster.forward(source, {"image": ("frame.jpg", frame(source), "image/jpeg")},
+                                    {"source": source})
+    assert response.status_code == 200, response.text
+    return url
+
+
+def stored(url, source):
+    time.sleep(0.6)  # past the detection sink's flush interval
+    return sum(row["source"] == source for row in requests.get(f"{url}/logs", timeout=10).json())
+
+
+def listed(url):
+    return set(requests.get(f"{url}/cluster/state", timeout=5).json()["sources"])
+
+
+def test_cluster_on_localhost():
+    work_dir = tempfile.mkdtemp()
+    procs = []
+    try:
+        for _ in range(2):
+            procs.append(start_node(work_dir))
+        cluster = ClusterCoordinator([url for _, url in procs], health_interval=0.5, health_timeout=2)
+        cluster.start()
+        assert len(cluster.ring) == 2
+
+        # Affinity: a camera always lands on the same node
+        owners = {s: send(cluster, s) for s in SOURCES}
+        assert all(send(cluster, s) == owners[s] for s in SOURCES)
+        assert len(set(owners.values())) == 2, "one node got every camera"
+        rows = {s: stored(owners[s], s) for s in SOURCES[:1]}
+        # Each node measures the cameras routed to it
+        reports = cluster.gather('/feeds/health')
+        assert {f["source"]: url for url, r in reports.items() for f in r["feeds"]} == owners
+
+        # Join: the moved cameras' dedup windows go with them
+        procs.append(start_node(work_dir))
+        new_url = procs[-1][1]
+        cluster.join(new_url)
+        assert cluster.nodes[new_url].state == 'up'
+        moved = [s for s in SOURCES if cluster.assignments()[s] != owners[s]]
+        assert moved and all(cluster.assignments()[s] == new_url for s in moved)
+        assert set(moved) <= listed(new_url)
+        assert not set(moved) & (listed(procs[0][1]) | listed(procs[1][1]))
+        print(f"node joined: {len(moved)}/{len(SOURCES)} cameras handed over")
+        source = moved[0]
+        before = stored(new_url, source)
+        assert send(cluster, source) == new_url
+        assert stored(new_url, source) == before, "a repeat frame after the handoff was stored again"
+
+        # Failover: a killed node drops out and its cameras keep working
+        victim_proc, victim = procs[0]
+        victim_proc.kill()
+        victim_proc.wait()
+        for s in SOURCES:
+            assert send(cluster, s) != victim
+        assert cluster.nodes[victim].state == 'down'
+        assert victim not in cluster.ring
+
+        # Graceful leave: the remaining old node hands everything to the new one
+        leaving = procs[1][1]
+        leaving_sources = [s for s in SOURCES if cluster.assignments()[s] == leaving]
+        cluster.leave(leaving)
+        assert all(cluster.assignments()[s] == new_url for s in SOURCES)
+        assert set(leaving_sources) <= listed(new_url)
+
+        metrics = cluster.metrics()
+        print(f"cluster: {metrics['nodes_up']} nodes up, {metrics['counters']}, handoffs {metrics['handoffs']}")
+        assert metrics["nodes_up"] == 1
+        assert metrics["counters"]["ok"] == 2 * len(SOURCES) + 1 + len(SOURCES)
+        assert metrics["handoffs"]["failed"] == 0
+        assert rows[SOURCES[0]] > 0
+        cluster.shutdown()
+    finally:
+        for proc, _ in procs:
+            proc.kill()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    test_ring_moves_only_the_new_nodes_share()
+    test_cluster_on_localhost()
+    print("Cluster routing, handoff and failover OK")
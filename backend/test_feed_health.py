@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from feed_health import FeedTelemetry
+
+
+def test_feed_telemetry():
+    feeds = FeedTelemetry(ring_size=4, online_seconds=60, standby_seconds=600, max_sources=2)
+    t = 1000.0
+    for i in range(6):
+        feeds.record("CAM-1", 'processed', 100 + i, {"decode": 5, "queue": 1, "inference": 80, "post": 14 + i},
+                     detections=i % 2, now=t + i)
+    feeds.record("CAM-1", 'shed', now=t + 6)
+    feeds.record("CAM-1", 'dropped', now=t + 7)
+    feeds.record("VID", 'processed', 40.0, detections=3, frames=30, kind='video', now=t + 8)
+
+    cam, = [f for f in feeds.feeds(now=t + 9) if f["source"] == "CAM-1"]
+    assert cam["counters"] == {"received": 8, "detections": 3, "processed": 6, "shed": 1, "dropped": 1, "failed": 0}
+    # The ring keeps only the last 4 frames: two processed, one shed, one dropped
+    assert cam["window"] == 4 and cam["loss_rate"] == 0.5
+    assert cam["latency_ms"]["max"] == 105 and cam["stages_ms"]["inference"]["p50"] == 80
+    assert cam["status"] == "online"
+
+    video = feeds.feed("VID", now=t + 9)
+    assert video["kind"] == "video" and video["fps"] == 3.0 and video["recent"][0]["frames"] == 30
+
+    statuses = [f["status"] for f in feeds.feeds(now=t + 300)]
+    assert statuses == ["standby", "standby"]
+    assert feeds.metrics(now=t + 9000) == {"sources": 2, "online": 0, "standby": 0, "offline": 2, "ring_size": 4}
+
+    # Sources are discovered as they send; the least recently seen is forgotten
+    feeds.record("CAM-2", 'failed', now=t + 10)
+    assert [f["source"] for f in feeds.feeds(now=t + 10)] == ["CAM-2", "VID"]
+    assert feeds.feed("CAM-1") is None
+
+
+if __name__ == "__main__":
+    test_feed_telemetry()
+    print("Feed telemetry OK")
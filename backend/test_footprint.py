@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+
+# Import-time and memory budgets for the backend process. Each check runs in
+# a fresh interpreter so nothing is already imported. Override a budget
+# with SAFECITY_BUDGET_<NAME>, e.g. SAFECITY_BUDGET_TOTAL_RSS_MB=3000.
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ('torch', 'ultralytics', 'easyocr', 'paddleocr', 'paddle')
+
+BUDGETS = {
+    # Importing the processor module only pulls in cv2/numpy
+    "processor_import_seconds": 3.0,
+    "processor_import_rss_mb": 150,
+    # Per component, as recorded by startup_report while the app starts
+    "component_seconds": 30.0,
+    "component_rss_mb": 1500,
+    "total_rss_mb": 2500,
+}
+
+
+def budget(name):
+    return float(os.environ.get(f"SAFECITY_BUDGET_{name.upper()}", BUDGETS[name]))
+
+
+def run_python(code, env=None):
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True,
+        env={**os.environ, **(env or {})}, timeout=600
+    )
+    if result.returncode != 0:
+        raise AssertionError(f"Subprocess failed:\n{result.stderr[-2000:]}")
+    # The measurement is the last line; everything before it is startup logging
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_processor_import_is_lazy():
+    data = run_python(
+        "import json, sys, time\n"
+        "from startup_report import rss_mb\n"
+        "before, start = rss_mb(), time.perf_counter()\n"
+        "import processor\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start, 'rss_mb': rss_mb() - before,\n"
+        f"                  'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    print(f"processor import: {data['seconds']:.2f}s, {data['rss_mb']:+.1f} MB")
+    assert not data["heavy"], f"processor imported {data['heavy']} at module load"
+    assert data["seconds"] <= budget("processor_import_seconds"), data
+    assert data["rss_mb"] <= budget("processor_import_rss_mb"), data
+
+
+def test_startup_budget():
+    data = run_python("import json, app\nprint(json.dumps(app.startup.summary()))")
+    print(f"app startup: {data['rss_mb']} MB RSS")
+    for name, c in data["components"].items():
+        print(f"  {name:<20} {c['seconds']:>7.2f}s  {c['rss_mb']:>+8.1f} MB")
+        assert c["seconds"] <= budget("component_seconds"), f"{name} took {c['seconds']}s"
+        assert c["rss_mb"] <= budget("component_rss_mb"), f"{name} grew RSS by {c['rss_mb']} MB"
+    assert data["rss_mb"] <= budget("total_rss_mb"), f"app started at {data['rss_mb']} MB RSS"
+
+
+def test_single_ocr_engine():
+    # Choosing an engine must not import the other one
+    data = run_python(
+        "import json, sys, processor\n"
+        "p = processor.AIProcessor()\n"
+        "print(json.dumps({'engine': p.ocr_engine, 'paddle': 'paddleocr' in sys.modules}))",
+        env={"SAFECITY_OCR_ENGINE": "easy"}
+    )
+    print(f"SAFECITY_OCR_ENGINE=easy -> {data['engine']}")
+    assert not data["paddle"], "paddleocr imported although EasyOCR was configured"
+
+
+if __name__ == "__main__":
+    test_processor_import_is_lazy()
+    test_startup_budget()
+    test_single_ocr_engine()
+    print("Footprint within budget")
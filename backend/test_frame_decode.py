@@ -0,0 +1,40 @@
+import os
+import struct
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from frame_decode import decode_frame
+
+
+def with_orientation(jpeg, orientation):
+    """The JPEG with an EXIF APP1 segment carrying only an Orientation tag."""
+    tiff = b"MM\x00\x2a" + struct.pack(">I", 8) + struct.pack(">H", 1)
+    tiff += struct.pack(">HHIHH", 0x0112, 3, 1, orientation, 0) + struct.pack(">I", 0)
+    app1 = b"Exif\x00\x00" + tiff
+    return jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + jpeg[2:]
+
+
+def test_reduced_scale_follows_exif_rotation():
+    # A 4000x3000 photo taken in portrait: stored landscape, EXIF says rotate 90
+    frame = np.zeros((3000, 4000, 3), np.uint8)
+    cv2.rectangle(frame, (3000, 1000), (3400, 1200), (255, 255, 255), -1)
+    jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+    for orientation, shape in ((1, (3000, 4000)), (6, (4000, 3000))):
+        buf = np.frombuffer(with_orientation(jpeg, orientation), np.uint8)
+        decoded = decode_frame(buf, 1280)
+        assert decoded.image.shape[:2] == (shape[0] // 2, shape[1] // 2)
+        assert decoded.scale == 2.0, decoded.scale
+        assert decoded.full.shape[:2] == shape
+        # A box found on the reduced image lands on the same pixels at full resolution
+        ys, xs = np.nonzero(decoded.image[..., 0] > 128)
+        x1, y1 = int(xs.min() * decoded.scale), int(ys.min() * decoded.scale)
+        assert decoded.full[y1 + 4, x1 + 4, 0] > 128
+
+
+if __name__ == "__main__":
+    test_reduced_scale_follows_exif_rotation()
+    print("Frame decode OK")
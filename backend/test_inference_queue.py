@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from inference_queue import InferenceQueue
+
+
+class SlowThenFast:
+    """Processor whose frames cost `seconds`, changeable mid-test."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def process_frame(self, frame, profile=None):
+        time.sleep(self.seconds)
+        return []
+
+
+def run(queue, source, deadline_ms):
+    ticket = queue.submit(source, object(), deadline_ms)
+    ticket.wait(5)
+    return ticket.status
+
+
+def test_estimate_recovers_after_overload():
+    processor = SlowThenFast(0.9)
+    queue = InferenceQueue(processor, deadline_ms=3000)
+    for _ in range(5):
+        run(queue, "LIVE-1", 3000)
+    assert queue.service_time > 0.7
+    # Load falls; frames with a 700ms deadline must get through again
+    processor.seconds = 0.01
+    statuses = [run(queue, "LIVE-1", 700) for _ in range(30)]
+    assert 'done' in statuses, statuses
+    assert statuses[-5:] == ['done'] * 5, statuses
+    assert queue.service_time < 0.1 and queue.counters["expired"] >= 1
+
+
+def test_probe_replaces_a_stale_estimate():
+    queue = InferenceQueue(SlowThenFast(0.01), deadline_ms=3000)
+    queue.service_time = 3.0  # left over from an overload, far above a 300ms deadline
+    statuses = [run(queue, "LIVE-1", 300) for _ in range(12)]
+    assert queue.counters["probes"] == 1 and statuses[-4:] == ['done'] * 4, statuses
+
+
+def test_estimate_is_capped_at_the_deadline():
+    queue = InferenceQueue(SlowThenFast(0.3), deadline_ms=200)
+    for _ in range(3):
+        run(queue, "LIVE-1", 2000)
+    assert queue.service_time <= 0.2
+
+
+def test_operator_priority_survives_new_frames():
+    queue = InferenceQueue(SlowThenFast(0.0))
+    assert queue.configure_source("IMAGE-EVIDENCE", priority="backfill")["priority"] == "backfill"
+    queue.check_admission("IMAGE-EVIDENCE")
+    ticket = queue.submit("IMAGE-EVIDENCE", object(), priority="live")
+    ticket.wait(5)
+    assert ticket.priority == "backfill" and queue.sources()["IMAGE-EVIDENCE"]["priority"] == "backfill"
+    # Clearing the override goes back to the tag's default
+    assert queue.configure_source("IMAGE-EVIDENCE", priority="")["priority"] == "evidence"
+    try:
+        queue.configure_source("IMAGE-EVIDENCE", priority="urgent")
+        assert False, "unknown priority accepted"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_estimate_recovers_after_overload()
+    test_probe_replaces_a_stale_estimate()
+    test_estimate_is_capped_at_the_deadline()
+    test_operator_priority_survives_new_frames()
+    print("Inference queue OK")
@@ -0,0 +1,78 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('SAFECITY_OCR_PRELOAD', '0')
+
+from plate_grammar import PlateGrammar
+from processor import AIProcessor
+
+
+class ScriptedReader:
+    """EasyOCR stand-in returning one scripted (text, conf) per call."""
+
+    def __init__(self, reads):
+        self.reads = list(reads)
+        self.calls = 0
+
+    def readtext(self, image, allowlist=None):
+        self.calls += 1
+        text, conf = self.reads.pop(0) if self.reads else ("", 0.0)
+        return [([[0, 0], [1, 0], [1, 1], [0, 1]], text, conf)] if text else []
+
+
+def test_grammar_matches_and_corrects():
+    grammar = PlateGrammar("IN,UK")
+    assert grammar.match("MH12AB1234") == ("MH12AB1234", "IN")
+    assert grammar.match("mh 12 ab 1234") == ("MH12AB1234", "IN")
+    assert grammar.match("22BH1234AA") == ("22BH1234AA", "IN")
+    # Confusable characters are fixed by position
+    assert grammar.match("MHI2AB12E4") is None
+    assert grammar.match("M812AB1Z34") == ("MB12AB1234", "IN")
+    assert grammar.match("A8I2CDE") == ("AB12CDE", "UK")
+    assert grammar.match("HELLO") is None
+
+    generic = PlateGrammar()
+    assert generic.match("AB12") == ("AB12", "generic")
+    assert generic.match("ABCDEF") is None and generic.match("123456") is None
+    # Bad formats are skipped, not fatal
+    assert PlateGrammar("UK,A9{x").describe() == ["UK:AA99AAA", "UK:A9{1,3}AAA"]
+    assert not PlateGrammar("")
+
+
+def read(reads, fast_ocr=False, formats="IN"):
+    processor = AIProcessor({'helmet': '/nonexistent', 'plate': '/nonexistent'})
+    processor.plate_grammar = PlateGrammar(formats)
+    processor.ocr_engine, processor.easyocr_reader = 'easy', ScriptedReader(reads)
+    frame = np.full((200, 300, 3), 200, np.uint8)
+    text, tried = processor._read_plate(frame, None, [100, 80, 220, 120], fast_ocr)
+    assert tried == processor.easyocr_reader.calls
+    return text, tried, processor.metrics()["ocr"]
+
+
+def test_cascade_stops_at_first_plate():
+    # A confident read that fits a format costs one recognizer call
+    text, tried, stats = read([("MH12AB1234", 0.9)])
+    assert (text, tried) == ("MH12AB1234", 1)
+    assert stats["early_exits"] == 1 and stats["accepted_by"] == {"adaptive": 1}
+
+    # Junk and low-confidence reads go on to the next variant
+    text, tried, _ = read([("MH12", 0.9), ("MH12AB1234", 0.3), ("MHI2AB1234", 0.8)])
+    assert (text, tried) == ("MH12AB1234", 3)
+
+    # Nothing fits: every variant is tried and the best read is kept
+    text, tried, stats = read([("MH12", 0.9), ("XY99", 0.4)], formats="UK")
+    assert (text, tried) == ("MH12", 5) and stats["early_exits"] == 0
+    assert stats["variants_tried"] == {5: 1} and stats["variants_per_plate"] == 5.0
+
+    # The fast profile never denoises and takes the first usable read
+    text, tried, _ = read([("", 0), ("MH12", 0.2), ("MH12AB1234", 0.9)], fast_ocr=True)
+    assert (text, tried) == ("MH12", 2)
+
+
+if __name__ == "__main__":
+    test_grammar_matches_and_corrects()
+    test_cascade_stops_at_first_plate()
+    print("Plate grammar and OCR cascade OK")
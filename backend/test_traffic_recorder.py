@@ -0,0 +1,44 @@
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from traffic_recorder import TrafficRecorder, read_recording, recording_files
+
+
+def test_session_names_stay_inside_the_root():
+    work_dir = tempfile.mkdtemp()
+    try:
+        root = os.path.join(work_dir, "recordings")
+        recorder = TrafficRecorder(root)
+        for name in ("", " ", ".", ".."):
+            try:
+                recorder.start(name)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"session name {name!r} was accepted")
+        assert not recorder.active and os.listdir(work_dir) == []
+
+        # Separators are sanitised away, so this is a plain name under the root
+        recorder.start("../rush hour")
+        assert os.path.dirname(recorder.session_dir) == root
+        # Sources that sanitise to the same name keep separate files
+        for source in ("cam 1", "cam_1", "cam 1"):
+            recorder.record(source, source.encode())
+        session = recorder.session_dir
+        recorder.stop()
+        frames = {}
+        for path in recording_files(session):
+            header, recorded = read_recording(path)
+            frames[header["source"]] = [data for _, data in recorded]
+        assert frames == {"cam 1": [b"cam 1", b"cam 1"], "cam_1": [b"cam_1"]}
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    test_session_names_stay_inside_the_root()
+    print("Traffic recorder OK")
@@ -0,0 +1,133 @@
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+# Recording format, one file per source:
+#
+#   b"SCREC1\n" + one JSON header line ({"source": ..., "started_at": ...})
+#   then per frame: <offset seconds: float64><length: uint32> + the JPEG
+#   exactly as it was uploaded (no re-encode)
+#
+# Offsets are seconds since the session started, so the inter-arrival
+# times of every camera are preserved and comparable across files.
+MAGIC = b"SCREC1\n"
+FRAME_HEADER = struct.Struct('<dI')
+SUFFIX = '.rec'
+
+
+def _file_name(source):
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', source)
+    if name != source:
+        # "cam 1" and "cam_1" must not share (and truncate) one file
+        name += f"-{zlib.crc32(source.encode()):08x}"
+    return name + SUFFIX
+
+
+def read_recording(path):
+    """(header, iterator of (offset, jpeg_bytes)) for one recorded source."""
+    f = open(path, 'rb')
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError(f"{path} is not a traffic recording")
+    header = json.loads(f.readline())
+
+    def frames():
+        with f:
+            while True:
+                head = f.read(FRAME_HEADER.size)
+                if len(head) < FRAME_HEADER.size:
+                    return  # end of file, or a frame cut off by a crash
+                offset, length = FRAME_HEADER.unpack(head)
+                data = f.read(length)
+                if len(data) < length:
+                    return
+                yield offset, data
+    return header, frames()
+
+
+def recording_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SUFFIX))
+
+
+class TrafficRecorder:
+    """
+    Appends every frame posted to /detect, per source, to a session
+    directory so it can be replayed later (see replay_traffic.py). Off
+    unless started; stops by itself once the session reaches max_mb.
+    """
+
+    def __init__(self, root, max_mb=2048):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._files = {}
+        self.session_dir = None
+        self.started = None
+        self.frames = 0
+        self.bytes = 0
+
+    @property
+    def active(self):
+        return self.session_dir is not None
+
+    def start(self, name=None):
+        """Start a session (ValueError for a name that would leave the recordings root)."""
+        # Each gunicorn worker records its own share of the traffic
+        if name is None:
+            name = f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        session_dir = os.path.join(self.root, _file_name(name)[:-len(SUFFIX)])
+        root = os.path.realpath(self.root)
+        if name.strip() in ('', '.', '..') or not os.path.realpath(session_dir).startswith(root + os.sep):
+            raise ValueError(f"Invalid recording name '{name}'")
+        with self._lock:
+            self._close()
+            self.session_dir = session_dir
+            os.makedirs(self.session_dir, exist_ok=True)
+            self.started = time.monotonic()
+            self.frames = self.bytes = 0
+        print(f"DEBUG: Recording /detect traffic to {self.session_dir}")
+        return self.status()
+
+    def stop(self):
+        with self._lock:
+            self._close()
+        return self.status()
+
+    def _close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        if self.session_dir is not None:
+            print(f"DEBUG: Recording stopped: {self.frames} frames, {self.bytes / (1024 * 1024):.1f} MB")
+        self.session_dir = None
+
+    def record(self, source, data):
+        """Append one uploaded frame (bytes-like). No-op while not recording."""
+        if self.session_dir is None:
+            return
+        data = memoryview(data).cast('B')
+        with self._lock:
+            if self.session_dir is None:
+                return
+            if self.bytes + len(data) > self.max_bytes:
+                print("WARN: Recording reached its size limit")
+                self._close()
+                return
+            f = self._files.get(source)
+            if f is None:
+                # Restarting a session under an existing name overwrites it
+                f = self._files[source] = open(os.path.join(self.session_dir, _file_name(source)), 'wb')
+                f.write(MAGIC + json.dumps({"source": source, "started_at": datetime.utcnow().isoformat() + "Z"}).encode() + b"\n")
+            f.write(FRAME_HEADER.pack(time.monotonic() - self.started, len(data)))
+            f.write(data)
+            self.frames += 1
+            self.bytes += len(data) + FRAME_HEADER.size
+
+    def status(self):
+        return {"recording": self.active, "session": self.session_dir, "sources": sorted(self._files),
+                "frames": self.frames, "mb": round(self.bytes / (1024 * 1024), 1)}
@@ -0,0 +1,400 @@
+import math
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+from dedup import RecentEventCache, event_key
+from metrics import RollingWindow
+from processor import AIProcessor
+
+# Video time is mapped onto this clock so RecentEventCache can debounce by it
+VIDEO_EPOCH = datetime(2000, 1, 1)
+
+# Evidence frames travel from the worker as JPEG rather than raw pixels
+TRANSFER_JPEG_QUALITY = 95
+
+# One processor per worker process, built by the pool initializer
+_processor = None
+
+
+def _init_worker(model_paths):
+    global _processor
+    if _processor is None:  # forked workers inherit the parent's models
+        _processor = AIProcessor(model_paths)
+
+
+def probe(path):
+    """(fps, frame_count, width, height) of a video, or None if OpenCV can't open it."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        ok, _ = cap.read()
+        if not ok:
+            return None
+        return (cap.get(cv2.CAP_PROP_FPS) or 25.0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        cap.release()
+
+
+def process_chunk(path, first_frame, last_frame, step, fps, profile, dedup_seconds):
+    """
+    Worker side: run the processor on every `step`-th frame in
+    [first_frame, last_frame). Frames in between are only grabbed (demuxed,
+    not converted). Events are deduplicated within the chunk; only frames
+    that produced a new event are annotated and sent back.
+    """
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(path)
+    if first_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+    recent = RecentEventCache(window_seconds=dedup_seconds)
+    events, images, sampled, detected = [], [], 0, 0
+    try:
+        index = first_frame
+        while index < last_frame:
+            if index % step:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            seconds = index / fps
+            index += 1
+            sampled += 1
+
+            detections = _processor.process_frame(frame, profile)
+            detected += len(detections)
+            new = []
+            for det in detections:
+                key = event_key(det)
+                if key is None or key in [(e["type"], e["plate_number"]) for e in new]:
+                    continue
+                # Plate reads are kept per exact plate so short ones still reach the
+                # watchlist; the merge applies the usual dedup to the records
+                if recent.check_and_add("video", key[0], key[1], VIDEO_EPOCH + timedelta(seconds=seconds),
+                                        exact=key[0] == 'plate'):
+                    continue
+                new.append({"seconds": round(seconds, 3), "type": key[0], "plate_number": key[1],
+                            "confidence": det['confidence'], "box": det['box'], "image": len(images)})
+            if new:
+                annotated = _processor.annotate_frame(frame, detections)
+                ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, TRANSFER_JPEG_QUALITY])
+                images.append(buffer.tobytes() if ok else None)
+                events.extend(new)
+    finally:
+        cap.release()
+    return {"events": events, "images": images, "frames": sampled, "detections": detected,
+            "seconds": time.perf_counter() - started}
+
+
+class VideoJob:
+    def __init__(self, source, path, fps, frame_count, size, sample_fps, recorded_at):
+        self.id = uuid.uuid4().hex[:12]
+        self.source = source
+        self.path = path
+        self.fps = fps
+        self.frame_count = frame_count
+        self.size = size
+        self.sample_fps = sample_fps
+        self.recorded_at = recorded_at
+        self.status = 'queued'  # running | done | failed | cancelled
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.chunks = []  # (first_frame, last_frame)
+        self.futures = []
+        self.pool = None  # the executor its chunks run on
+        self.results = {}  # chunk index -> worker result, until merged
+        self.merged = 0  # chunks merged into events so far (always a prefix)
+        self.frames_processed = 0
+        self.events = []
+        self.recent = None
+
+    @property
+    def duration(self):
+        return self.frame_count / self.fps if self.fps else None
+
+    def summary(self):
+        total = len(self.chunks)
+        return {
+            "id": self.id,
+            "source": self.source,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() + "Z",
+            "started_at": self.started_at.isoformat() + "Z" if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() + "Z" if self.finished_at else None,
+            "duration_seconds": round(self.duration, 1) if self.duration else None,
+            "fps": round(self.fps, 2),
+            "size": self.size,
+            "sample_fps": self.sample_fps,
+            "chunks": {"total": total, "done": self.merged + len(self.results)},
+            "progress": round((self.merged + len(self.results)) / total, 3) if total else 0.0,
+            "frames_processed": self.frames_processed,
+            "events": len(self.events)
+        }
+
+
+class VideoJobManager:
+    """
+    Offline processing of uploaded video evidence. A job is split into
+    fixed-length time chunks that run in parallel on a process pool (each
+    worker holds its own AIProcessor, so chunks don't share the GIL or the
+    /detect models). Chunks finish in any order; they are merged strictly
+    in time order so events that straddle a boundary are deduplicated with
+    the same window /detect uses, and rows reach the database as soon as
+    their prefix of the video is complete.
+
+    `model_paths` may be a callable (the registry's active_paths): the pool
+    is recycled when it changes, so jobs started after a model swap or
+    rollback run on the active weights.
+    """
+
+    def __init__(self, work_dir, model_paths=None, processes=2, chunk_seconds=30, sample_fps=1.0,
+                 dedup_seconds=8, start_method='spawn', processor=None,
+                 evidence_store=None, detection_sink=None, watchlist=None, feeds=None, max_jobs=100):
+        self.work_dir = work_dir
+        self.model_paths = model_paths
+        self.processes = processes
+        self.chunk_seconds = chunk_seconds
+        self.sample_fps = sample_fps
+        self.dedup_seconds = dedup_seconds
+        self.start_method = start_method
+        self.processor = processor
+        self.evidence_store = evidence_store
+        self.detection_sink = detection_sink
+        self.watchlist = watchlist
+        self.feeds = feeds
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pool_paths = None  # model paths the current workers loaded
+        self.chunk_ms = RollingWindow()
+        self.counts = {"submitted": 0, "done": 0, "failed": 0, "cancelled": 0, "frames": 0, "events": 0}
+        os.makedirs(work_dir, exist_ok=True)
+
+    def _pool(self):
+        """
+        The worker pool, created on first use (the workers load their own
+        models, which takes a while) and recycled once the active model
+        versions differ from what its workers loaded. Call with the lock held.
+        """
+        paths = self.model_paths() if callable(self.model_paths) else self.model_paths
+        if self._executor is not None and paths != self._pool_paths:
+            print("DEBUG: Model versions changed, recycling the video worker pool")
+            self._discard_pool(self._executor)  # running chunks still finish on the old workers
+        if self._executor is None:
+            global _processor
+            if self.start_method == 'fork' and self.processor is not None:
+                _processor = self.processor  # children share the already-loaded models
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker, initargs=(paths,)
+            )
+            self._pool_paths = paths
+        return self._executor
+
+    def _discard_pool(self, pool):
+        """Stop using `pool` (broken or outdated); the next job gets a fresh one. Call with the lock held."""
+        if pool is None:
+            return
+        if self._executor is pool:
+            self._executor = None
+        pool.shutdown(wait=False)
+
+    def submit(self, upload, source, profile, sample_fps=None, recorded_at=None):
+        """Store the upload, split it into chunks and queue them. Raises ValueError for unusable files."""
+        path = os.path.join(self.work_dir, f"{uuid.uuid4().hex}.video")
+        upload.save(path)
+        info = probe(path)
+        if info is None:
+            os.remove(path)
+            raise ValueError("Could not read the uploaded video")
+        fps, frame_count, width, height = info
+        sample_fps = min(float(sample_fps or self.sample_fps), fps)
+        if sample_fps <= 0:
+            os.remove(path)
+            raise ValueError("sample_fps must be positive")
+
+        job = VideoJob(source, path, fps, frame_count, [width, height], sample_fps, recorded_at)
+        job.recent = RecentEventCache(window_seconds=self.dedup_seconds)
+        step = max(1, round(fps / sample_fps))
+        if frame_count > 0:
+            per_chunk = max(step, int(self.chunk_seconds * fps) // step * step)
+            job.chunks = [(first, first + per_chunk) for first in range(0, frame_count, per_chunk)]
+            # The container's frame count is an estimate; the last chunk reads to the end
+            job.chunks[-1] = (job.chunks[-1][0], math.inf)
+        else:
+            job.chunks = [(0, math.inf)]  # container without a frame count: one sequential chunk
+
+        with self._lock:
+            self.jobs[job.id] = job
+            self.counts["submitted"] += 1
+            while len(self.jobs) > self.max_jobs:
+                oldest = next(iter(self.jobs.values()))
+                if oldest.status in ('queued', 'running'):
+                    break
+                self.jobs.popitem(last=False)
+
+        job.status, job.started_at = 'running', datetime.utcnow()
+        for attempt in range(2):
+            with self._lock:
+                job.pool, job.futures = self._pool(), []
+            try:
+                for index, (first, last) in enumerate(job.chunks):
+                    future = job.pool.submit(process_chunk, path, first, last, step, fps, profile, self.dedup_seconds)
+                    job.futures.append(future)
+                    future.add_done_callback(lambda f, job=job, index=index: self._chunk_done(job, index, f))
+                break
+            except BrokenProcessPool as e:
+                # A worker died (e.g. OOM-killed) and took the pool down: start a fresh one once
+                print(f"WARN: Video worker pool broken ({e}), starting a new one")
+                with self._lock:
+                    self._discard_pool(job.pool)
+                    if job.status != 'running':
+                        return job  # a chunk already failed on the broken pool
+                    if attempt == 1:
+                        self._finish(job, 'failed', f"Video worker pool failed: {e}")
+                        return job
+        print(f"DEBUG: Video job {job.id} from {source}: {job.duration or 0:.0f}s at {fps:.1f} fps, "
+              f"{len(job.chunks)} chunks, sampling {sample_fps:g} fps")
+        return job
+
+    def _chunk_done(self, job, index, future):
+        if future.cancelled():
+            return
+        with self._lock:
+            if job.status != 'running' or future not in job.futures:
+                return  # finished, or a chunk of an attempt on a pool that broke
+            try:
+                result = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._discard_pool(job.pool)  # later jobs get a working pool
+                self._finish(job, 'failed', f"Chunk {index} failed: {e}")
+                print(f"ERROR: Video job {job.id} chunk {index} failed: {e}")
+                return
+            self.chunk_ms.add(result["seconds"] * 1000)
+            if self.feeds is not None and result["frames"]:
+                # The job's source reports as a feed; a chunk is one entry at its mean time per frame
+                self.feeds.record(job.source, 'processed', result["seconds"] * 1000 / result["frames"],
+                                  detections=result["detections"], frames=result["frames"], kind='video')
+            job.results[index] = result
+            # Merge every chunk whose predecessors are all merged
+            while job.merged in job.results:
+                self._merge(job, job.results.pop(job.merged))
+                job.merged += 1
+            if job.merged == len(job.chunks):
+                self._finish(job, 'done')
+
+    def _merge(self, job, result):
+        job.frames_processed += result["frames"]
+        self.counts["frames"] += result["frames"]
+        base = job.recorded_at or job.created_at
+        saved = {}  # worker image index -> stored evidence path
+        rows = []
+        for event in result["events"]:
+            # Repeats across the chunk boundary are dropped here, but only after
+            # the watchlist saw them (as /detect does): the weak check for short
+            # plates would otherwise swallow a wanted plate's read
+            duplicate = job.recent.check_and_add("video", event["type"], event["plate_number"],
+                                                 VIDEO_EPOCH + timedelta(seconds=event["seconds"]))
+            watched = self.watchlist is not None and event["type"] == 'plate'
+            if duplicate and not watched:
+                continue
+            image_path = saved.get(event["image"])
+            if event["image"] not in saved and self.evidence_store is not None and not duplicate:
+                image_path = saved[event["image"]] = self._save_evidence(result["images"][event["image"]])
+            timestamp = base + timedelta(seconds=event["seconds"])
+            hits = []
+            if watched:
+                hits = self.watchlist.check(event["plate_number"], job.source, timestamp, detection={
+                    "box": event["box"], "confidence": event["confidence"], "image_path": image_path
+                })
+            if duplicate:
+                continue
+            record = {"timestamp": timestamp.isoformat() + "Z", "video_seconds": event["seconds"],
+                      "type": event["type"], "plate_number": event["plate_number"],
+                      "confidence": event["confidence"], "box": event["box"], "image_path": image_path}
+            if hits:
+                record["watchlist"] = [{k: h[k] for k in ("plate", "match", "reason", "priority")} for h in hits]
+            job.events.append(record)
+            rows.append({"timestamp": timestamp, "type": event["type"], "confidence": event["confidence"],
+                         "plate_number": event["plate_number"], "image_path": image_path, "source": job.source})
+        self.counts["events"] += len(rows)
+        if rows and self.detection_sink is not None:
+            self.detection_sink.submit(rows)
+
+    def _save_evidence(self, data):
+        if data is None:
+            return None
+        try:
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            image_path, _ = self.evidence_store.save(frame, has_detections=True)
+            return image_path
+        except Exception as e:
+            print(f"ERROR: Saving video evidence failed: {e}")
+            return None
+
+    def _finish(self, job, status, error=None):
+        """Call with the lock held."""
+        job.status, job.error, job.finished_at = status, error, datetime.utcnow()
+        self.counts[status] += 1
+        for future in job.futures:
+            future.cancel()  # no-op for chunks already running or finished
+        job.results.clear()
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+        if status == 'done':
+            print(f"DEBUG: Video job {job.id} done: {job.frames_processed} frames, {len(job.events)} events "
+                  f"in {(job.finished_at - job.started_at).total_seconds():.1f}s")
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status in ('queued', 'running'):
+                self._finish(job, 'cancelled')
+            return job
+
+    def all(self):
+        with self._lock:
+            return [job.summary() for job in reversed(self.jobs.values())]
+
+    def results(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job.summary(), "results": list(job.events)}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self):
+        with self._lock:
+            active = sum(job.status in ('queued', 'running') for job in self.jobs.values())
+            counts = dict(self.counts)
+        return {"processes": self.processes, "active": active, **counts, "chunk_ms": self.chunk_ms.summary(0)}
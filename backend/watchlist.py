@@ -0,0 +1,221 @@
+import csv
+import io
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from plate_index import canonical, edit_distance
+
+PRIORITIES = ('critical', 'high', 'normal')
+
+
+def parse_entries(body, content_type):
+    """Watchlist rows from a JSON list/object or CSV (plate[,reason[,priority]])."""
+    if 'json' in (content_type or ''):
+        data = json.loads(body or 'null')
+        if isinstance(data, dict):
+            data = data.get('entries')
+        if not isinstance(data, list):
+            raise ValueError("Expected a JSON list of entries or {\"entries\": [...]}")
+        rows = [e if isinstance(e, dict) else {"plate": e} for e in data]
+    else:
+        rows = []
+        for record in csv.reader(io.StringIO(body)):
+            if not record or not record[0].strip() or record[0].strip().lower() == 'plate':
+                continue  # blank line or header
+            rows.append({"plate": record[0], "reason": record[1] if len(record) > 1 else None,
+                         "priority": record[2] if len(record) > 2 else None})
+
+    entries = []
+    for row in rows:
+        plate = "".join(c for c in str(row.get("plate") or "").upper() if c.isalnum())
+        if len(plate) < 3:
+            continue
+        priority = (row.get("priority") or "high").strip().lower()
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}' for {plate} (use {', '.join(PRIORITIES)})")
+        entries.append({"plate": plate, "reason": (row.get("reason") or "").strip() or None, "priority": priority})
+    return entries
+
+
+def _deletes(key):
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+class WatchlistMatcher:
+    """
+    Immutable, precompiled matcher. Entries are keyed by canonical plate
+    (confusable characters folded), plus a symmetric-delete table mapping
+    every one-character deletion of a key back to the key. A lookup costs
+    O(length) dictionary probes: the read's key, its deletions, and the
+    deletions table.
+    """
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self._exact = {}
+        self._deletes = {}
+        for entry in self.entries:
+            key = canonical(entry["plate"])
+            self._exact.setdefault(key, []).append(entry)
+        for key in self._exact:
+            for variant in _deletes(key):
+                self._deletes.setdefault(variant, set()).add(key)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, plate):
+        """Return [(entry, kind)] with kind exact | confusable | fuzzy."""
+        raw = "".join(c for c in str(plate).upper() if c.isalnum())
+        key = canonical(raw)
+        if len(key) < 3:
+            return []
+        hits = []
+        for entry in self._exact.get(key, ()):
+            hits.append((entry, "exact" if entry["plate"] == raw else "confusable"))
+
+        candidates = set(self._deletes.get(key, ()))  # read is missing a character
+        for variant in _deletes(key):
+            if variant in self._exact:
+                candidates.add(variant)  # read has an extra character
+            candidates.update(self._deletes.get(variant, ()))  # one character differs
+        candidates.discard(key)
+        for candidate in candidates:
+            # Deletions at different positions can pair up keys two edits apart
+            if edit_distance(key, candidate, 1) <= 1:
+                hits.extend((entry, "fuzzy") for entry in self._exact[candidate])
+        return hits
+
+
+class AlertFeed:
+    """Bounded in-memory feed of watchlist hits with blocking subscribers (SSE)."""
+
+    def __init__(self, size=1000):
+        self._events = deque(maxlen=size)
+        self._cond = threading.Condition()
+        # Ids start at a per-boot epoch (ms since 1970 x 1000), so they keep growing
+        # across restarts and a client's old Last-Event-ID never hides new alerts
+        self._seq = int(time.time() * 1000) * 1000
+        self.published = 0
+
+    def publish(self, event):
+        with self._cond:
+            self._seq += 1
+            event = {"id": self._seq, **event}
+            self._events.append(event)
+            self.published += 1
+            self._cond.notify_all()
+        return event
+
+    def since(self, last_id=0, limit=100):
+        with self._cond:
+            return self._since(last_id)[-limit:]
+
+    def _since(self, last_id):
+        if last_id > self._seq:
+            last_id = 0  # an id this feed never issued (clock reset, other node): replay the buffer
+        return [e for e in self._events if e["id"] > last_id]
+
+    def wait(self, last_id, timeout, limit=100):
+        """Block until there is an event to send after last_id (or timeout)."""
+        with self._cond:
+            events = self._since(last_id)
+            if not events:
+                self._cond.wait(timeout)
+                events = self._since(last_id)
+        return events[-limit:]
+
+
+class Watchlist:
+    """
+    Hot-list of wanted plates. The compiled matcher is swapped in with a
+    single reference assignment, so a reload never blocks /detect: frames
+    in flight keep using the previous matcher until they finish.
+    """
+
+    def __init__(self, app, db, model, feed, recent=None):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.feed = feed
+        self.recent = recent  # RecentEventCache to avoid re-alerting every frame
+        self._matcher = WatchlistMatcher([])
+        self._reload_lock = threading.Lock()
+        self.version = 0
+        self.lookups = 0
+        self.hits = 0
+        self.last_reload_ms = 0.0
+
+    def __len__(self):
+        return len(self._matcher)
+
+    def _swap(self, entries, started):
+        matcher = WatchlistMatcher(entries)
+        self._matcher = matcher
+        self.version += 1
+        self.last_reload_ms = (time.perf_counter() - started) * 1000
+        print(f"DEBUG: Watchlist v{self.version} compiled: {len(matcher)} plates in {self.last_reload_ms:.0f}ms")
+
+    def load(self):
+        started = time.perf_counter()
+        with self._reload_lock:
+            with self.app.app_context():
+                rows = self.model.query.all()
+            self._swap([{"plate": r.plate, "reason": r.reason, "priority": r.priority} for r in rows], started)
+
+    def import_entries(self, entries, replace=False):
+        """Persist entries and swap in the recompiled matcher. Call inside an app context."""
+        started = time.perf_counter()
+        with self._reload_lock:
+            table = self.model.__table__
+            now = datetime.utcnow()
+            with self.db.engine.begin() as conn:
+                if replace:
+                    conn.execute(table.delete())
+                if entries:
+                    conn.execute(table.insert(), [{**e, "added_at": now} for e in entries])
+            current = [] if replace else self._matcher.entries
+            self._swap(current + entries, started)
+        return len(self._matcher)
+
+    def remove(self, plate):
+        """Drop every entry for `plate`. Call inside an app context."""
+        plate = "".join(c for c in str(plate).upper() if c.isalnum())
+        started = time.perf_counter()
+        with self._reload_lock:
+            with self.db.engine.begin() as conn:
+                removed = conn.execute(self.model.__table__.delete().where(self.model.plate == plate)).rowcount
+            self._swap([e for e in self._matcher.entries if e["plate"] != plate], started)
+        return removed
+
+    def check(self, plate, source, now=None, detection=None):
+        """Match one plate read; publish and return the alert events."""
+        if not plate or plate in ("UNKNOWN", "NUMBER PLATE"):
+            return []
+        self.lookups += 1
+        hits = self._matcher.match(plate)
+        events = []
+        for entry, kind in hits:
+            if self.recent is not None and self.recent.check_and_add(source, "WATCHLIST", entry["plate"], now, exact=True):
+                continue  # already alerted for this vehicle on this camera
+            self.hits += 1
+            event = self.feed.publish({
+                "timestamp": (now or datetime.utcnow()).isoformat() + "Z",
+                "source": source,
+                "read": plate,
+                "plate": entry["plate"],
+                "match": kind,
+                "reason": entry["reason"],
+                "priority": entry["priority"],
+                "detection": detection
+            })
+            print(f"WARN: Watchlist hit ({entry['priority']}): read {plate} ~ {entry['plate']} ({kind}) on {source}")
+            events.append(event)
+        return events
+
+    def metrics(self):
+        return {"plates": len(self), "version": self.version, "lookups": self.lookups,
+                "hits": self.hits, "alerts": self.feed.published, "last_reload_ms": round(self.last_reload_ms, 1)}
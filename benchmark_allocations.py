@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.getcwd(), 'backend'))
+
+# Per-frame memory churn of everything around the models: the annotation
+# copy, preprocessing for both detectors and plate-crop OCR preprocessing.
+# Compares the previous per-frame allocations (ultralytics letterboxing
+# each model's input itself) with the shared letterbox pyramid and pooled
+# buffers. Allocation sizes come from tracemalloc, which sees NumPy and
+# OpenCV output arrays; the models and the OCR engine itself are not run.
+#
+#   python benchmark_allocations.py [frames] [plates_per_frame]
+
+os.environ.setdefault('SAFECITY_OCR_PRELOAD', '0')
+
+from processor import AIProcessor
+from letterbox import LetterboxPyramid, letterbox_geometry, PAD_VALUE
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+PLATES = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+HELMET_IMGSZ, PLATE_IMGSZ = 640, 1280
+
+
+def scene(seed):
+    rng = np.random.default_rng(seed)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8), (0, 0), 3)
+    boxes = []
+    for i in range(PLATES):
+        x, y = 200 + i * 500, 700
+        cv2.rectangle(frame, (x, y), (x + 120, y + 40), (235, 235, 235), -1)
+        cv2.putText(frame, f"AB{seed % 100:02d}C{i}", (x + 5, y + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (20, 20, 20), 2)
+        boxes.append([x, y, x + 120, y + 40])
+    return frame, boxes
+
+
+class FakeReader:
+    def readtext(self, image, allowlist=None):
+        return []
+
+
+# --- Previous per-frame work, kept here as the baseline -----------------------------
+
+def legacy_model_input(frame, imgsz):
+    # ultralytics LetterBox + preprocess() for one model call
+    _, new_w, new_h, left, top, out_w, out_h = letterbox_geometry(*frame.shape[:2], imgsz)
+    image = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    image = cv2.copyMakeBorder(image, top, out_h - new_h - top, left, out_w - new_w - left,
+                               cv2.BORDER_CONSTANT, value=(PAD_VALUE,) * 3)
+    im = np.stack([image])
+    im = np.ascontiguousarray(im[..., ::-1].transpose((0, 3, 1, 2)))
+    im = im.astype(np.float32)
+    im /= 255
+    return im
+
+
+def legacy_ocr_preprocess(frame, box):
+    x1, y1, x2, y2 = box
+    plate_img = frame[max(0, y1 - 15):y2 + 15, max(0, x1 - 15):x2 + 15]
+    if plate_img.shape[1] < 200:
+        scale = 200 / plate_img.shape[1]
+        plate_img = cv2.resize(plate_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
+    enhanced = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    denoised = cv2.fastNlMeansDenoising(enhanced, None, 10, 7, 21)
+    adaptive = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 3)
+    cv2.morphologyEx(adaptive, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2)))
+    cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+
+def legacy_frame(frame, boxes, processor):
+    annotated = frame.copy()
+    legacy_model_input(frame, HELMET_IMGSZ)
+    legacy_model_input(frame, PLATE_IMGSZ)
+    for box in boxes:
+        legacy_ocr_preprocess(frame, box)
+    return annotated
+
+
+def pooled_frame(frame, boxes, processor):
+    with LetterboxPyramid(frame, [HELMET_IMGSZ, PLATE_IMGSZ], processor.buffers) as pyramid:
+        pyramid.array(HELMET_IMGSZ)
+        pyramid.array(PLATE_IMGSZ)
+    for box in boxes:
+        processor._read_plate(frame, None, box)
+    return frame
+
+
+def measure(step, processor):
+    peaks, times = [], []
+    for i in range(FRAMES):
+        frame, boxes = scene(i)
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        step(frame, boxes, processor)
+        times.append((time.perf_counter() - started) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        del frame
+    warm = peaks[1:] or peaks  # the first frame fills the pool
+    return {"avg_peak_mb": sum(warm) / len(warm) / 2 ** 20, "max_peak_mb": max(peaks) / 2 ** 20,
+            "avg_ms": sum(times[1:]) / max(1, len(times) - 1)}
+
+
+processor = AIProcessor({'helmet': '/nonexistent', 'plate': '/nonexistent'})
+processor.ocr_engine, processor.easyocr_reader = 'easy', FakeReader()
+
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')  # silence per-plate DEBUG lines
+tracemalloc.start()
+try:
+    before = measure(legacy_frame, processor)
+    after = measure(pooled_frame, processor)
+finally:
+    tracemalloc.stop()
+    sys.stdout.close()
+    sys.stdout = stdout
+
+print(f"1920x1080 frames, detectors at {HELMET_IMGSZ}/{PLATE_IMGSZ}, {PLATES} plate crops each, {FRAMES} frames\n")
+for name, r in (("per-frame allocations", before), ("pyramid + buffer pool", after)):
+    print(f"{name:<24} avg peak {r['avg_peak_mb']:7.2f} MB   max peak {r['max_peak_mb']:7.2f} MB   {r['avg_ms']:6.1f} ms")
+pool = processor.buffers.metrics()
+print(f"\nbuffer pool: {pool['acquired']} leases, {pool['allocated']} buffers allocated "
+      f"({pool['allocated_bytes'] / 2 ** 20:.1f} MB), hit rate {pool['hit_rate']:.0%}, {pool['idle_mb']} MB idle")
@@ -0,0 +1,212 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.getcwd(), 'backend'))
+
+# Microbenchmark for everything process_frame and /detect do with model
+# output: box extraction, ROI filtering, rider-plate association, record
+# building and JSON encoding. The models are replaced by canned results, so
+# only post-processing is timed. Dense frames are the case that matters: at
+# the 0.05 plate confidence floor the plate model returns 50+ boxes.
+#
+#   python benchmark_postprocess.py [plate_boxes] [riders]
+#
+# Uses real ultralytics Boxes (torch tensors) when installed, otherwise a
+# NumPy stand-in with the same per-box indexing.
+
+os.environ.setdefault('SAFECITY_OCR_PRELOAD', '0')
+
+from processor import AIProcessor
+from roi import RegionOfInterest
+from json_provider import _default, orjson, ORJSON_OPTIONS
+from association import REGION_WIDTH, REGION_DEPTH
+
+PLATE_BOXES = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+RIDERS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+RUNS = 300
+FRAME = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+try:
+    import torch
+    from ultralytics.engine.results import Boxes
+
+    def make_boxes(rows):
+        return Boxes(torch.tensor(rows, dtype=torch.float32).reshape(-1, 6)[:, [0, 1, 2, 3, 5, 4]], FRAME.shape[:2])
+    BACKEND = "ultralytics"
+except ImportError:
+    class _Tensor(np.ndarray):
+        def cpu(self):
+            return self
+
+        def numpy(self):
+            return np.asarray(self)
+
+    class _Box:
+        def __init__(self, boxes, i):
+            self.xyxy, self.cls, self.conf = boxes.xyxy[i:i + 1], boxes.cls[i:i + 1], boxes.conf[i:i + 1]
+
+    class Boxes:
+        def __init__(self, rows):
+            data = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+            self.xyxy = data[:, :4].view(_Tensor)
+            self.cls = data[:, 4].view(_Tensor)
+            self.conf = data[:, 5].view(_Tensor)
+
+        def __len__(self):
+            return len(self.xyxy)
+
+        def __iter__(self):
+            return (_Box(self, i) for i in range(len(self)))
+
+    make_boxes = Boxes
+    BACKEND = "numpy stand-in"
+
+
+class _Result:
+    def __init__(self, rows):
+        self.boxes = make_boxes(rows)
+
+
+class CannedModel:
+    def __init__(self, rows):
+        self.result = _Result(rows)
+
+    def __call__(self, frame, **kwargs):
+        return [self.result]
+
+
+def scene(riders, plates, seed=0):
+    """Riders spread across the frame, each with a plate below, plus low-confidence clutter."""
+    rng = np.random.default_rng(seed)
+    rider_rows, plate_rows = [], []
+    for i in range(riders):
+        x = 100 + i * (1700 / max(1, riders))
+        rider_rows.append([x, 300, x + 90, 420, i % 2, 0.5 + 0.4 * rng.random()])
+        plate_rows.append([x + 20, 640, x + 80, 670, 0, 0.3 + 0.6 * rng.random()])
+    while len(plate_rows) < plates:
+        x, y = rng.uniform(0, 1850), rng.uniform(0, 1040)
+        plate_rows.append([x, y, x + 60, y + 30, 0, rng.uniform(0.05, 0.3)])
+    return rider_rows, plate_rows
+
+
+# --- The per-box implementation this replaced, kept here as the baseline -------------
+
+def legacy_link_cost(rider_box, plate_box):
+    rx1, ry1, rx2, ry2 = rider_box
+    rw, rh = max(1.0, rx2 - rx1), max(1.0, ry2 - ry1)
+    rcx = (rx1 + rx2) / 2.0
+    pcx, pcy = (plate_box[0] + plate_box[2]) / 2.0, (plate_box[1] + plate_box[3]) / 2.0
+    dx = abs(pcx - rcx) / rw
+    if dx > REGION_WIDTH or pcy < ry1 or pcy > ry2 + REGION_DEPTH * rh:
+        return None
+    return 2.0 * dx + max(0.0, pcy - ry2) / rh / REGION_DEPTH
+
+
+def legacy_point_in_polygon(x, y, polygon):
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def legacy_in_roi(roi, box, w, h):
+    cx, cy = (box[0] + box[2]) / 2.0 / w, (box[1] + box[3]) / 2.0 / h
+    return any(legacy_point_in_polygon(cx, cy, polygon) for polygon in roi.polygons)
+
+
+def legacy_postprocess(helmet_model, plate_model, roi):
+    h, w = FRAME.shape[:2]
+    results = []
+    for box in helmet_model(FRAME)[0].boxes:
+        x1, y1, x2, y2 = box.xyxy[0].tolist()
+        if not legacy_in_roi(roi, (x1, y1, x2, y2), w, h):
+            continue
+        cls, conf = int(box.cls[0]), float(box.conf[0])
+        results.append({"type": "COMPLIANT" if cls == 0 else "NO_HELMET", "box": [x1, y1, x2, y2],
+                        "label": "with helmets" if cls == 0 else "No_helmets",
+                        "color": (0, 255, 0) if cls == 0 else (0, 0, 255), "confidence": conf})
+    plates = []
+    for box in plate_model(FRAME)[0].boxes:
+        x1, y1, x2, y2 = box.xyxy[0].tolist()
+        if legacy_in_roi(roi, (x1, y1, x2, y2), w, h):
+            plates.append({"box": [x1, y1, x2, y2], "confidence": float(box.conf[0])})
+    links = {}
+    for r_idx, rider in enumerate(results):
+        costs = [(legacy_link_cost(rider["box"], p["box"]), p_idx) for p_idx, p in enumerate(plates)]
+        costs = [c for c in costs if c[0] is not None]
+        if costs:
+            links[r_idx] = min(costs)[1]
+    targets = {p for r, p in links.items() if results[r]["type"] == "NO_HELMET"}
+    targets.update(i for i, p in enumerate(plates) if p["confidence"] >= 0.5)
+    for idx, plate in enumerate(plates):
+        if idx not in targets and idx not in links.values():
+            continue
+        results.append({"type": "plate", "box": plate["box"], "label": "AB12CD", "color": (0, 255, 255),
+                        "confidence": plate["confidence"], "plate_number": "AB12CD", "ocr": idx in targets})
+    # /detect's type re-mapping pass
+    for det in results:
+        raw_type, raw_label = str(det.get('type', '')).upper(), str(det.get('label', '')).upper()
+        det['type'] = 'plate' if 'PLATE' in raw_type else (
+            'NO_HELMET' if 'NO_HELMET' in raw_type or 'WITHOUT' in raw_label else 'COMPLIANT')
+    return results
+
+
+def timed(func, runs=RUNS):
+    func()  # warm up
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+
+def report(name, result):
+    print(f"{name:<44} p50 {result[0]:7.3f} ms   p95 {result[1]:7.3f} ms")
+
+
+rider_rows, plate_rows = scene(RIDERS, PLATE_BOXES)
+helmet_model, plate_model = CannedModel(rider_rows), CannedModel(plate_rows)
+# Masks off the bottom-left corner; its bounds are the whole frame, so no crop
+roi = RegionOfInterest([[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.4, 1.0], [0.0, 0.6]]])
+
+processor = AIProcessor({'helmet': '/nonexistent', 'plate': '/nonexistent'})
+processor.helmet_model, processor.plate_model = helmet_model, plate_model
+processor._read_plate = lambda frame, decoded, box, fast_ocr=False: ("AB12CD", 1)  # OCR is not what's measured
+profile = {"roi": roi, "cascade": False}
+
+print(f"{RIDERS} riders, {len(plate_rows)} plate boxes per frame ({BACKEND}), {RUNS} runs\n")
+legacy = legacy_postprocess(helmet_model, plate_model, roi)
+current = processor.process_frame(FRAME, profile)
+assert [d["box"] for d in legacy] == [d["box"] for d in current], "implementations disagree"
+assert [d["type"] for d in legacy] == [d["type"] for d in current], "implementations disagree"
+
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')  # silence the per-frame DEBUG lines while timing
+try:
+    post_legacy = timed(lambda: legacy_postprocess(helmet_model, plate_model, roi))
+    post_current = timed(lambda: processor.process_frame(FRAME, profile))
+    legacy_dicts = legacy
+    json_legacy = timed(lambda: json.dumps({"detections": legacy_dicts}))
+    json_current = timed(lambda: orjson.dumps({"detections": current}, default=_default, option=ORJSON_OPTIONS)) if orjson else None
+finally:
+    sys.stdout.close()
+    sys.stdout = stdout
+
+report("post-processing, per-box tensors + dicts", post_legacy)
+report("post-processing, arrays + DetectionRecord", post_current)
+report("JSON, stdlib json.dumps(dicts)", json_legacy)
+if json_current:
+    report("JSON, orjson(DetectionRecord)", json_current)
+print(f"\n{len(current)} detections kept of {len(rider_rows) + len(plate_rows)} boxes; "
+      f"post-processing speed-up {post_legacy[0] / post_current[0]:.1f}x")
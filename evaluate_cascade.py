@@ -0,0 +1,90 @@
+import cv2
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.getcwd(), 'backend'))
+
+# Patch OCR
+import PIL.Image
+if not hasattr(PIL.Image, 'ANTIALIAS'):
+    PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
+
+# Measures what the cascade gate costs in recall on a fixture set: every
+# image is run once without the gate (the reference) and once with it, and
+# each reference detection must be found again (same type, IoU >= 0.5).
+#
+#   SAFECITY_CASCADE=1 python evaluate_cascade.py path/to/fixtures
+
+os.environ.setdefault('SAFECITY_CASCADE', '1')
+# Compare detections, not OCR reads
+os.environ.setdefault('SAFECITY_PLATE_OCR_MODE', 'violations')
+
+from processor import AIProcessor
+
+FIXTURE_DIR = sys.argv[1] if len(sys.argv) > 1 else os.path.join('backend', 'fixtures', 'cascade')
+IOU_MATCH = 0.5
+
+
+def iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def matched(reference, candidates):
+    return any(c["type"] == reference["type"] and iou(c["box"], reference["box"]) >= IOU_MATCH
+               for c in candidates)
+
+
+def run(processor, frame, gated):
+    start = time.time()
+    detections = processor.process_frame(frame.copy(), {"cascade": gated})
+    return detections, time.time() - start
+
+
+print("Initializing processor...")
+processor = AIProcessor()
+if processor.cascade is None:
+    print("Cascade gate not loaded (check SAFECITY_CASCADE_MODEL)")
+    sys.exit(1)
+
+images = sorted(f for f in os.listdir(FIXTURE_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+if not images:
+    print(f"No fixture images in {FIXTURE_DIR}")
+    sys.exit(1)
+
+totals = {}  # type -> [reference count, found with gate]
+time_full, time_gated = 0.0, 0.0
+for name in images:
+    frame = cv2.imread(os.path.join(FIXTURE_DIR, name))
+    if frame is None:
+        print(f"Skipping unreadable {name}")
+        continue
+    reference, t_full = run(processor, frame, False)
+    gated, t_gated = run(processor, frame, True)
+    time_full += t_full
+    time_gated += t_gated
+
+    missed = 0
+    for det in reference:
+        counts = totals.setdefault(det["type"], [0, 0])
+        counts[0] += 1
+        if matched(det, gated):
+            counts[1] += 1
+        else:
+            missed += 1
+    print(f"{name}: {len(reference)} reference, {len(gated)} gated, {missed} missed "
+          f"({t_full:.3f}s -> {t_gated:.3f}s)")
+
+print("\n--- Recall with cascade gate ---")
+for d_type, (total, found) in sorted(totals.items()):
+    print(f"{d_type}: {found}/{total} ({found / total:.1%})")
+print(f"Time: {time_full:.2f}s without gate, {time_gated:.2f}s with gate")
+
+metrics = processor.cascade.metrics()
+print("\n--- Stage rejections (gated runs) ---")
+for stage, s in metrics["stages"].items():
+    print(f"{stage}: {s['rejected']}/{s['frames']} frames rejected")
+print(f"Cropped to candidate region: {metrics['cropped']} frames, gate p50 {metrics['gate_ms']['p50']}ms")
@@ -2,7 +2,7 @@
 import React, { useState, useEffect, useMemo } from 'react';
 import { Users, ShieldX, CreditCard, Activity, Wifi, WifiOff, Clock, BarChart3, Radio } from 'lucide-react';
 import { ResponsiveContainer, AreaChart, Area, XAxis, YAxis, CartesianGrid, Tooltip } from 'recharts';
-import { fetchStats, fetchLogs } from '../services/flaskApi';
+import { fetchStats, fetchLogs, fetchFeedHealth } from '../services/flaskApi';
 import DashboardCard from '../components/DashboardCard';
 import { STORAGE_KEY } from '../constants';
 import { DetectionResult, ViolationType } from '../types';
@@ -10,15 +10,16 @@ import { DetectionResult, ViolationType } from '../types';
 const Dashboard: React.FC<{ setActiveTab?: (tab: string) => void }> = ({ setActiveTab }) => {
   const [logs, setLogs] = useState<any[]>([]);
   const [statsData, setStatsData] = useState<any>({ total: 0, violations: 0, compliant: 0 });
+  const [feeds, setFeeds] = useState<any[]>([]);
   const [lastSyncTime, setLastSyncTime] = useState<string>('Searching...');
 
   const syncLogs = async () => {
     try {
-      const logsData = await fetchLogs();
-      const stats = await fetchStats();
+      const [logsData, stats, feedHealth] = await Promise.all([fetchLogs(), fetchStats(), fetchFeedHealth()]);
 
       setLogs(logsData);
       setStatsData(stats);
+      setFeeds(feedHealth.feeds || []);
 
       if (stats.last_event) {
         const latest = new Date(stats.last_event);
@@ -37,30 +38,26 @@ const Dashboard: React.FC<{ setActiveTab?: (tab: string) => void }> = ({ setActi
     return () => clearInterval(interval);
   }, []);
 
+  // Measured by the backend for every source that has sent frames, detections or not
   const feedStatus = useMemo(() => {
-    const sources = ['LIVE-UNIT-01', 'VIDEO-ANALYSIS', 'IMAGE-EVIDENCE'];
-    const now = Date.now();
-
-    return sources.map(source => {
-      const sourceLogs = logs.filter(l => l.source === source);
-      const lastDetection = sourceLogs[0];
-      const timeSinceLast = lastDetection ? now - new Date(lastDetection.timestamp).getTime() : Infinity;
-
-      const isActive = timeSinceLast < 60000;
-      const isOnline = timeSinceLast < 6000000; // Increased to 100 minutes for stability
+    const labels: Record<string, string> = {
+      'LIVE-UNIT-01': 'Gate 01 - Main Street',
+      'VIDEO-ANALYSIS': 'Gateway - Video Hub',
+      'IMAGE-EVIDENCE': 'Digital Evidence Bin'
+    };
 
-      const latency = lastDetection
-        ? Math.floor((1 - lastDetection.confidence) * 100) + 12
-        : 0;
+    return feeds.map(feed => {
+      const latency = feed.latency_ms?.p50;
+      const loss = feed.loss_rate ? ` · ${Math.round(feed.loss_rate * 100)}% SHED` : '';
 
       return {
-        label: source === 'LIVE-UNIT-01' ? 'Gate 01 - Main Street' : (source === 'VIDEO-ANALYSIS' ? 'Gateway - Video Hub' : 'Digital Evidence Bin'),
-        status: isActive ? 'Online' : (isOnline ? 'Standby' : 'Offline'),
-        delay: latency ? `${latency}ms` : '---',
-        id: source
+        label: labels[feed.source] || feed.source,
+        status: feed.status.charAt(0).toUpperCase() + feed.status.slice(1),
+        delay: latency ? `${Math.round(latency)}ms · ${feed.fps} FPS${loss}` : '---',
+        id: feed.source
       };
     });
-  }, [logs]);
+  }, [feeds]);
 
   const stats = useMemo(() => {
     return {
@@ -235,7 +232,7 @@ const Dashboard: React.FC<{ setActiveTab?: (tab: string) => void }> = ({ setActi
           </div>
 
           <div className="space-y-5 flex-1 overflow-y-auto custom-scrollbar pr-2">
-            {logs.length === 0 ? (
+            {feedStatus.length === 0 ? (
               <div className="flex-1 flex flex-col items-center justify-center py-20 text-center space-y-4">
                 <div className="w-20 h-20 bg-slate-800/50 rounded-full flex items-center justify-center border border-slate-700 shadow-inner">
                   <WifiOff size={40} className="text-slate-600 animate-pulse" />
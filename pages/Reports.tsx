@@ -1,11 +1,13 @@
 import React, { useState, useEffect, useMemo } from 'react';
 import { Search, Download, ExternalLink, Filter, Calendar, X, ChevronDown, CheckCircle2, AlertCircle, FileSearch, RotateCcw } from 'lucide-react';
-import { fetchLogs } from '../services/flaskApi';
+import { fetchLogs, searchPlates, exportUrl } from '../services/flaskApi';
 import { DetectionResult, ViolationType } from '../types';
 
 const Reports: React.FC = () => {
   const [data, setData] = useState<any[]>([]);
   const [search, setSearch] = useState('');
+  // Server-side fuzzy plate matches (null = not searching, filter locally)
+  const [searchResults, setSearchResults] = useState<any[] | null>(null);
   const [selectedImage, setSelectedImage] = useState<string | null>(null);
 
   // Filter States
@@ -28,11 +30,35 @@ const Reports: React.FC = () => {
     return () => clearInterval(interval);
   }, []);
 
+  // Plate searches go to the backend index (tolerates OCR confusions like 0/O, 8/B)
+  useEffect(() => {
+    const term = search.replace(/[^a-z0-9]/gi, '');
+    if (term.length < 3 || /^\d+$/.test(term)) {
+      setSearchResults(null);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const range = { start: dateRange.start, end: dateRange.end && `${dateRange.end}T23:59:59` };
+        const results = await searchPlates(term, range, controller.signal);
+        setSearchResults(results);
+      } catch (error) {
+        if ((error as Error).name !== 'AbortError') console.error("Plate Search Error:", error);
+      }
+    }, 250);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [search, dateRange]);
+
   // Combined Filter Logic
   const filtered = useMemo(() => {
-    return data.filter(d => {
-      // Search matching
-      const matchesSearch = (d.plate_number || '').toLowerCase().includes(search.toLowerCase()) ||
+    return (searchResults ?? data).filter(d => {
+      // Search matching (already ranked by the server when searchResults is set)
+      const matchesSearch = searchResults !== null ||
+        (d.plate_number || '').toLowerCase().includes(search.toLowerCase()) ||
         (d.id.toString()).toLowerCase().includes(search.toLowerCase());
 
       // Type matching
@@ -53,7 +79,7 @@ const Reports: React.FC = () => {
 
       return matchesSearch && matchesType && matchesDate;
     });
-  }, [data, search, typeFilter, dateRange]);
+  }, [data, searchResults, search, typeFilter, dateRange]);
 
   const resetFilters = () => {
     setSearch('');
@@ -62,6 +88,24 @@ const Reports: React.FC = () => {
   };
 
   const exportData = () => {
+    // Search hits are already in the browser; range/type exports stream from the server
+    if (search) {
+      exportVisible();
+      return;
+    }
+    const a = document.createElement('a');
+    a.setAttribute('hidden', '');
+    a.setAttribute('href', exportUrl({
+      start: dateRange.start,
+      end: dateRange.end && `${dateRange.end}T23:59:59`,
+      type: typeFilter === 'ALL' ? '' : typeFilter
+    }));
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+  };
+
+  const exportVisible = () => {
     if (filtered.length === 0) return;
 
     const csv = [
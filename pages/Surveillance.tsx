@@ -1,7 +1,7 @@
 
 import React, { useRef, useState, useEffect, useMemo } from 'react';
-import { Camera, Upload, Play, Square, AlertCircle, CheckCircle, Activity, X, ShieldAlert, ShieldCheck, FileText, BarChart3, Fingerprint } from 'lucide-react';
-import { processFrame, fetchLogs } from '../services/flaskApi';
+import { Camera, Upload, Play, Square, AlertCircle, CheckCircle, Activity, X, ShieldAlert, ShieldCheck, FileText, BarChart3, Fingerprint, Film } from 'lucide-react';
+import { processFrame, fetchLogs, submitVideoJob, fetchVideoJob, fetchVideoJobResults, cancelVideoJob } from '../services/flaskApi';
 import { DetectionResult, ViolationType } from '../types';
 import { THRESHOLD_KEY, STORAGE_KEY } from '../constants';
 
@@ -18,6 +18,8 @@ const Surveillance: React.FC = () => {
   const [sessionDetections, setSessionDetections] = useState<DetectionResult[]>([]);
   const [canvasDimensions, setCanvasDimensions] = useState({ width: 1280, height: 720 });
   const [annotatedImage, setAnnotatedImage] = useState<string | null>(null);
+  // Server-side job over the whole uploaded video (every chunk, not just what plays)
+  const [videoJob, setVideoJob] = useState<{ id: string, status: string, progress: number } | null>(null);
 
   const videoRef = useRef<HTMLVideoElement>(null);
   const imageRef = useRef<HTMLImageElement>(null);
@@ -25,6 +27,8 @@ const Surveillance: React.FC = () => {
   const fileInputRef = useRef<HTMLInputElement>(null);
   const analysisTimerRef = useRef<number | null>(null);
   const abortControllerRef = useRef<AbortController | null>(null);
+  const videoFileRef = useRef<File | null>(null);
+  const jobTimerRef = useRef<number | null>(null);
 
   // Derived stats for the report
   const reportStats = useMemo(() => {
@@ -82,8 +86,11 @@ const Surveillance: React.FC = () => {
     stopStream();
     setSessionDetections([]); // Reset session for new file
 
+    stopVideoJob();
+    videoFileRef.current = null;
     if (file.type.startsWith('video/')) {
       if (videoRef.current) videoRef.current.srcObject = null;
+      videoFileRef.current = file;
       setMediaType('video');
       setIsStreaming(true);
     } else if (file.type.startsWith('image/')) {
@@ -98,6 +105,8 @@ const Surveillance: React.FC = () => {
 
   const clearMedia = () => {
     stopAnalysis();
+    stopVideoJob();
+    videoFileRef.current = null;
     stopStream();
     setMediaType(null);
     setMediaUrl(null);
@@ -228,6 +237,11 @@ const Surveillance: React.FC = () => {
 
       console.log(`DEBUG: AI Core result for ${sourceTag}:`, result);
 
+      if (result?.shed) {
+        console.log(`DEBUG: Frame shed by AI Core (${result.error}), retry after ${result.retryAfter}s`);
+        return;
+      }
+
       if (!result || !result.detections) {
         console.warn("DEBUG: No detections returned from AI Core");
         return;
@@ -329,6 +343,63 @@ const Surveillance: React.FC = () => {
     setIsAnalyzing(false);
   };
 
+  const stopVideoJob = () => {
+    if (jobTimerRef.current) {
+      clearInterval(jobTimerRef.current);
+      jobTimerRef.current = null;
+    }
+    setVideoJob(prev => {
+      if (prev && prev.status === 'running') cancelVideoJob(prev.id).catch(() => undefined);
+      return null;
+    });
+  };
+
+  const startVideoJob = async () => {
+    const file = videoFileRef.current;
+    if (!file) return;
+    try {
+      const job = await submitVideoJob(file);
+      if (!job.id) {
+        console.error("DEBUG: Video job rejected", job.error);
+        alert(job.error || "Video could not be processed.");
+        return;
+      }
+      setSessionDetections([]);
+      setVideoJob({ id: job.id, status: job.status, progress: job.progress });
+      console.log(`DEBUG: Video job ${job.id} submitted (${job.chunks.total} chunks)`);
+
+      jobTimerRef.current = window.setInterval(async () => {
+        const status = await fetchVideoJob(job.id);
+        setVideoJob({ id: job.id, status: status.status, progress: status.progress });
+        if (status.status === 'running') return;
+
+        clearInterval(jobTimerRef.current!);
+        jobTimerRef.current = null;
+        if (status.status !== 'done') {
+          console.error(`DEBUG: Video job ${job.id} ${status.status}`, status.error);
+          return;
+        }
+        const events = await fetchVideoJobResults(job.id);
+        setSessionDetections(events.map((e: any) => ({
+          ...e,
+          timestamp: Date.parse(e.timestamp),
+          type: e.type === 'NO_HELMET' ? ViolationType.NO_HELMET :
+            e.type === 'COMPLIANT' ? ViolationType.COMPLIANT : e.type
+        })));
+        setLogs(await fetchLogs());
+        if (events.some((e: any) => e.type === 'NO_HELMET')) triggerFlash();
+      }, 2000) as unknown as number;
+    } catch (err) {
+      console.error("CRITICAL: Video job failed:", err);
+    }
+  };
+
+  useEffect(() => {
+    return () => {
+      if (jobTimerRef.current) clearInterval(jobTimerRef.current);
+    };
+  }, []);
+
   useEffect(() => {
     if (videoRef.current) {
       if (mediaType === 'camera') {
@@ -379,6 +450,14 @@ const Surveillance: React.FC = () => {
                   {(analysisTimerRef.current || isAnalyzing) ? <Square size={18} /> : <Play size={18} />}
                   {(analysisTimerRef.current || isAnalyzing) ? 'Stop Processing' : (mediaType === 'image' ? 'Run Analysis' : 'Start Processing')}
                 </button>
+                {mediaType === 'video' && (
+                  <button
+                    onClick={videoJob?.status === 'running' ? stopVideoJob : startVideoJob}
+                    className="flex items-center gap-2 px-6 py-2 bg-indigo-600 hover:bg-indigo-500 text-white rounded-xl transition-all font-semibold shadow-lg shadow-indigo-600/20"
+                  >
+                    <Film size={18} /> {videoJob?.status === 'running' ? 'Cancel Full Scan' : 'Scan Full Video'}
+                  </button>
+                )}
                 <button
                   onClick={clearMedia}
                   className="flex items-center gap-2 px-6 py-2 bg-slate-800 text-white rounded-xl hover:bg-slate-700 transition-all font-semibold border border-slate-700"
@@ -459,6 +538,16 @@ const Surveillance: React.FC = () => {
             </div>
           )}
 
+          {videoJob && (
+            <div className="absolute bottom-6 left-6 bg-slate-900/90 px-5 py-2.5 rounded-2xl flex flex-col gap-2 shadow-2xl border border-indigo-500/30 z-30 min-w-[220px]">
+              <span className="text-[10px] font-bold text-indigo-400 uppercase tracking-widest">Full Video Scan: {videoJob.status}</span>
+              <div className="h-1.5 bg-slate-800 rounded-full overflow-hidden">
+                <div className="h-full bg-indigo-500 transition-all" style={{ width: `${Math.round(videoJob.progress * 100)}%` }} />
+              </div>
+              <span className="text-xs font-bold text-white">{Math.round(videoJob.progress * 100)}% of chunks processed</span>
+            </div>
+          )}
+
           {isAnalyzing && (
             <div className="absolute bottom-6 right-6 bg-slate-900/90 px-5 py-2.5 rounded-2xl flex items-center gap-3 shadow-2xl border border-indigo-500/30 z-30">
               <div className="w-3 h-3 bg-indigo-500 rounded-full animate-ping"></div>
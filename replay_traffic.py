@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from metrics import percentile
+from traffic_recorder import read_recording, recording_files
+
+# Replays recorded /detect traffic (see backend/traffic_recorder.py) from N
+# concurrent cameras and ramps N up, reporting what the server sustains.
+# Each camera replays one recorded source (round-robin when there are more
+# cameras than recordings) with its original inter-arrival times, divided by
+# --speed, under its own source tag. Like the browser, a camera has at most
+# one frame in flight; frames that fall due while it waits are skipped and
+# counted, so a saturated server shows up as skipped + shed frames.
+#
+#   curl -X POST localhost:5000/recording      # record a session, then DELETE it
+#   python replay_traffic.py backend/recordings/<session> --cameras 1,2,4,8 --step 60
+#
+# SAFECITY_STUB_PROCESSOR=1 on the server takes model cost out of the picture.
+
+
+def load_sources(paths):
+    files = []
+    for path in paths:
+        files.extend(recording_files(path) if os.path.isdir(path) else [path])
+    if not files:
+        raise SystemExit("No recordings found")
+    sources = []
+    for path in files:
+        header, frames = read_recording(path)
+        frames = list(frames)
+        if frames:
+            sources.append((header["source"], frames))
+    return sources
+
+
+class Camera(threading.Thread):
+    def __init__(self, index, url, source, frames, speed, deadline, results):
+        super().__init__(daemon=True)
+        self.tag = f"{source}-R{index}"
+        self.url = url
+        self.frames = frames
+        self.speed = speed
+        self.deadline = deadline
+        self.results = results
+        self.session = requests.Session()
+        self.rng = random.Random(index)
+        self.skipped = 0
+
+    def schedule(self):
+        """Endless (due_time, jpeg) over the recording, looped, in wall-clock time."""
+        first = self.frames[0][0]
+        span = self.frames[-1][0] - first
+        interval = span / (len(self.frames) - 1) if len(self.frames) > 1 else 1.0
+        period = span + interval  # loops continue at the mean frame interval
+        # Cameras sharing a recording shouldn't fire in lockstep
+        start = time.monotonic() + self.rng.uniform(0, interval) / self.speed
+        loop = 0
+        while True:
+            for offset, data in self.frames:
+                yield start + (loop * period + offset - first) / self.speed, data
+            loop += 1
+
+    def run(self):
+        frames = self.schedule()
+        due, data = next(frames)
+        upcoming = next(frames)
+        while due < self.deadline:
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.send(data)
+            (due, data), upcoming = upcoming, next(frames)
+            # Frames that fell due while the request was in flight are dropped,
+            # as a live camera would; only the most recent one still goes out
+            now = min(time.monotonic(), self.deadline)
+            while upcoming[0] <= now:
+                self.skipped += 1
+                (due, data), upcoming = upcoming, next(frames)
+
+    def send(self, data):
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.url, files={"image": ("frame.jpg", data, "image/jpeg")},
+                                         data={"source": self.tag}, timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        self.results.append((status, (time.perf_counter() - started) * 1000))
+
+
+def run_step(url, sources, cameras, seconds, speed):
+    results = []
+    deadline = time.monotonic() + seconds
+    threads = [Camera(i, url, *sources[i % len(sources)], speed, deadline, results) for i in range(cameras)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    ok = [ms for status, ms in results if status == 200]
+    shed = sum(status in (429, 503) for status, _ in results)
+    errors = len(results) - len(ok) - shed
+    skipped = sum(t.skipped for t in threads)
+    offered = len(results) + skipped
+    return {
+        "cameras": cameras,
+        "seconds": round(elapsed, 1),
+        "offered_fps": round(offered / elapsed, 2),
+        "sustained_fps": round(len(ok) / elapsed, 2),
+        "sent": len(results),
+        "ok": len(ok),
+        "shed_rate": round(shed / offered, 3) if offered else 0.0,
+        "error_rate": round(errors / offered, 3) if offered else 0.0,
+        "skipped_rate": round(skipped / offered, 3) if offered else 0.0,
+        "p50_ms": round(percentile(ok, 50), 1),
+        "p95_ms": round(percentile(ok, 95), 1),
+        "p99_ms": round(percentile(ok, 99), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded /detect traffic from N concurrent cameras")
+    parser.add_argument("recordings", nargs="+", help="session directories or .rec files")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--cameras", default="1,2,4,8", help="comma-separated camera counts to ramp through")
+    parser.add_argument("--step", type=float, default=60, help="seconds per camera count")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed (2 = twice the recorded frame rate)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    sources = load_sources(args.recordings)
+    total = sum(len(frames) for _, frames in sources)
+    print(f"Loaded {len(sources)} recorded sources, {total} frames; replaying at {args.speed:g}x")
+
+    report = []
+    columns = ("cameras", "offered_fps", "sustained_fps", "p50_ms", "p95_ms", "p99_ms", "shed_rate", "error_rate", "skipped_rate")
+    print("  ".join(f"{c:>13}" for c in columns))
+    for cameras in [int(n) for n in args.cameras.split(",")]:
+        step = run_step(f"{args.url}/detect", sources, cameras, args.step, args.speed)
+        report.append(step)
+        print("  ".join(f"{step[c]:>13}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"url": args.url, "speed": args.speed, "sources": len(sources), "steps": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
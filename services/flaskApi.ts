@@ -1,64 +1,126 @@
-const API_BASE_URL = 'http://127.0.0.1:5000';
-
-export const loginUser = async (credentials: any) => {
-    const response = await fetch(`${API_BASE_URL}/login`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(credentials)
-    });
-    return response.json();
-};
-
-export const signupUser = async (userData: any) => {
-    const response = await fetch(`${API_BASE_URL}/signup`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(userData)
-    });
-    return response.json();
-};
-
-export const processFrame = async (base64Image: string, source: string = 'IMAGE-EVIDENCE', signal?: AbortSignal) => {
-    // Convert base64 to blob
-    const res = await fetch(base64Image);
-    const blob = await res.blob();
-
-    const formData = new FormData();
-    formData.append('image', blob, 'frame.jpg');
-    formData.append('source', source);
-
-    const response = await fetch(`${API_BASE_URL}/detect`, {
-        method: 'POST',
-        body: formData,
-        signal
-    });
-    return response.json();
-};
-
-export const fetchStats = async () => {
-    const response = await fetch(`${API_BASE_URL}/stats`);
-    return response.json();
-};
-
-export const purgeDetections = async (range: { start: string, end: string }) => {
-    const token = localStorage.getItem('safecity_token');
-    const response = await fetch(`${API_BASE_URL}/purge`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${token}`
-        },
-        body: JSON.stringify(range)
-    });
-    return response.json();
-};
-
-export const fetchLogs = async () => {
-    const response = await fetch(`${API_BASE_URL}/logs`);
-    const data = await response.json();
-    return data.map((log: any) => ({
-        ...log,
-        plateNumber: log.plate_number,
-        timestamp: log.timestamp // Backend already sends ISO string with Z
-    }));
-};
+const API_BASE_URL = 'http://127.0.0.1:5000';
+
+export const loginUser = async (credentials: any) => {
+    const response = await fetch(`${API_BASE_URL}/login`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(credentials)
+    });
+    return response.json();
+};
+
+export const signupUser = async (userData: any) => {
+    const response = await fetch(`${API_BASE_URL}/signup`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(userData)
+    });
+    return response.json();
+};
+
+export const processFrame = async (base64Image: string, source: string = 'IMAGE-EVIDENCE', signal?: AbortSignal) => {
+    // Convert base64 to blob
+    const res = await fetch(base64Image);
+    const blob = await res.blob();
+
+    const formData = new FormData();
+    formData.append('image', blob, 'frame.jpg');
+    formData.append('source', source);
+
+    const response = await fetch(`${API_BASE_URL}/detect`, {
+        method: 'POST',
+        body: formData,
+        signal
+    });
+    const data = await response.json();
+    if (!response.ok) {
+        // 429/503 mean the AI Core shed this frame; callers just wait for the next one
+        return { ...data, status: response.status, retryAfter: Number(response.headers.get('Retry-After') || 0) };
+    }
+    return data;
+};
+
+export const fetchStats = async () => {
+    const response = await fetch(`${API_BASE_URL}/stats`);
+    return response.json();
+};
+
+export const fetchFeedHealth = async () => {
+    const response = await fetch(`${API_BASE_URL}/feeds/health`);
+    return response.json();
+};
+
+export const purgeDetections = async (range: { start: string, end: string }) => {
+    const token = localStorage.getItem('safecity_token');
+    const response = await fetch(`${API_BASE_URL}/purge`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${token}`
+        },
+        body: JSON.stringify(range)
+    });
+    return response.json();
+};
+
+export const fetchLogs = async () => {
+    const response = await fetch(`${API_BASE_URL}/logs`);
+    const data = await response.json();
+    return data.map((log: any) => ({
+        ...log,
+        plateNumber: log.plate_number,
+        timestamp: log.timestamp // Backend already sends ISO string with Z
+    }));
+};
+
+export const searchPlates = async (q: string, range: { start?: string, end?: string } = {}, signal?: AbortSignal) => {
+    const params = new URLSearchParams({ q });
+    if (range.start) params.set('start', range.start);
+    if (range.end) params.set('end', range.end);
+    const response = await fetch(`${API_BASE_URL}/search/plates?${params}`, { signal });
+    if (!response.ok) return null;
+    const data = await response.json();
+    return data.results.map((log: any) => ({
+        ...log,
+        plateNumber: log.plate_number
+    }));
+};
+
+export const exportUrl = (filters: { start?: string, end?: string, type?: string, source?: string }, format: 'csv' | 'ndjson' = 'csv') => {
+    const params = new URLSearchParams({ format, images: '1' });
+    Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.set(key, value);
+    });
+    return `${API_BASE_URL}/export?${params}`;
+};
+
+export const submitVideoJob = async (file: File, source: string = 'VIDEO-ANALYSIS') => {
+    // The whole file is processed server-side in parallel chunks; poll the job for progress
+    const formData = new FormData();
+    formData.append('video', file, file.name);
+    formData.append('source', source);
+    const response = await fetch(`${API_BASE_URL}/jobs/video`, {
+        method: 'POST',
+        body: formData
+    });
+    return response.json();
+};
+
+export const fetchVideoJob = async (jobId: string) => {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+    return response.json();
+};
+
+export const fetchVideoJobResults = async (jobId: string) => {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/results`);
+    const data = await response.json();
+    return (data.results || []).map((event: any) => ({
+        ...event,
+        plateNumber: event.plate_number
+    }));
+};
+
+export const cancelVideoJob = async (jobId: string) => {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`, { method: 'DELETE' });
+    return response.json();
+};
@@ -0,0 +1,282 @@
+import argparse
+import csv
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+sys.path.append(BACKEND_DIR)
+
+from metrics import percentile
+from startup_report import rss_mb
+
+# Long-run soak test. Pushes tens of thousands of synthetic frames through
+# AIProcessor and /detect (in-process, via the Flask test client, with the
+# dashboard's /stats and /logs polling alongside) and samples RSS, traced
+# Python allocations, open file descriptors, threads and latency
+# percentiles as it goes. After warm-up, each series gets a least-squares
+# slope per 1000 frames; the run fails if any slope exceeds its limit.
+#
+#   python soak_test.py --frames 20000                   # real models
+#   python soak_test.py --frames 50000 --stub            # web/DB/encode tiers only
+#   python soak_test.py --max rss_mb=1 --max p95_pct=3   # tighter limits
+#
+# Limits can also be set with SAFECITY_SOAK_MAX_<NAME>. The database,
+# evidence and recordings go to a temporary directory unless
+# SAFECITY_DATABASE_URL / SAFECITY_UPLOAD_DIR are already set.
+
+# Allowed growth per 1000 frames
+LIMITS = {
+    "rss_mb": 2.0,
+    "traced_mb": 1.0,  # Python-level allocations (tracemalloc)
+    "fds": 0.5,
+    "threads": 0.5,
+    "p95_pct": 5.0,  # per target, as a percentage of its median p95
+}
+
+SOURCES = ["LIVE-SOAK-1", "LIVE-SOAK-2", "LIVE-SOAK-3", "LIVE-SOAK-4"]
+
+
+def limit(name, overrides):
+    if name in overrides:
+        return overrides[name]
+    return float(os.environ.get(f"SAFECITY_SOAK_MAX_{name.upper()}", LIMITS[name]))
+
+
+def open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None  # not Linux; the series is skipped
+
+
+def slope_per_1k(xs, ys):
+    """Least-squares slope of ys over xs (frames), per 1000 frames."""
+    n = len(xs)
+    if n < 3:
+        return 0.0
+    mx, my = sum(xs) / n, sum(ys) / n
+    var = sum((x - mx) ** 2 for x in xs)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var * 1000 if var else 0.0
+
+
+def synthetic_frames(width, height, seed=0):
+    """Endless varied frames; every one carries a new plate number, so dedup and OCR never short-circuit."""
+    rng = np.random.default_rng(seed)
+    backgrounds = [cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 4)
+                   for _ in range(8)]
+    i = 0
+    while True:
+        frame = backgrounds[i % len(backgrounds)].copy()
+        x, y = 20 + (i * 37) % max(1, width - 200), height // 2
+        cv2.rectangle(frame, (x, y - 150), (x + 90, y), (40, 40, 40), -1)
+        cv2.rectangle(frame, (x + 10, y + 10), (x + 140, y + 50), (235, 235, 235), -1)
+        cv2.putText(frame, f"SK{i % 100000:05d}", (x + 14, y + 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (20, 20, 20), 2)
+        yield frame
+        i += 1
+
+
+class Soak:
+    def __init__(self, app_module, targets, trace, top):
+        self.A = app_module
+        self.client = app_module.app.test_client()
+        self.targets = targets
+        self.trace = trace
+        self.top = top
+        self.latencies = {t: [] for t in targets}
+        self.statuses = {}
+        self.samples = []
+        self.baseline = None
+        self.started = time.monotonic()
+
+    def run_frame(self, i, jpeg):
+        target = self.targets[i % len(self.targets)]
+        started = time.perf_counter()
+        if target == 'processor':
+            decoded = self.A.decode_frame(np.frombuffer(jpeg, np.uint8), self.A.processor.max_input_size())
+            self.A.processor.process_frame(decoded)
+            status = 200
+        else:
+            response = self.client.post('/detect', data={
+                "image": (io.BytesIO(jpeg), "frame.jpg"), "source": SOURCES[i % len(SOURCES)]
+            }, content_type='multipart/form-data')
+            status = response.status_code
+            response.close()
+        self.latencies[target].append((time.perf_counter() - started) * 1000)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def poll_dashboard(self):
+        # What the dashboard polls: exercises sessions and queries next to the write path
+        for path in ('/stats', '/logs?limit=20', '/metrics'):
+            self.client.get(path).close()
+
+    def sample(self, frames):
+        gc.collect()
+        point = {
+            "frames": frames,
+            "seconds": round(time.monotonic() - self.started, 1),
+            "rss_mb": round(rss_mb(), 1),
+            "fds": open_fds(),
+            "threads": threading.active_count(),
+            "evidence_mb": round(self.A.evidence_store.metrics()["bytes_written"] / (1024 * 1024), 1),
+        }
+        if self.trace:
+            point["traced_mb"] = round(tracemalloc.get_traced_memory()[0] / (1024 * 1024), 2)
+        for target, values in self.latencies.items():
+            point[f"{target}_p50_ms"] = round(percentile(values, 50), 1)
+            point[f"{target}_p95_ms"] = round(percentile(values, 95), 1)
+            point[f"{target}_p99_ms"] = round(percentile(values, 99), 1)
+            self.latencies[target] = []
+        if self.trace and self.baseline is not None:
+            point["top_growth"] = self.top_growth(self.top)
+        self.samples.append(point)
+        return point
+
+    def mark_warm(self):
+        if self.trace:
+            self.baseline = tracemalloc.take_snapshot()
+
+    def top_growth(self, n):
+        """Source lines whose live allocations grew most since warm-up."""
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        stats = snapshot.compare_to(self.baseline, 'lineno')
+        return [{"where": str(s.traceback), "growth_kb": round(s.size_diff / 1024, 1), "blocks": s.count_diff}
+                for s in sorted(stats, key=lambda s: s.size_diff, reverse=True)[:n] if s.size_diff > 0]
+
+
+def evaluate(samples, warmup, overrides):
+    """Slope of every series after warm-up against its limit."""
+    warm = [s for s in samples if s["frames"] > warmup]
+    xs = [s["frames"] for s in warm]
+    checks = {}
+    for name in ("rss_mb", "traced_mb", "fds", "threads"):
+        if not warm or warm[0].get(name) is None:
+            continue
+        value = slope_per_1k(xs, [s[name] for s in warm])
+        checks[name] = {"slope_per_1k": round(value, 3), "limit": limit(name, overrides)}
+    for key in [k for k in (warm[0] if warm else {}) if k.endswith("_p95_ms")]:
+        series = [s[key] for s in warm]
+        median = percentile(series, 50)
+        value = slope_per_1k(xs, series) / median * 100 if median else 0.0
+        checks[key.replace("_ms", "_pct")] = {"slope_per_1k": round(value, 2), "limit": limit("p95_pct", overrides)}
+    for check in checks.values():
+        check["ok"] = check["slope_per_1k"] <= check["limit"]
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak AIProcessor and /detect and fail on memory or latency drift")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--target", choices=("both", "detect", "processor"), default="both",
+                        help="where frames go; 'both' alternates")
+    parser.add_argument("--sample-every", type=int, default=500, help="frames between samples")
+    parser.add_argument("--warmup", type=int, default=1000, help="frames excluded from the slopes")
+    parser.add_argument("--poll-every", type=int, default=50, help="frames between dashboard polls (0: never)")
+    parser.add_argument("--size", default="1280x720", help="synthetic frame size")
+    parser.add_argument("--stub", action="store_true", help="replace the models with the stub processor")
+    parser.add_argument("--no-trace", action="store_true", help="skip tracemalloc (it slows Python code down)")
+    parser.add_argument("--top", type=int, default=10, help="top allocation sites to report")
+    parser.add_argument("--max", action="append", default=[], metavar="NAME=VALUE",
+                        help=f"override a limit ({', '.join(LIMITS)})")
+    parser.add_argument("--report", default="soak_report.json")
+    parser.add_argument("--csv", help="also write the time series as CSV")
+    args = parser.parse_args()
+    overrides = {k: float(v) for k, v in (item.split("=", 1) for item in args.max)}
+    unknown = set(overrides) - set(LIMITS)
+    if unknown:
+        parser.error(f"unknown limits: {', '.join(sorted(unknown))}")
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    # The app runs from backend/; reports land where the command was run
+    args.report = os.path.abspath(args.report)
+    args.csv = os.path.abspath(args.csv) if args.csv else None
+
+    work_dir = tempfile.mkdtemp(prefix="safecity_soak_")
+    os.environ.setdefault('SAFECITY_DATABASE_URL', f"sqlite:///{work_dir}/soak.db")
+    os.environ.setdefault('SAFECITY_UPLOAD_DIR', os.path.join(work_dir, 'uploads'))
+    os.environ.setdefault('SAFECITY_RECORD_DIR', os.path.join(work_dir, 'recordings'))
+    os.environ.setdefault('SAFECITY_VIDEO_JOB_DIR', os.path.join(work_dir, 'video'))
+    if args.stub:
+        os.environ['SAFECITY_STUB_PROCESSOR'] = '1'
+    os.chdir(BACKEND_DIR)
+    import app as A
+    A.prepare_database()
+    A.start_services()
+
+    if not args.no_trace:
+        tracemalloc.start(1)
+    targets = ['detect', 'processor'] if args.target == 'both' else [args.target]
+    soak = Soak(A, targets, trace=not args.no_trace, top=args.top)
+    frames = synthetic_frames(width, height)
+    print(f"Soaking {args.frames} {width}x{height} frames through {' + '.join(targets)}; work dir {work_dir}")
+
+    stdout, quiet = sys.stdout, open(os.devnull, 'w')  # per-frame DEBUG lines
+    columns = None
+    try:
+        for i in range(1, args.frames + 1):
+            sys.stdout = quiet
+            jpeg = cv2.imencode('.jpg', next(frames), [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+            soak.run_frame(i, jpeg)
+            if args.poll_every and i % args.poll_every == 0:
+                soak.poll_dashboard()
+            if i == args.warmup:
+                soak.mark_warm()
+            if i % args.sample_every == 0 or i == args.frames:
+                sys.stdout = stdout
+                point = soak.sample(i)
+                if columns is None:
+                    columns = [k for k in point if k != "top_growth"]
+                    print("  ".join(f"{c:>14}" for c in columns))
+                print("  ".join(f"{str(point.get(c)):>14}" for c in columns))
+    finally:
+        sys.stdout = stdout
+        quiet.close()
+
+    checks = evaluate(soak.samples, args.warmup, overrides)
+    total = sum(soak.statuses.values())
+    errors = sum(n for status, n in soak.statuses.items() if status >= 500 and status != 503)
+    passed = all(c["ok"] for c in checks.values()) and errors <= total * 0.01
+    report = {
+        "frames": args.frames,
+        "targets": targets,
+        "size": [width, height],
+        "stub": args.stub,
+        "warmup": args.warmup,
+        "statuses": {str(k): v for k, v in sorted(soak.statuses.items())},
+        "checks": checks,
+        "passed": passed,
+        "top_growth": soak.samples[-1].get("top_growth", []) if soak.samples else [],
+        "samples": [{k: v for k, v in s.items() if k != "top_growth"} for s in soak.samples],
+        "top_growth_series": [{"frames": s["frames"], "top_growth": s["top_growth"]}
+                              for s in soak.samples if "top_growth" in s],
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns or [], extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(report["samples"])
+
+    print(f"\nStatuses: {report['statuses']}")
+    print("Growth per 1000 frames after warm-up:")
+    for name, check in checks.items():
+        print(f"  {name:<22} {check['slope_per_1k']:>9}  (limit {check['limit']})  {'ok' if check['ok'] else 'FAIL'}")
+    if report["top_growth"]:
+        print("Largest allocation growth since warm-up:")
+        for site in report["top_growth"]:
+            print(f"  {site['growth_kb']:>10.1f} KB  {site['blocks']:>7} blocks  {site['where']}")
+    print(f"\n{'PASSED' if passed else 'FAILED'}; report written to {args.report}")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()